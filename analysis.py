@@ -0,0 +1,200 @@
+#-------------------------------------------------------------------------------
+# Name:        Analysis
+# Purpose:     Score positions in bulk with no user interface: a static
+#              evaluation of each position and its best one-ply reply, for
+#              offline work like building training data. Positions are
+#              batched and the batches are spread over a pool of processes.
+#
+#              Usage: python analysis.py [*input file] [*output file]
+#                                        [*processes N] [*batch N]
+#                                        [*evaluation material full]
+#              Reads one FEN per line (standard input by default) and writes
+#              one tab-separated line for each: the FEN, its evaluation, the
+#              best reply in ICCF, and that reply's score, all from the point
+#              of view of the player to move.
+#-------------------------------------------------------------------------------
+
+import collections
+import itertools
+import multiprocessing
+import os
+import sys
+try:
+    from gamestate import GameState
+except:
+    print("The GameState module is not available. Please add it to the working folder and try again.")
+try:
+    from search import evaluate
+except:
+    print("The Search module is not available. Please add it to the working folder and try again.")
+try:
+    import evaluation
+except:
+    evaluation = None # positions will be scored by the game's incremental score
+try:
+    import chess_notation as cn
+except:
+    cn = None # replies will be written in the game's own notation
+
+BATCH = 256 # positions sent to a process at a time
+BACKLOG = 2 # batches waiting for each process, so that none of them sits idle
+
+# the model's corner rooks and kings that allow each castle, for model_fen
+MODEL_CASTLES = (("K", 7, 7, "R"), ("Q", 7, 0, "R"), ("k", 0, 7, "r"), ("q", 0, 0, "r"))
+
+def model_fen(model, color="white"):
+    """
+    Returns the FEN of a board in the chess_notation module's model: eight
+    rows of one-character strings, from the top, with ' ' for an empty
+    square. A king and rook still on their starting squares are taken to be
+    able to castle, and no pawn can be captured en passant.
+    Parameters:
+        model (list): the board
+        color (string): "white" or "black", the player to move
+    """
+    rows = []
+    for row in model:
+        text = ""
+        for empty, squares in itertools.groupby(row, lambda square: square == ' '):
+            text += str(len(list(squares))) if empty else ''.join(squares)
+        rows.append(text)
+    castles = ''.join(right for right, row, column, rook in MODEL_CASTLES
+    if model[row][4] == ("K" if row else "k") and model[row][column] == rook)
+    return "{} {} {} - 0 1".format('/'.join(rows), color[0], castles or '-')
+
+def position_fen(position):
+    """
+    Returns the FEN of a position, given as a FEN, as a chess_notation model
+    with White to move, or as a (model, color) tuple.
+    Parameter:
+        position (string, list, or tuple): the position
+    """
+    if isinstance(position, str):
+        return position.strip()
+    if isinstance(position, tuple):
+        return model_fen(*position)
+    return model_fen(position)
+
+def score_batch(fens, full=True):
+    """
+    Returns a list of (fen, score, move, reply) tuples, one for each position
+    in a batch: the position's static evaluation, its best reply in the
+    game's notation (like "4644" or "wl"), and the static evaluation after
+    that reply, all from the point of view of the player to move. The move
+    and reply are None if there are no legal moves, and all three are None
+    if the FEN couldn't be read. With the full evaluation, every position,
+    and every position after each legal move, is scored in one vectorized
+    call; otherwise each is scored by the game's incremental score, as the
+    search does.
+    Parameters:
+        fens (list): the positions, as FEN strings
+        full (boolean): True for the NumPy evaluation, if it's available
+    """
+    full = full and evaluation is not None and evaluation.numpy is not None
+    state = GameState()
+    boards = [] # the compact board of each position to score, for the full evaluation
+    turns = []
+    found = [] # (fen, score, moves, scores) for each position
+    for fen in fens:
+        try:
+            state.load_fen(fen)
+        except ValueError:
+            found.append((fen, None, [], []))
+            continue
+        moves = state.legal_moves()
+        scores = []
+        if full:
+            boards.append(evaluation.board_array(state))
+            turns.append(state.player is state.white_player)
+            score = len(boards) - 1 # where it will be in the array of scores
+        else:
+            score = evaluate(state)
+        for move in moves:
+            state.make_move(move)
+            if full:
+                boards.append(evaluation.board_array(state))
+                turns.append(state.player is state.white_player)
+                scores.append(len(boards) - 1)
+            else:
+                scores.append(-evaluate(state))
+            state.unmake_move()
+        found.append((fen, score, moves, scores))
+    if full and boards:
+        scored = evaluation.evaluate_boards(evaluation.numpy.array(boards),
+        evaluation.numpy.array(turns)).tolist()
+        # a reply is scored from the other player's point of view
+        found = [(fen, score if score is None else scored[score], moves,
+        [-scored[index] for index in scores]) for fen, score, moves, scores in found]
+    results = []
+    for fen, score, moves, scores in found:
+        if scores:
+            best = max(range(len(moves)), key=scores.__getitem__)
+            results.append((fen, score, moves[best], scores[best]))
+        else:
+            results.append((fen, score, None, None))
+    return results
+
+def analyze(positions, processes=None, batch=BATCH, full=True):
+    """
+    Scores a stream of positions, yielding a (fen, score, move, reply) tuple
+    for each, in order, as score_batch returns them. The positions are read
+    only as fast as the processes can score them, so the stream can be far
+    too long to fit in memory.
+    Parameters:
+        positions (iterable): the positions, each a FEN, a chess_notation
+            model, or a (model, color) tuple, as for position_fen
+        processes (int): how many processes to score in, or None for one per
+            CPU; with 1, positions are scored in this process
+        batch (int): how many positions to send to a process at a time
+        full (boolean): True for the NumPy evaluation, if it's available
+    """
+    fens = map(position_fen, positions)
+    batches = iter(lambda: list(itertools.islice(fens, batch)), [])
+    if processes == 1:
+        for fens_batch in batches:
+            yield from score_batch(fens_batch, full)
+        return
+    processes = processes or os.cpu_count() or 1
+    with multiprocessing.Pool(processes) as pool:
+        waiting = collections.deque()
+        limit = BACKLOG * processes
+        for fens_batch in batches:
+            waiting.append(pool.apply_async(score_batch, (fens_batch, full)))
+            if len(waiting) >= limit:
+                yield from waiting.popleft().get()
+        while waiting:
+            yield from waiting.popleft().get()
+
+def main():
+    # look for argv options the same way the game does, but keep the case of
+    # the values, since file names can be case-sensitive
+    argvs = {pair.partition(' ')[0].lower():pair.partition(' ')[2].strip()
+    for pair in (' '.join(sys.argv)).split(' *')[1:]}
+    # switches:
+    # *input file
+    # *output file
+    # *processes int
+    # *batch int
+    # *evaluation material full
+    source = open(argvs['input']) if argvs.get('input') else sys.stdin
+    target = open(argvs['output'], 'w') if argvs.get('output') else sys.stdout
+    processes = int(argvs['processes']) if argvs.get('processes') else None
+    lines = (line for line in source if line.strip())
+    try:
+        for fen, score, move, reply in analyze(lines, processes,
+        int(argvs.get('batch', BATCH)), argvs.get('evaluation', "full") == "full"):
+            if score is None:
+                target.write(fen + "\tinvalid\n")
+                continue
+            if move is not None and cn is not None:
+                move = cn.chess11_to_iccf_move(move)
+            target.write("{}\t{}\t{}\t{}\n".format(fen, score, move or '-',
+            '-' if reply is None else reply))
+    finally:
+        if source is not sys.stdin:
+            source.close()
+        if target is not sys.stdout:
+            target.close()
+
+if __name__ == '__main__':
+    main()
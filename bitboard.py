@@ -0,0 +1,222 @@
+#-------------------------------------------------------------------------------
+# Name:        Bitboard
+# Purpose:     Generate movesets for a GameState with 64-bit boards and
+#              precomputed attack tables, as an alternative to the per-piece
+#              generate_moveset methods.
+#-------------------------------------------------------------------------------
+
+# Each bitboard is an int with one bit per square. Bit 0 is the top left square
+# ("00"), bit 7 is the top right ("70"), bit 56 is the bottom left ("07"), and
+# bit 63 is the bottom right ("77"), so a bit is 8*y + x.
+FULL = (1 << 64) - 1
+
+# translations between bits and the squares of the GameState's mailbox board
+BIT_TO_SQUARE = [21 + bit%8 + 10*(bit//8) for bit in range(64)]
+SQUARE_TO_BIT = {square:bit for bit,square in enumerate(BIT_TO_SQUARE)}
+
+TYPES = ("pawn", "knight", "bishop", "rook", "queen", "king")
+
+# the eight ray directions as (x, y) steps. the first four raise the bit index
+# as they go, so the nearest blocker on those rays is the lowest set bit. the
+# last four lower it, so the nearest blocker is the highest set bit.
+RAY_STEPS = ((1, 0), (0, 1), (1, 1), (-1, 1), (-1, 0), (0, -1), (-1, -1), (1, -1))
+ROOK_RAYS = (0, 1, 4, 5) # indices into RAY_STEPS
+BISHOP_RAYS = (2, 3, 6, 7)
+
+def _steps(steps):
+    """
+    Returns a table of 64 bitboards, one per square, with a bit set for each
+    square one of the given (x, y) steps away from it.
+    Parameter:
+        steps (iterable): (x, y) pairs
+    """
+    table = []
+    for bit in range(64):
+        x, y = bit%8, bit//8
+        targets = 0
+        for dx, dy in steps:
+            if 0 <= x+dx < 8 and 0 <= y+dy < 8:
+                targets |= 1 << (8*(y+dy) + x+dx)
+        table.append(targets)
+    return table
+
+def _rays():
+    """
+    Returns a table of 8 lists of 64 bitboards. RAYS[direction][bit] has every
+    square from bit (not inclusive) to the edge of the board in that direction.
+    """
+    rays = []
+    for dx, dy in RAY_STEPS:
+        table = []
+        for bit in range(64):
+            x, y = bit%8 + dx, bit//8 + dy
+            ray = 0
+            while 0 <= x < 8 and 0 <= y < 8:
+                ray |= 1 << (8*y + x)
+                x, y = x + dx, y + dy
+            table.append(ray)
+        rays.append(table)
+    return rays
+
+KNIGHT_ATTACKS = _steps(((1,2), (2,1), (2,-1), (1,-2), (-1,-2), (-2,-1), (-2,1), (-1,2)))
+KING_ATTACKS = _steps(((1,0), (1,1), (0,1), (-1,1), (-1,0), (-1,-1), (0,-1), (1,-1)))
+# white pawns move up the board (toward y=0) and black pawns move down
+PAWN_ATTACKS = {"white":_steps(((-1,-1), (1,-1))), "black":_steps(((-1,1), (1,1)))}
+PAWN_STEP = {"white":-8, "black":8}
+RAYS = _rays()
+
+def ray_attacks(bit, occupied, directions):
+    """
+    Returns the squares a sliding piece on bit attacks in the given
+    directions, stopping at (and including) the first occupied square on each.
+    Parameters:
+        bit (int): the sliding piece's bit
+        occupied (int): a bitboard of every occupied square
+        directions (tuple): indices into RAY_STEPS
+    """
+    attacks = 0
+    for direction in directions:
+        ray = RAYS[direction][bit]
+        blockers = ray & occupied
+        if blockers:
+            if direction < 4: # the nearest blocker is the lowest bit
+                first = (blockers & -blockers).bit_length() - 1
+            else: # the nearest blocker is the highest bit
+                first = blockers.bit_length() - 1
+            ray ^= RAYS[direction][first] # cut off everything past it
+        attacks |= ray
+    return attacks
+
+def bishop_attacks(bit, occupied):
+    """
+    Returns the squares a bishop on bit attacks.
+    """
+    return ray_attacks(bit, occupied, BISHOP_RAYS)
+
+def rook_attacks(bit, occupied):
+    """
+    Returns the squares a rook on bit attacks.
+    """
+    return ray_attacks(bit, occupied, ROOK_RAYS)
+
+def bits(bitboard):
+    """
+    Yields the index of each set bit in a bitboard, lowest first.
+    """
+    while bitboard:
+        low = bitboard & -bitboard
+        yield low.bit_length() - 1
+        bitboard ^= low
+
+class Bitboards(object):
+    """
+    An object of this class holds a position as bitboards, built from the
+    pieces of a GameState.
+    Attributes:
+        pieces (dictionary): pieces[color][type] is a bitboard of that color's
+            pieces of that type, like pieces["white"]["knight"]
+        occupied (dictionary): occupied[color] is a bitboard of every square
+            that color's pieces occupy
+        all (int): a bitboard of every occupied square
+        en_passant (dictionary): en_passant[color] is a bitboard of the
+            squares that color's pawns can move to to capture en passant
+    """
+    def __init__(self, state):
+        self.pieces = {color:{kind:0 for kind in TYPES} for color in ("white", "black")}
+        self.occupied = {"white":0, "black":0}
+        self.en_passant = {"white":0, "black":0}
+        for piece in state.all_pieces:
+            if piece.square not in SQUARE_TO_BIT: # if it's off the board
+                continue
+            bit = 1 << SQUARE_TO_BIT[piece.square]
+            kind = piece.type.partition('_')[2]
+            self.pieces[piece.color][kind] |= bit
+            self.occupied[piece.color] |= bit
+            if kind == "pawn" and piece.vulnerable:
+                # an enemy pawn can capture this one by moving behind it
+                enemy = "black" if piece.color == "white" else "white"
+                self.en_passant[enemy] |= bit << 8 if enemy == "black" else bit >> 8
+        self.all = self.occupied["white"] | self.occupied["black"]
+
+    def attacks(self, color):
+        """
+        Returns a bitboard of every square attacked by the given color.
+        Parameter:
+            color (string): "white" or "black"
+        """
+        pieces = self.pieces[color]
+        attacked = 0
+        for bit in bits(pieces["pawn"]):
+            attacked |= PAWN_ATTACKS[color][bit]
+        for bit in bits(pieces["knight"]):
+            attacked |= KNIGHT_ATTACKS[bit]
+        for bit in bits(pieces["king"]):
+            attacked |= KING_ATTACKS[bit]
+        for bit in bits(pieces["bishop"] | pieces["queen"]):
+            attacked |= bishop_attacks(bit, self.all)
+        for bit in bits(pieces["rook"] | pieces["queen"]):
+            attacked |= rook_attacks(bit, self.all)
+        return attacked
+
+    def is_attacked(self, bit, color):
+        """
+        Returns True if the given color attacks the square at bit. Each piece
+        type is a single lookup and AND against that color's bitboards.
+        Parameters:
+            bit (int): the index of the square
+            color (string): the attacking color, "white" or "black"
+        """
+        pieces = self.pieces[color]
+        defender = "black" if color == "white" else "white"
+        return bool(KNIGHT_ATTACKS[bit] & pieces["knight"] or
+            KING_ATTACKS[bit] & pieces["king"] or
+            # a pawn attacks this square if a defending pawn here would attack it
+            PAWN_ATTACKS[defender][bit] & pieces["pawn"] or
+            bishop_attacks(bit, self.all) & (pieces["bishop"] | pieces["queen"]) or
+            rook_attacks(bit, self.all) & (pieces["rook"] | pieces["queen"]))
+
+    def targets(self, piece, bit):
+        """
+        Returns a bitboard of the squares a piece on bit may move to.
+        Parameters:
+            piece (Piece): the piece to move
+            bit (int): the index of the piece's square
+        """
+        color = piece.color
+        kind = piece.type.partition('_')[2]
+        enemies = self.all ^ self.occupied[color]
+        if kind == "pawn":
+            empty = FULL ^ self.all
+            step = PAWN_STEP[color]
+            ahead = 1 << (bit + step)
+            targets = ahead & empty # look one space ahead
+            if targets and not piece.moved: # and another, on the first move
+                targets |= (1 << (bit + 2*step)) & empty
+            # captures, including en passant
+            return targets | PAWN_ATTACKS[color][bit] & (enemies | self.en_passant[color] & empty)
+        if kind == "knight":
+            targets = KNIGHT_ATTACKS[bit]
+        elif kind == "king":
+            targets = KING_ATTACKS[bit]
+        elif kind == "bishop":
+            targets = bishop_attacks(bit, self.all)
+        elif kind == "rook":
+            targets = rook_attacks(bit, self.all)
+        else:
+            targets = bishop_attacks(bit, self.all) | rook_attacks(bit, self.all)
+        return targets & ~self.occupied[color]
+
+def generate_movesets(state):
+    """
+    Gives every piece in a GameState the same moveset its generate_moveset
+    method would, using bitboards.
+    Parameter:
+        state (GameState): the game to generate movesets for
+    """
+    boards = Bitboards(state)
+    for piece in state.all_pieces:
+        bit = SQUARE_TO_BIT.get(piece.square)
+        if bit is None: # if it's off the board
+            piece.moveset = set() # it can't move
+        else:
+            piece.moveset = {BIT_TO_SQUARE[target] for target in bits(boards.targets(piece, bit))}
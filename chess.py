@@ -42,427 +42,54 @@ try:
     import timecontrol as tc
 except:
     print("The TimeControl module is not available.")
-from random import *
+try:
+    from gamestate import GameState, OFF_BOARD, to_square, to_location, coordinates
+except:
+    print("The GameState module is not available. Please add it to the working folder and try again.")
+try:
+    from search import Engine, score_text
+except:
+    Engine = None # the expert opponent will play like the hard one
+    print("The Search module is not available.")
+try:
+    import evaluation
+except:
+    evaluation = None # the expert opponent will count material
+    print("The Evaluation module is not available.")
+try:
+    from book import OpeningBook
+except:
+    OpeningBook = None # the AI will think about its opening moves too
+    print("The Book module is not available.")
+try:
+    from tablebase import Tablebases
+except:
+    Tablebases = None # the AI will think about its endgames too
+    print("The Tablebase module is not available.")
+try:
+    from parallel import ParallelEngine
+except:
+    ParallelEngine = None # the expert opponent will search in one process
+    print("The Parallel module is not available.")
 import sys
 import time
 import os
-
-class Player(object):
-    """
-    An object of this class represents a player.
-    Attributes:
-        color (string): a string representing the player's color
-            (black or white)
-        mode (string): a string representing the player's choice of UI mode -
-            two clicks to move or click-and-drag to move
-    """
-    def __init__(self, color):
-        self.color = color
-        self.mode = "click"
-
-class Piece(object):
-    """
-    An object of this class represents a chess piece.
-    Attributes:
-        all_squares (dict): a reference to the game's all_squares
-        color (string): the color of the piece
-        location(string): a two-character representation of the piece's location
-    """
-    def __init__(self, all_squares, color, location):
-        self.all_squares = all_squares
-        self.color = color # the color of a piece - either "black" or "white"
-        self.location = location # the location of the piece, expressed
-        # as a 2-char string. "00" is the top left square, "07" is the bottom
-        # left, "70" is the top right, and "77" is the bottom right.
-
-    def add_if_okay(self, num1, num2):
-        """
-        This method is used for pieces whose movesets extend until they hit
-        a piece: queens, rooks, bishops.
-        Parameters:
-            num1 (string): the x value of the move, from "0" to "7"
-            num2 (string): the y value of the move, from "0" to "7"
-        """
-        if num1 not in range(8) or num2 not in range(8): # if not on board
-            return False # don't add to moves
-        loc = str(num1) + str(num2)
-        contents = self.all_squares.get(str(num1)+str(num2)).piece
-        if contents is None: # if the destination is empty
-            self.moveset.add(loc) # add to moves
-            return True # could be moves in that direction
-        else: # if there's a piece there
-            if contents.color is not self.color: # and it's an enemy
-                self.moveset.add(loc) # add it
-            return False # stop looking for moves in that direction
-
-class Pawn(Piece):
-    """
-    An object of this class represents a pawn piece.
-    Attributes:
-        direction (int): describes the direction the pawn can move - -1 for "up"
-            or 1 for "down"
-        moved (boolean): starts False, and then changes to True if it gets moved
-        vulnerable (boolean): a vulnerable state, caused by a first move
-            spanning two spaces, lasts for one turn and enables the pawn to be
-            captured en passant by enemy pawns
-        type (string): a string describing the piece with its color and type
-        moveset (set): a set of locations where this piece may move
-    """
-    def __init__(self, all_squares, color, location):
-        super().__init__(all_squares, color, location)
-        self.direction = 1
-        if color == "white": # white player
-            self.direction = -1 # moves 'up' the board, negative on canvas
-        self.moved = False # hasn't moved yet
-        self.vulnerable = False # not vulnerable to en passant
-        self.type = self.color + "_pawn" # for dictionary key
-
-    def generate_moveset(self):
-        """
-        Generates a moveset for this piece. Pawns can move ahead one space. If
-        it's their first move, they can move ahead two spaces. If there's an
-        enemy to their front-left or front-right, they can move and capture. If
-        an enemy pawn's first move brings them adjacent to the pawn in question,
-        the enemy pawn can be captured by moving to the front-left or
-        front-right.
-        """
-        self.moveset = set() # start with an empty set
-        range8 = range(8) # generate a range(8) object and save it
-        
-        # look one space ahead
-        loc = self.location[0] + str(int(self.location[1])+self.direction)
-        if len(loc) == 2: # if there's no '-' sign in the location
-            # and it's on the board
-            if int(loc[0]) in range8 and int(loc[1]) in range8:
-                if self.all_squares.get(loc).piece is None: # and empty
-                    self.moveset.add(loc) # add it
-        # look another space ahead and do the same thing
-        loc = loc[0]+str(int(loc[1])+self.direction)
-        if len(loc) == 2:
-            if int(loc[0]) in range8 and int(loc[1]) in range8:
-                # make sure it's the first move, though
-                if not self.moved and self.all_squares.get(loc).piece is None \
-                and self.all_squares.get(loc[0]+ \
-                # and we can't jump a piece, so check the square behind target
-                str(int(loc[1])-self.direction)).piece is None:
-                    self.moveset.add(loc) # add it
-        loc = str(int(self.location[0])-1) + \
-        str(int(self.location[1])+self.direction) # can it capture an enemy?
-        if len(loc) == 2: # make sure there's no '-' sign
-            # and it's on the board
-            if int(loc[0]) in range8 and int(loc[1]) in range8:
-                # if there's a piece
-                if self.all_squares.get(loc).piece is not None:
-                    # and it's an enemy
-                    if self.all_squares.get(loc).piece.color is not self.color:
-                        self.moveset.add(loc) # it's a valid move
-                elif int(loc[0]) in range8 and \
-                int(loc[1])-self.direction in range8: # no piece there
-                    # but there is a piece behind there
-                    if self.all_squares.get \
-                    (loc[0]+str(int(loc[1])-self.direction)).piece is not None:
-                        # and it's a pawn
-                        if "pawn" in self.all_squares.get \
-                        (loc[0]+str(int(loc[1])-self.direction)).piece.type:
-                            if self.all_squares.get \
-                            (loc[0]+str(int(loc[1])-self.direction)) \
-                            .piece.vulnerable: # and it's vulnerable
-                                self.moveset.add(loc) # add due to en passant
-        loc = str(int(self.location[0])+1) + \
-        str(int(self.location[1])+self.direction) # now the other capture square
-        if len(loc) == 2: # if there's no '-' sign
-            # and it's on the board
-            if int(loc[0]) in range8 and int(loc[1]) in range8:
-                # and there's a piece there
-                if self.all_squares.get(loc).piece is not None:
-                    # and the piece is an enemy
-                    if self.all_squares.get(loc).piece.color is not self.color:
-                        self.moveset.add(loc) # add the location
-                elif int(loc[0]) in range8 and \
-                int(loc[1])-self.direction in range8: # no piece there
-                    # but there is a piece behind there
-                    if self.all_squares.get \
-                    (loc[0]+str(int(loc[1])-self.direction)).piece is not None:
-                        # and it's a pawn
-                        if "pawn" in self.all_squares.get \
-                        (loc[0]+str(int(loc[1])-self.direction)).piece.type:
-                            if self.all_squares.get\
-                            (loc[0]+str(int(loc[1])-self.direction)) \
-                            .piece.vulnerable: # and it's vulnerable
-                                self.moveset.add(loc) # add due to en passant
-
-class Rook(Piece):
-    """
-    An object of this class represents a rook piece.
-    Attributes:
-        moved (boolean): False if the piece hasn't moved yet, True as soon as
-            it has
-        type (string): a string describing the piece with its color and type
-        moveset: a set of locations where this piece may move
-    """
-    def __init__(self, all_squares, color, location):
-        super().__init__(all_squares, color, location)
-        self.moved = False # used to check castles
-        self.type = self.color + "_rook" # for dictionary key
-
-    def generate_moveset(self):
-        """
-        Generates a moveset for this piece. Rooks can move in straight lines
-        horizontally or vertically until they reach a piece. If the piece
-        is an enemy, that space is a valid move for the rook.
-        """
-        self.moveset = set() # start with an empty set
-        # here we're going to start looking for pieces to add in each of
-        # four directions. it'll first try to add a square, and then if it's
-        # empty it'll move to the next one. if there's a piece in that square,
-        # it'll add it if the piece is an enemy and then stop looking in that
-        # direction. getting to the end of the board will also stop that
-        # direction. this method relies heavily on add_if_okay, which checks
-        # a square and lets this method know whether there are more pieces to
-        # check in that direction.
-
-        for num in range((int(self.location[1])+1),8): # look down
-            if not self.add_if_okay(int(self.location[0]), num):
-                break # stop this direction
-        for num in range((int(self.location[0])+1),8): # look to the right
-            if not self.add_if_okay(num, int(self.location[1])):
-                break # stop this direction
-        for num in range((int(self.location[1])-1),-1,-1): # look up
-            if not self.add_if_okay(int(self.location[0]), num):
-                break # stop this direction
-        for num in range((int(self.location[0])-1),-1,-1): # look to the left
-            if not self.add_if_okay(num, int(self.location[1])):
-                break # stop this direction
-
-class Knight(Piece):
-    """
-    An object of this class represents a knight piece.
-    Attributes:
-        type (string): a string describing the piece with its color and type
-        moveset (set): a set of locations where this piece may move
-    """
-    def __init__(self, all_squares, color, location):
-        super().__init__(all_squares, color, location)
-        self.type = self.color + "_knight" # for dictionary key
-
-    def generate_moveset(self):
-        """
-        Generates a moveset for this piece. Knights can move to a predetermined
-        set of locations relative to their current position. If a location is
-        off the board or occupied by an allied piece, that location is not
-        included in the moveset.
-        """
-        # the knight moveset is hard-coded. we start with the full possible
-        # set of moves.
-        self.moveset = {str(int(self.location[0])-2)+ \
-        str(int(self.location[1])-1),
-        str(int(self.location[0])-2)+str(int(self.location[1])+1),
-        str(int(self.location[0])-1)+str(int(self.location[1])-2),
-        str(int(self.location[0])-1)+str(int(self.location[1])+2),
-        str(int(self.location[0])+1)+str(int(self.location[1])-2),
-        str(int(self.location[0])+1)+str(int(self.location[1])+2),
-        str(int(self.location[0])+2)+str(int(self.location[1])-1),
-        str(int(self.location[0])+2)+str(int(self.location[1])+1)}
-
-        occupied = set() # we'll populate this set with invalid moves
-        for place in self.moveset:
-            if len(place) != 2: # if there's a '-' sign
-                occupied.add(place) # that square is no good
-                continue # immediately check the next square
-            # if the square is not on the board
-            if int(place[0]) not in range(8) or int(place[1]) not in range(8):
-                occupied.add(place) # it's no good
-                continue # immediately check the next square
-            occupier = self.all_squares.get(place).piece
-            if occupier is not None: # if there is a piece there
-                if occupier.color is self.color: # and it's allied
-                    occupied.add(place) # that square is no good
-        self.moveset -= occupied # subtract the invalid squares from the total
-
-class Bishop(Piece):
-    """
-    An object of this class represents a bishop piece.
-    Attributes:
-        type (string): a string describing the piece with its color and type
-        moveset (set): a set of locations where this piece may move
-    """
-    def __init__(self, all_squares, color, location):
-        super().__init__(all_squares, color, location)
-        self.type = self.color + "_bishop" # for dictionary key
-
-    def generate_moveset(self):
-        """
-        Generates a moveset for this piece. Bishops can move in diagonal lines
-        until they reach a piece. If the piece is an enemy, that space is a
-        valid move for the bishop.
-        """
-        self.moveset = set()# start with an empty set
-        # here we're going to start looking for pieces to add in each of
-        # four directions. it'll first try to add a square, and then if it's
-        # empty it'll move to the next one. if there's a piece in that square,
-        # it'll add it if the piece is an enemy and then stop looking in that
-        # direction. getting to the end of the board will also stop that
-        # direction. this method relies heavily on add_if_okay, which checks
-        # a square and lets this method know whether there are more pieces to
-        # check in that direction.
-
-        other = int(self.location[0]) + 1 # start going to the right
-        for num in range((int(self.location[1])+1),8): # and down
-            if not self.add_if_okay(other, num): # if you hit a piece or the end
-                break # stop this direction
-            other += 1 # this is what makes it diagonal
-        other = int(self.location[1]) - 1 # now go up
-        for num in range((int(self.location[0])+1),8): # and to the right
-            if not self.add_if_okay(num, other): # if you hit a piece or the end
-                break # stop this direction
-            other -= 1 # decrement the axis not handled in the for loop
-        other = int(self.location[0]) - 1 # now go to the left
-        for num in range((int(self.location[1])-1),-1,-1): # and up
-            if not self.add_if_okay(other, num): # if you hit a piece or the end
-                break # stop this direction
-            other -= 1 # decrement the axis not handled in the for loop
-        other = int(self.location[1]) + 1 # now go down
-        for num in range((int(self.location[0])-1),-1,-1): # and to the left
-            if not self.add_if_okay(num, other): # if you hit a piece or the end
-                break # stop this direction
-            other += 1 # increment the axis not handled in the for loop
-
-class King(Piece):
-    """
-    An object of this class represents a king piece.
-    Attributes:
-        moved (boolean): False if the piece hasn't moved yet, True as soon as
-            it has
-        type (string): a string describing the piece with its color and type
-        moveset (set): a set of locations where this piece may move
-    """
-    def __init__(self, all_squares, color, location):
-        super().__init__(all_squares, color, location)
-        self.moved = False
-        self.type = self.color + "_king" # for dictionary key
-
-    def generate_moveset(self):
-        """
-        Generates a moveset for this piece. Kings can move to a predetermined
-        set of locations relative to their current position. If a location is
-        off the board or occupied by an allied piece, that location is not
-        included in the moveset.
-        """
-        # the king moveset is hard-coded. we start with the full possible
-        # set of moves.
-        self.moveset = {str(int(self.location[0])-1)+ \
-        str(int(self.location[1])-1),
-        str(int(self.location[0])-1)+str(int(self.location[1])),
-        str(int(self.location[0])-1)+str(int(self.location[1])+1),
-        str(int(self.location[0]))+str(int(self.location[1])-1),
-        str(int(self.location[0]))+str(int(self.location[1])+1),
-        str(int(self.location[0])+1)+str(int(self.location[1])-1),
-        str(int(self.location[0])+1)+str(int(self.location[1])),
-        str(int(self.location[0])+1)+str(int(self.location[1])+1)}
-
-        occupied = set() # we'll populate this set with invalid moves
-        for place in self.moveset:
-            if len(place) != 2: # if there's a '-' sign
-                occupied.add(place) # that square is no good
-                continue # immediately check the next square
-            # if the square is not on the board
-            if int(place[0]) not in range(8) or int(place[1]) not in range(8):
-                occupied.add(place) # it's no good
-                continue # immediately check the next square
-            occupier = self.all_squares.get(place).piece
-            if occupier is not None: # if there is a piece there
-                if occupier.color is self.color: # and it's allied
-                    occupied.add(place) # that square is no good
-        self.moveset -= occupied # subtract the invalid squares from the total
-
-class Queen(Piece):
-    """
-    An object of this class represents a queen piece.
-    Attributes:
-        type (string): a string describing the piece with its color and type
-        moveset (set): a set of locations where this piece may move
-    """
-    def __init__(self, all_squares, color, location):
-        super().__init__(all_squares, color, location)
-        self.type = self.color + "_queen" # for dictionary key
-
-    def generate_moveset(self):
-        """
-        Generates a moveset for this piece. Queens can move in diagonal,
-        horizontal, or vertical lines until they reach a piece. If the piece is
-        an enemy, that space is a valid move for the queen.
-        """
-
-        self.moveset = set() # we'll start with an empty set
-        # here we're going to start looking for pieces to add in each of
-        # eight directions. it'll first try to add a square, and then if it's
-        # empty it'll move to the next one. if there's a piece in that square,
-        # it'll add it if the piece is an enemy and then stop looking in that
-        # direction. getting to the end of the board will also stop that
-        # direction. the latter part of this method relies heavily on
-        # add_if_okay, which checks a square and lets this method know whether
-        # there are more pieces to check in that direction.
-
-        other = int(self.location[0]) + 1 # start going to the right
-        for num in range((int(self.location[1])+1),8): # and down
-            if not self.add_if_okay(other, num): # if you hit a piece or the end
-                break # stop this direction
-            other += 1 # this is what makes it diagonal
-        other = int(self.location[1]) - 1 # now go up
-        for num in range((int(self.location[0])+1),8): # and to the right
-            if not self.add_if_okay(num, other): # if you hit a piece or the end
-                break # stop this direction
-            other -= 1 # decrement the axis not handled in the for loop
-        other = int(self.location[0]) - 1 # now go to the left
-        for num in range((int(self.location[1])-1),-1,-1): # and up
-            if not self.add_if_okay(other, num): # if you hit a piece or the end
-                break # stop this direction
-            other -= 1 # decrement the axis not handled in the for loop
-        other = int(self.location[1]) + 1 # now go down
-        for num in range((int(self.location[0])-1),-1,-1): # and to the left
-            if not self.add_if_okay(num, other): # if you hit a piece or the end
-                break # stop this direction
-            other += 1 # increment the axis not handled in the for loop
-        for num in range((int(self.location[1])+1),8): # look down
-            if not self.add_if_okay(int(self.location[0]), num):
-                break # stop this direction
-        for num in range((int(self.location[0])+1),8): # look to the right
-            if not self.add_if_okay(num, int(self.location[1])):
-                break # stop this direction
-        for num in range((int(self.location[1])-1),-1,-1): # look up
-            if not self.add_if_okay(int(self.location[0]), num):
-                break # stop this direction
-        for num in range((int(self.location[0])-1),-1,-1): # look to the left
-            if not self.add_if_okay(num, int(self.location[1])):
-                break # stop this direction
-
-class Square(object):
-    """
-    An object of this class represents a square on the board.
-    Attributes:
-        location (string): a string representing the square's location
-        piece (Piece): the Piece object "resting" on that Square object
-    """
-    def __init__(self, location):
-        self.location = location # the location of the square, expressed
-        # as a 2-char string. "00" is the top left square, "07" is the bottom
-        # left, "70" is the top right, and "77" is the bottom right.
-        self.piece = None # the piece on this square. None if empty.
+import threading
+import queue
 
 class Chess(object):
 
     """
     An object of this class represents a Chess game, with easy mode, hard mode,
-    and two-player mode.
+    expert mode, and two-player mode.
 
     Attributes:
         parent (Tk): the root Tk object
         argvs (dictionary): a dictionary of switch:argument from the command
             line. Switches are of the form "*light" and arguments are of the
             form "blue".
-        all_squares (dictionary): The keys are two-character strings describing
-            the location of an object on the board, and the values are Squares
-            on the board.
+        game (GameState): the rules state of the game - pieces, squares, moves,
+            and whose turn it is - which this window draws and sends moves to
         frame (Frame): a tkinter Frame that holds the visible game
         menubar (Menu): the complete menu bar
         filemenu (Menu): the "file" menu cascade
@@ -475,12 +102,40 @@ class Chess(object):
         navmenu (Menu): the "navigation" menu cascade
         castlemenu (Menu): the "castling" menu cascade
         helpmenu (Menu): the "help" menu cascade
-        mode (string): "easy" for easy AI play, "hard" for hard AI play, and
-            "human" for 2P matches
+        mode (string): "easy" for easy AI play, "hard" for hard AI play,
+            "expert" for searching AI play, and "human" for 2P matches
+        engine (Engine): the search that chooses the expert AI's moves (a
+            ParallelEngine with the threads switch), or None if the search
+            module isn't available
+        timer (TimeControl): the clock from the most recent timer window,
+            which the expert AI plans its time from while it's running
+        thinking (Thread): the thread in which the AI is choosing a move, on
+            a copy of the game, or None if it isn't thinking. It may not have
+            started yet, if it's waiting for finishing.
+        finishing (Thread): the thread of a cancelled search that hadn't
+            stopped when cancel_ai gave up waiting for it, or None. A new
+            search doesn't start until it has, since they share the engine.
+        pondering (boolean): True if the AI thread thinks on the human's time,
+            for the engine once the thread starts
+        ai_queue (Queue): where the AI thread sends its analysis and its move
+        ai_token (int): counts the AI's moves and cancellations, so that
+            anything sent for a cancelled move can be told apart and ignored
+        ponder_on (boolean): True to let the expert AI think on the human's
+            time, about the reply it expects
+        ponder_move (string): the reply the expert AI is pondering after, or
+            None if it isn't pondering
+        ponder_result (string): the move the pondering found, if it finished
+            before the human moved
+        book (OpeningBook): the opening book the AI plays from, or None
+        book_levels (list): the opponent modes that play from the book
+        tablebases (Tablebases): endgame tables the hard and expert AI play
+            perfectly from, or None
         status_message (Label): a tkinter Label that displays the appropriate
             message when a player wins
-        white_player (Player): a Player object, using the white pieces
-        black_player (Player): a Player object, using the black pieces
+        analysis (string): "iccf" or "san" for the notation of the expert
+            AI's analysis, or "off" to hide it
+        analysis_message (Label): a tkinter Label that shows the expert AI's
+            analysis: depth, score, nodes, speed, and principal variation
         black_king_gif (PhotoImage): a PhotoImage object containing a GIF of
             the black king
         black_queen_gif (PhotoImage): a PhotoImage object containing a GIF of
@@ -515,52 +170,22 @@ class Chess(object):
         board (Canvas): the visible board, containing rectangles and images
         squares (list): the visible squares on the board, composed of black
             and white rectangles
-        black_rook_1 (Rook): the queenside black rook
-        black_knight_1 (Knight): the queenside black knight
-        black_bishop_1 (Bishop): the queenside black bishop
-        black_queen (Queen): the black queen
-        black_king (King): the black king
-        black_bishop_2 (Bishop): the kingside black bishop
-        black_knight_2 (Knight): the kingside black knight
-        black_rook_2 (Rook): the kingside black rook
-        black_pawns (list): a list of black Pawns starting from the left
-        extra_black_queens (list): a list with cells that point to the extra
-            queens that black can unlock via pawn promotion
-        white_pawns (list): a list of white Pawns starting from the left
-        white_knight_1 (Knight): the queenside white knight
-        white_bishop_1 (Bishop): the queenside white bishop
-        white_queen (Queen): the white queen
-        white_king (King): the white king
-        white_bishop_2 (Bishop): the kingside white bishop
-        white_knight_2 (Knight): the kingside white knight
-        white_rook_2 (Rook): the kingside white rook
-        extra_white_queens (list): a list with cells that point to the extra
-            queens that white can unlock via pawn promotion
         replaying (boolean): True if the game is in the middle of replaying a move
         light_square_color (string): a string like "blue" or "#0000ff", for color
         dark_square_color (string): a string like "blue" or "#0000ff", for color
         square_outline_color (string): a string like "blue" or "#0000ff", for color
-        all_pieces (list): a list that points to each piece
         square_overlay (list): a 2D list that refers to each image that rests
             on a square. Squares with no piece have a transparent image, and
             squares with a piece have an image of that piece. This list is
-            compatible with all_squares - a particular cell in one array matches
-            the proper cell in the other array so that each square can contain
-            the proper image.
-        player (Player): a reference to the currently-active Player
+            laid out the same way as squares - a particular cell in one array
+            matches the proper cell in the other array so that each square can
+            contain the proper image.
         first_click (boolean): describes whether the player can expect to select
             a piece with this click. If it's False, the player is currently
             seeing move options for their selected piece.
-        last_ai_piece (Piece): a reference to the last Piece object the AI
-            player moved - allows the program to discourage the AI from moving
-            a piece and ignoring the rest, which also prevents the AI from
-            moving one piece back and forth for several turns
         chosen_piece (Piece): the Piece that a human player has selected with
             their first click
-        last_source (string): a string representation of the last-moved piece's
-            previous location
-        last_target (string): a string representation of the last-moved piece's
-            current location
+        chosen_moves (set): the squares that chosen_piece can legally move to
         dragged_piece (int): an int representation of the PhotoImage to be
             dragged around in click-drag mode
         sound_folder (string): Folder containing the sound files.
@@ -572,13 +197,8 @@ class Chess(object):
             volumes by filename
         bg_init (bool): whether it's the first load
         bg_present (str/bool): the bg filename, or False
-        movelist (list): a list of moves, in the form of "0077" for moving from
-            top left corner to bottom right corner, or "wl" for white
-            castling queenside
         savename (string): the current filename for the active game. Is blank
             after starting a new game.
-        replaycounter (int): an int that tells us what move we're on, to keep track
-            of where we are within the movelist
         screen_size (int): the width and height of the canvas, in pixels
         unsaved_changes (boolean): True if there are new moves in the movelist in
             memory that have not yet been saved to disk
@@ -589,8 +209,6 @@ class Chess(object):
         movelist_box (Listbox): a listbox to display the game's moves
         movelist_scrollbar (Scrollbar): a scrollbar for movelist_box
         movelist_box_top (int): the index of the top visible item in the movelist_box
-        white_promo (str): a character '1', '2', '3', or '4' that represents the next white promo
-        black_promo (str): a character '1', '2', '3', or '4' that represents the next black promo
     """
     def __init__(self, parent):
     
@@ -618,13 +236,27 @@ class Chess(object):
         # *audio on off
         # *blackui click drag
         # *whiteui click drag
-        # *opponent easy hard human
+        # *opponent easy hard expert human
         # *size int
         # *light color
         # *dark color
         # *outline color
         # *savefile file
         # *bg file
+        # *movegen mailbox bitboard
+        # *movesets incremental full check
+        # *hash megabytes
+        # *depth int
+        # *nodes int
+        # *movetime seconds
+        # *pruning all none null lmr futility
+        # *evaluation material full
+        # *threads int
+        # *ponder on off
+        # *book file
+        # *booklevels easy hard expert
+        # *tablebases folder
+        # *analysis iccf san off
         
         # Here's the frame:
         self.frame = Frame(parent)
@@ -646,7 +278,11 @@ class Chess(object):
                 except:
                     pass # we'll just stick with 1
                 
-        self.last_source = self.chosen_piece = True # these can safely be checked and approved with an 'if'
+        self.chosen_piece = True # this can safely be checked and approved with an 'if'
+        
+        # The rules state of the game, including both players and the default
+        # pawn promotions. This window only draws it and passes it moves.
+        self.game = GameState()
         
         # Menu bar!
         self.menubar = Menu(parent)
@@ -672,6 +308,7 @@ class Chess(object):
         # lambda functions! all these do is define an inline function that calls self.set_opponent with a parameter
         self.opponentmenu.add_command(label="Easy AI", command=(lambda: self.set_opponent("easy")), state=DISABLED)
         self.opponentmenu.add_command(label="Hard AI", command=(lambda: self.set_opponent("hard")))
+        self.opponentmenu.add_command(label="Expert AI", command=(lambda: self.set_opponent("expert")))
         self.opponentmenu.add_command(label="Human", command=(lambda: self.set_opponent("human")))
         self.audiomenu = Menu(self.settingsmenu, tearoff=0)
         self.audiomenu.add_command(label="Choose volumes...", command=self.choose_audio_levels, underline=0, accelerator="Ctrl+A")
@@ -735,6 +372,76 @@ class Chess(object):
         
         # The game starts on easy mode without making the player press a button.
         self.mode = "easy"
+        if self.argvs.get('movegen') == "bitboard": # look for the movegen switch
+            self.game.backend = "bitboard" # generate movesets with bitboards
+        tempmovesets = self.argvs.get('movesets') # look for the movesets switch
+        if tempmovesets == "full": # regenerate every moveset every time
+            self.game.incremental = False
+        elif tempmovesets == "check": # check each update against a full one
+            self.game.check_movesets = True
+        temphash = self.argvs.get('hash') # look for the hash switch
+        if temphash and temphash.isdigit() and int(temphash) > 0: # if it's a valid size
+            self.game.hash_megabytes = int(temphash) # size the transposition table
+        # the expert opponent searches until it reaches one of these limits,
+        # or plans its time from a running clock
+        self.timer = None
+        self.engine = Engine(self.game) if Engine else None
+        tempthreads = self.argvs.get('threads') # look for the threads switch
+        if self.engine and ParallelEngine and tempthreads and tempthreads.isdigit() and \
+        int(tempthreads) > 1: # search with helper processes
+            self.engine = ParallelEngine(self.game, int(tempthreads))
+        if self.engine:
+            tempdepth = self.argvs.get('depth') # look for the depth switch
+            if tempdepth and tempdepth.isdigit() and int(tempdepth) > 0:
+                self.engine.max_depth = int(tempdepth) # plies
+            tempnodes = self.argvs.get('nodes') # look for the nodes switch
+            if tempnodes and tempnodes.isdigit() and int(tempnodes) > 0:
+                self.engine.max_nodes = int(tempnodes) # positions
+            tempmovetime = self.argvs.get('movetime') # look for the movetime switch
+            try:
+                if float(tempmovetime) > 0:
+                    self.engine.max_time = float(tempmovetime) # seconds
+            except (TypeError, ValueError): # missing or not a number
+                pass
+            temppruning = self.argvs.get('pruning') # look for the pruning switch
+            if temppruning: # turn on just the techniques listed, like "null lmr"
+                techniques = temppruning.split()
+                self.engine.null_move = "all" in techniques or "null" in techniques
+                self.engine.late_move_reductions = "all" in techniques or "lmr" in techniques
+                self.engine.futility = "all" in techniques or "futility" in techniques
+            tempevaluation = self.argvs.get('evaluation') # look for the evaluation switch
+            if tempevaluation == "full" and evaluation and evaluation.numpy is not None:
+                self.engine.evaluate = evaluation.evaluate # sees more, but searches less deeply
+            self.engine.abort = threading.Event() # for cancelling a search
+        # the AI thinks in another thread, so that the window keeps responding
+        self.thinking = None
+        self.finishing = None
+        self.pondering = False
+        self.ai_queue = queue.Queue()
+        self.ai_token = 0
+        # and thinks on the human's time too, unless told not to
+        self.ponder_on = self.argvs.get('ponder') != "off" # look for the ponder switch
+        self.ponder_move = None
+        self.ponder_result = None
+        # the AI plays its opening moves from a book, if it's given one
+        self.book = None
+        tempbook = self.argvs.get('book') # look for the book switch
+        if tempbook and OpeningBook:
+            try:
+                self.book = OpeningBook(tempbook)
+            except OSError: # a missing or unreadable file
+                print("The opening book " + tempbook + " could not be opened.")
+        self.book_levels = ["hard", "expert"] # the easy AI just plays anything
+        tempbooklevels = self.argvs.get('booklevels') # look for the booklevels switch
+        if tempbooklevels: # use the book for just the levels listed, like "easy expert"
+            self.book_levels = tempbooklevels.split()
+        # and plays its endgames from tablebases, if there are any
+        self.tablebases = None
+        temptablebases = self.argvs.get('tablebases', "tablebases") # look for the tablebases switch
+        if Tablebases and os.path.isdir(temptablebases):
+            self.tablebases = Tablebases(temptablebases)
+            if self.engine: # the expert AI looks them up as it searches
+                self.engine.tablebases = self.tablebases
         tempopponent = self.argvs.get('opponent') # look for the opponent switch
         if tempopponent: # if the value wasn't None,
             self.set_opponent(tempopponent) # set the opponent
@@ -742,18 +449,16 @@ class Chess(object):
         # Status message. When the game ends, the result is described here.
         self.status_message = Label(self.frame, text="Welcome to Chess!")
         self.status_message.grid(row=1, column = 0)
-        
-        # Create the two players, white and black.
-        self.white_player = Player("white")
-        self.black_player = Player("black")
-        
-        # Set a default pawn promotion to queen for each player.
-        self.white_promo = '1'
-        self.black_promo = '1'
+        # Analysis. While the expert AI thinks, its best line is shown here.
+        self.analysis = "iccf"
+        if self.argvs.get('analysis') in ("iccf", "san", "off"): # look for the analysis switch
+            self.analysis = self.argvs.get('analysis')
+        self.analysis_message = Label(self.frame, text="", wraplength=self.screen_size)
+        self.analysis_message.grid(row=2, column=0)
         
         # Disable the menu options for the current default promotion
-        self.blackpromomenu.entryconfig(int(self.black_promo)-1, state=DISABLED)
-        self.whitepromomenu.entryconfig(int(self.white_promo)-1, state=DISABLED)
+        self.blackpromomenu.entryconfig(int(self.game.black_promo)-1, state=DISABLED)
+        self.whitepromomenu.entryconfig(int(self.game.white_promo)-1, state=DISABLED)
 
         """
         Default sounds from http://www.trekcore.com/audio:
@@ -902,7 +607,6 @@ class Chess(object):
         """
         # This generates the board. Rectangles are saved to a 2D array.
         self.board = Canvas(self.frame, width=self.screen_size, height = self.screen_size)
-        self.last_source = None
         range8 = range(8) # make a range(8) object and save it
         
         if self.bg_init:
@@ -949,88 +653,12 @@ class Chess(object):
         self.movelist_scrollbar.grid(row=0, column=2, sticky='NS')
         self.movelist_box.grid(row=0, column=1, sticky='NS')
         try: # fill the movelist box if there's a movelist
-            self.movelist_box.insert(END, *cn.chess11_to_iccf_full(self.movelist))
+            self.movelist_box.insert(END, *cn.chess11_to_iccf_full(self.game.movelist))
         except AttributeError: # if not, do nothing
             pass
 
-        # Make a dictionary of location:Square.
-        self.all_squares = {str(row)+str(column):Square(str(row)+str(column))
-            for row in range8 for column in range8}
-
-        # The pieces.
-        self.black_rook_1 = Rook(self.all_squares, "black", "00")
-        self.black_knight_1 = Knight(self.all_squares, "black", "10")
-        self.black_bishop_1 = Bishop(self.all_squares, "black", "20")
-        self.black_queen = Queen(self.all_squares, "black", "30")
-        self.black_king = King(self.all_squares, "black", "40")
-        self.black_bishop_2 = Bishop(self.all_squares, "black", "50")
-        self.black_knight_2 = Knight(self.all_squares, "black", "60")
-        self.black_rook_2 = Rook(self.all_squares, "black", "70")
-        self.black_pawns = [Pawn(self.all_squares, "black", str(i)+'1') for i in range8]
-        self.extra_black_queens = [Queen(self.all_squares, "black", "88") for i in range8]
-        self.extra_black_rooks = [Rook(self.all_squares, "black", "88") for i in range8]
-        self.extra_black_bishops = [Bishop(self.all_squares, "black", "88") for i in range8]
-        self.extra_black_knights = [Knight(self.all_squares, "black", "88") for i in range8]
-
-        self.white_pawns = [Pawn(self.all_squares, "white", str(i)+'6') for i in range8]
-        self.white_rook_1 = Rook(self.all_squares, "white", "07")
-        self.white_knight_1 = Knight(self.all_squares, "white", "17")
-        self.white_bishop_1 = Bishop(self.all_squares, "white", "27")
-        self.white_queen = Queen(self.all_squares, "white", "37")
-        self.white_king = King(self.all_squares, "white", "47")
-        self.white_bishop_2 = Bishop(self.all_squares, "white", "57")
-        self.white_knight_2 = Knight(self.all_squares, "white", "67")
-        self.white_rook_2 = Rook(self.all_squares, "white", "77")
-        self.extra_white_queens = [Queen(self.all_squares, "white", "88") for i in range8]
-        self.extra_white_rooks = [Rook(self.all_squares, "white", "88") for i in range8]
-        self.extra_white_bishops = [Bishop(self.all_squares, "white", "88") for i in range8]
-        self.extra_white_knights = [Knight(self.all_squares, "white", "88") for i in range8]
-
-        # This will put pieces in each square to set up the game.
-        self.all_squares.get("00").piece = self.black_rook_1
-        self.all_squares.get("10").piece = self.black_knight_1
-        self.all_squares.get("20").piece = self.black_bishop_1
-        self.all_squares.get("30").piece = self.black_queen
-        self.all_squares.get("40").piece = self.black_king
-        self.all_squares.get("50").piece = self.black_bishop_2
-        self.all_squares.get("60").piece = self.black_knight_2
-        self.all_squares.get("70").piece = self.black_rook_2
-        
-        for p in range8:
-            self.all_squares.get(str(p)+'1').piece = self.black_pawns[p]
-            self.all_squares.get(str(p)+'6').piece = self.white_pawns[p]
-        
-        self.all_squares.get("07").piece = self.white_rook_1
-        self.all_squares.get("17").piece = self.white_knight_1
-        self.all_squares.get("27").piece = self.white_bishop_1
-        self.all_squares.get("37").piece = self.white_queen
-        self.all_squares.get("47").piece = self.white_king
-        self.all_squares.get("57").piece = self.white_bishop_2
-        self.all_squares.get("67").piece = self.white_knight_2
-        self.all_squares.get("77").piece = self.white_rook_2
-
-        # this will store the Piece objects in a list so that they can be easily
-        # iterated through later on
-        self.all_pieces = [self.black_rook_1, self.black_knight_1,
-        self.black_bishop_1, self.black_queen, self.black_king,
-        self.black_bishop_2, self.black_knight_2, self.black_rook_2] + self.black_pawns
-
-        for i in range8:
-            self.all_pieces.append(self.extra_black_queens[i])
-            self.all_pieces.append(self.extra_black_rooks[i])
-            self.all_pieces.append(self.extra_black_bishops[i])
-            self.all_pieces.append(self.extra_black_knights[i])
-
-        self.all_pieces += (self.white_pawns +
-        [self.white_rook_1, self.white_knight_1, self.white_bishop_1,
-        self.white_queen, self.white_king, self.white_bishop_2,
-        self.white_knight_2, self.white_rook_2])
-
-        for i in range8:
-            self.all_pieces.append(self.extra_white_queens[i])
-            self.all_pieces.append(self.extra_white_rooks[i])
-            self.all_pieces.append(self.extra_white_bishops[i])
-            self.all_pieces.append(self.extra_white_knights[i])
+        # Put every piece back where it starts.
+        self.game.setup()
 
         self.square_overlay = [] # a list of all the piece icons or transparent
         # images that can rest on any given square
@@ -1048,11 +676,8 @@ class Chess(object):
         # look at the state of the board and put images where needed
         self.refresh_images()
 
-        # Now generate initial movesets.
-        self.generate_all_movesets()
-
         # Bind the left mouse button to the new board.
-        if self.white_player.mode == "click":
+        if self.game.white_player.mode == "click":
             self.board.bind("<Button-1>", self.click_click)
         else:
             self.board.bind("<Button-1>", self.click_hold)
@@ -1083,9 +708,6 @@ class Chess(object):
         if self.audio and not self.replaying: # if audio is on
             self.sound_filenames.get("game_start.ogg").play() # play 'game_start'
             
-        # Make sure the first player is white.
-        self.player = self.white_player
-
         # Checks if any castling moves are available.
         # At this point, they won't be.
         self.check_castles()
@@ -1095,10 +717,6 @@ class Chess(object):
         # square moves the selected piece to the clicked square.
         self.first_click = True
 
-        self.last_ai_piece = self.black_king # the AI needs to check what piece
-        # it moved last, so this makes sure it can do that even before its first
-        # move
-
     def console(self):
         self.console_execute = lambda *x: exec(compile(self.console_text.get('1.0', 'end'), '<string>', 'exec'))
         self.console_execute_selection = lambda *x: exec(compile(self.console_text.get('sel.first', 'sel.last'), '<string>', 'exec'))
@@ -1186,20 +804,14 @@ class Chess(object):
         self.screen_size = size # save the new size
         
         self.parent.geometry("{}x{}".format(size+55,size+25)) # set the window size to match the board
-        if len(self.movelist) == 0 or self.replaycounter ==0: # if the movelist is empty or we're at the start
+        if len(self.game.movelist) == 0 or self.game.replaycounter ==0: # if the movelist is empty or we're at the start
             try:
                 self.board.destroy() # destroy it if it's there
             except:
                 pass # if not, fine
             self.draw_board() # and redraw it
         else: # if there are moves to do,
-            self.replaycounter +=1 # advance the replay counter by 1
-            tempsuppressaudio = self.audio # note if we have to suppress audio
-            if tempsuppressaudio: # if we do,
-                self.audio = False # suppress it
-            self.step_back() # and go 'back' to there, which puts us at the same place
-            if tempsuppressaudio: # if we did,
-                self.audio = True # turn it back on
+            self.replay_to(self.game.replaycounter) # replay them on a new board
         
         self.load_icons(self.icon_folder) # reload the icons for the new size
         self.refresh_images() # and refresh them
@@ -1398,6 +1010,9 @@ class Chess(object):
             timer = tc.TimeControl(p1time=p1time, p2time=p2time, p1_byo_yomi=p1_by, p2_byo_yomi=p2_by)
         timer.start()
         timer.pause()
+        self.timer = timer # the expert AI follows the newest clock
+        if self.engine:
+            self.engine.timer = timer
         timerwindow = Toplevel()
         timerwindow.title("Timer")
         try: # try to load an img for the window's icon (top left corner of title bar)
@@ -1663,19 +1278,22 @@ class Chess(object):
     
     def set_opponent(self, opponent):
         """
-        Sets the opponent mode to 'easy', 'hard', or 'human', then pops an info box.
+        Sets the opponent mode to 'easy', 'hard', 'expert', or 'human', then pops an info box.
         Parameter:
             opponent (string): the mode to be changed to
         """
+        self.cancel_ai() # a move already being chosen is for the old opponent
         self.mode = opponent # set the mode to the given opponent
-        for i in range(3): # go through 0 to 3
+        for i in range(4): # go through 0 to 4
             self.opponentmenu.entryconfig(i, state=NORMAL) # make those opponentmenu ids NORMAL
         if opponent == "easy": # if easy was selected
             self.opponentmenu.entryconfig(0, state=DISABLED) # disable
         elif opponent == "hard": # if hard was selected
             self.opponentmenu.entryconfig(1, state=DISABLED) # disable
+        elif opponent == "expert": # if expert was selected
+            self.opponentmenu.entryconfig(2, state=DISABLED) # disable
         else: # otherwise
-            self.opponentmenu.entryconfig(2, state=DISABLED) # disable human
+            self.opponentmenu.entryconfig(3, state=DISABLED) # disable human
         if self.audio:
             messagebox.showinfo(title="Opponent changed", message="Opponent mode changed to " + opponent + ".") # and note such
         else:
@@ -1683,16 +1301,16 @@ class Chess(object):
     
     def set_promotion(self, color, piece):
         if color=='black':
-            self.black_promo = piece
+            self.game.black_promo = piece
         else:
-            self.white_promo = piece
+            self.game.white_promo = piece
         
         for i in range(4):
             self.blackpromomenu.entryconfig(i, state=NORMAL)
             self.whitepromomenu.entryconfig(i, state=NORMAL)
         
-        self.blackpromomenu.entryconfig(int(self.black_promo)-1, state=DISABLED)
-        self.whitepromomenu.entryconfig(int(self.white_promo)-1, state=DISABLED)
+        self.blackpromomenu.entryconfig(int(self.game.black_promo)-1, state=DISABLED)
+        self.whitepromomenu.entryconfig(int(self.game.white_promo)-1, state=DISABLED)
     
     def new_game(self, *args):
         """
@@ -1710,6 +1328,7 @@ class Chess(object):
                 if not self.save_plain(): # but then they canceled the save itself
                     return # that's a return
         
+        self.cancel_ai() # the AI's move would be for the old game
         try:
             self.board.destroy() # destroy it if it's there
         except:
@@ -1717,9 +1336,9 @@ class Chess(object):
         self.draw_board() # then make a new one
         
         self.savename = "" # a save name will need to be chosen
-        self.movelist = [] # a fresh movelist
+        self.game.movelist = [] # a fresh movelist
         self.movelist_box.delete(0, END)
-        self.replaycounter = 0 # start from the beginning of a new match
+        self.game.replaycounter = 0 # start from the beginning of a new match
         self.unsaved_changes = False
 
         # Set a status message.
@@ -1727,24 +1346,54 @@ class Chess(object):
         
     def step_back(self, *args):
         """
-        Move back one step in a replay. Nothing ever actually moves backwards - it works
-        by going to the beginning and stepping forward all the way until one move prior to
-        where it was.
+        Move back one step in a replay, taking back the last move with the
+        game's undo record.
         Parameter:
             *args: may or may not include an event
         """
-        self.movelist_box_top = self.movelist_box.nearest(0) # save the current movelist_box_top
         # if there are no loaded moves, or we're already at the the very beginning
-        if not (self.movelist and self.replaycounter):
+        if not (self.game.movelist and self.game.replaycounter):
             return # return and do nothing
-        count = self.replaycounter - 1 # decrement the replay counter by 1
+        self.step_back_to(self.game.replaycounter - 1) # go back by 1
+
+    def step_back_to(self, count):
+        """
+        Takes back moves until the replay is at the given move.
+        Parameter:
+            count (int): the number of moves to leave on the board
+        """
+        self.movelist_box_top = self.movelist_box.nearest(0) # save the current movelist_box_top
+        self.cancel_ai() # the AI's move would be for a later position
+        while self.game.replaycounter > count: # while we're past that move
+            self.game.unmake_move() # take one back
+            self.game.replaycounter -= 1
+        if self.audio: # if audio is on
+            self.sound_filenames.get("undo.ogg").play() # play the 'undo' sound
+        self.first_click = True # forget any half-chosen move
+        if not self.game.winner: # if the game continues
+            if self.game.player.mode == "click": # if it's click mode
+                self.board.bind("<Button-1>", self.click_click) # bind that
+            else: # otherwise
+                self.board.bind("<Button-1>", self.click_hold) # bind drag
+        self.check_castles()
+        if self.game.movelist and len(self.game.movelist[count-1])!=2:
+            self.refresh_highlighting()
+        self.refresh_images()
+        self.parent.after(1, self.refresh_movelist_box)
+
+    def replay_to(self, count):
+        """
+        Redraws the board and replays the movelist from the beginning up to
+        the given move. Used when the board itself has to be recreated.
+        Parameter:
+            count (int): the number of moves to replay
+        """
+        self.movelist_box_top = self.movelist_box.nearest(0) # save the current movelist_box_top
         self.step_start(wait=True) # go to the beginning
         for i in range(count): # go forward that number of times
             self.step_forward(wait=True)
-        if self.audio: # if audio is on
-            self.sound_filenames.get("undo.ogg").play() # play the 'undo' sound
         self.check_castles()
-        if self.movelist and len(self.movelist[count-1])!=2:
+        if self.game.movelist and len(self.game.movelist[count-1])!=2:
             self.refresh_highlighting()
         self.refresh_images()
         self.parent.after(1, self.refresh_movelist_box)
@@ -1757,7 +1406,7 @@ class Chess(object):
         """
         # if the movelist is empty or we're at the end of the replay (counter
         # for next move matches length of list)
-        if len(self.movelist) == 0 or len(self.movelist) == self.replaycounter:
+        if len(self.game.movelist) == 0 or len(self.game.movelist) == self.game.replaycounter:
             return # don't do anything
         
         if self.audio: # if audio is on,
@@ -1766,7 +1415,7 @@ class Chess(object):
         else: # otherwise,
             allow = True # set a permissive flag
         
-        do_move = self.movelist[self.replaycounter] # save the next string in the movelist
+        do_move = self.game.movelist[self.game.replaycounter] # save the next string in the movelist
         self.replaying = True # tell the castle functions we're replaying, not really playing
         if do_move == "bl": # if it's 'bl',
             self.castle_black_left() # castle black left
@@ -1777,10 +1426,10 @@ class Chess(object):
         elif do_move == "wr": # if it's 'wr',
             self.castle_white_right() # castle white right
         else: # if it's not a castle, it's a regular move
-            self.move(self.all_squares.get(do_move[0:2]).piece, do_move[2:]) # do the move
+            self.move(self.game.board[to_square(do_move[0:2])], do_move[2:]) # do the move
         self.replaying = False # ready to play for real again
         
-        self.replaycounter += 1 # increase the counter for the next move
+        self.game.replaycounter += 1 # increase the counter for the next move
         if not allow: # if audio was suppressed,
             self.audio = audio # turn it back on
         if not kwargs.get('wait'): # if we weren't told to wait til the end,
@@ -1797,13 +1446,15 @@ class Chess(object):
         Parameter:
             *args: may or may not include an event
         """
+        if not kwargs.get('wait'): # if we're really going back, not redrawing
+            self.cancel_ai() # the AI's move would be for a later position
         self.replaying = True
         try:
             self.board.destroy() # destroy the board if it's there
         except:
             pass # if not, fine
         self.draw_board() # redraw it
-        self.replaycounter = 0 # start from the beginning of a replay
+        self.game.replaycounter = 0 # start from the beginning of a replay
         self.replaying = False
         if not kwargs.get('wait'):
             self.refresh_movelist_box()
@@ -1814,12 +1465,12 @@ class Chess(object):
         Parameter:
             *args: may or may not include an event
         """
-        if not self.movelist: # if the movelist is empty
+        if not self.game.movelist: # if the movelist is empty
             return # do nothing
-        while len(self.movelist) > self.replaycounter: # while we're not at the end of the movelist
+        while len(self.game.movelist) > self.game.replaycounter: # while we're not at the end of the movelist
             self.step_forward(wait=True) # step forward
         self.check_castles()
-        if self.movelist and len(self.movelist[-1])!=2:
+        if self.game.movelist and len(self.game.movelist[-1])!=2:
             self.refresh_highlighting()
         self.refresh_images()
         self.refresh_movelist_box()
@@ -1828,9 +1479,11 @@ class Chess(object):
         """
         Goes to the selected move.
         """
-        self.replaycounter = self.movelist_box.index(ACTIVE)+2 # set the replay counter we want,
-        # taking into account the 0-indexing/1-indexing, and the fact that step_back goes back by 1
-        self.step_back()
+        count = self.movelist_box.index(ACTIVE)+1 # the move we want, taking
+        # into account the 0-indexing/1-indexing
+        while self.game.replaycounter < count: # if it's ahead of us
+            self.step_forward(wait=True) # step forward to it
+        self.step_back_to(count) # if it's behind us, take moves back to it
         
     def help(self, *args):
         """
@@ -1900,7 +1553,7 @@ class Chess(object):
         """
         try: # write the movelist to a file with the specified name
             with open(filename, 'w', encoding='utf-8-sig') as output:
-                for item in self.movelist:
+                for item in self.game.movelist:
                     output.write(item + "\n")
             self.unsaved_changes = False # they just saved, so there are no unsaved changes
         except: # if that doesn't work for some reason, say so
@@ -1964,6 +1617,7 @@ class Chess(object):
             if not filename: # if they hit cancel, returning an empty string
                 return # just return
                 
+        self.cancel_ai() # the AI's move would be for the old game
         try:
             self.board.destroy() # destroy it if it's there
         except:
@@ -1972,17 +1626,17 @@ class Chess(object):
         # and load the specified save file into a movelist
         try: # open the specified file and write the contents to the list
             with open(filename, 'r', encoding='utf-8-sig') as file:
-                self.movelist = [line.rstrip() for line in file]
+                self.game.movelist = [line.rstrip() for line in file]
                 # the text file appears to end with a blank line, but that's really just the
                 # \n of the previous line, so there's no extraneous empty item at the end of the list.
             if iccf: # to import an ICCF game:
                 cn.model = cn.new_game() # reinitialize the model just in case
                 cn.result = [] # reinitialize the result just in case
-                self.movelist = [cn.do_move(move) for move in self.movelist]
+                self.game.movelist = [cn.do_move(move) for move in self.game.movelist]
             self.movelist_box.delete(0, END) # delete the existing contents of the movelist box
-            for item in self.movelist: # go through the movelist
+            for item in self.game.movelist: # go through the movelist
                 self.movelist_box.insert(END, cn.chess11_to_iccf_move(item)) # and add each item to the movelist box
-            self.replaycounter = 0 # start from the beginning of a new match
+            self.game.replaycounter = 0 # start from the beginning of a new match
             self.unsaved_changes = False
             if messagebox.askyesno(title="Load successful", message="Game loaded. Go to the most recent move?"):
                 self.step_end()
@@ -1998,115 +1652,22 @@ class Chess(object):
         Checks if anyone can castle, then makes the appropriate buttons
             available.
         """
-        # if the castling area is empty, it's that player's turn, and the rook
-        # and king haven't moved, enable. else, disable. if the game is over,
-        # the buttons are disabled.
-        if(not self.black_rook_1.moved and not self.black_king.moved and
-        self.black_king.location != "88" and \
-        self.white_king.location != "88" and
-        self.all_squares.get("10").piece is None and
-        self.all_squares.get("20").piece is None and
-        self.all_squares.get("30").piece is None):
-            self.castlemenu.entryconfig(0, state=NORMAL)
-        else:
-            self.castlemenu.entryconfig(0, state=DISABLED)
-        if(not self.black_rook_2.moved and not self.black_king.moved and
-        self.black_king.location != "88" and \
-        self.white_king.location != "88" and
-        self.player is self.black_player and
-        self.all_squares.get("50").piece is None and
-        self.all_squares.get("60").piece is None):
-            self.castlemenu.entryconfig(1, state=NORMAL)
-        else:
-            self.castlemenu.entryconfig(1, state=DISABLED)
-        if(not self.white_rook_1.moved and not self.white_king.moved and
-        self.black_king.location != "88" and \
-        self.white_king.location != "88" and
-        self.player is self.white_player and
-        self.all_squares.get("17").piece is None and
-        self.all_squares.get("27").piece is None and
-        self.all_squares.get("37").piece is None):
-            self.castlemenu.entryconfig(3, state=NORMAL)
-        else:
-            self.castlemenu.entryconfig(3, state=DISABLED)
-        if(not self.white_rook_2.moved and not self.white_king.moved and
-        self.black_king.location != "88" and \
-        self.white_king.location != "88" and
-        self.player is self.white_player and
-        self.all_squares.get("57").piece is None and
-        self.all_squares.get("67").piece is None):
-            self.castlemenu.entryconfig(4, state=NORMAL)
-        else:
-            self.castlemenu.entryconfig(4, state=DISABLED)
-
-    def generate_all_movesets(self):
-        """
-        Goes through each piece and generates a moveset for it.
-        """
-        self.black_rook_1.generate_moveset()
-        self.black_knight_1.generate_moveset()
-        self.black_bishop_1.generate_moveset()
-        self.black_queen.generate_moveset()
-        self.black_king.generate_moveset()
-        self.black_bishop_2.generate_moveset()
-        self.black_knight_2.generate_moveset()
-        self.black_rook_2.generate_moveset()
-        for l in [self.black_pawns, self.extra_black_bishops, self.extra_black_knights, self.extra_black_queens, self.extra_black_rooks]:
-            for p in l:
-                p.generate_moveset()
-
-        self.white_rook_1.generate_moveset()
-        self.white_knight_1.generate_moveset()
-        self.white_bishop_1.generate_moveset()
-        self.white_queen.generate_moveset()
-        self.white_king.generate_moveset()
-        self.white_bishop_2.generate_moveset()
-        self.white_knight_2.generate_moveset()
-        self.white_rook_2.generate_moveset()
-        for l in [self.white_pawns, self.extra_white_bishops, self.extra_white_knights, self.extra_white_queens, self.extra_white_rooks]:
-            for p in l:
-                p.generate_moveset()
+        # the game state decides who can castle, in menu order: black
+        # queenside, black kingside, white queenside, white kingside
+        for entry, available in zip((0, 1, 3, 4), self.game.castle_options()):
+            if available:
+                self.castlemenu.entryconfig(entry, state=NORMAL)
+            else:
+                self.castlemenu.entryconfig(entry, state=DISABLED)
 
     def easy_move(self):
         """
         This does nothing but choose a valid piece and move, and carry it out.
         """
-        # create a set of all AI pieces
-        living_pieces = {self.black_rook_1, self.black_knight_1,
-        self.black_bishop_1, self.black_queen, self.black_king,
-        self.black_bishop_2, self.black_knight_2, self.black_rook_2} | set(self.black_pawns)
-        for l in [self.extra_black_bishops, self.extra_black_knights, self.extra_black_queens, self.extra_black_rooks]:
-            for extra in l:
-                living_pieces.add(extra)
-
-        dead_pieces = set() # empty set for invalid AI pieces
-        self.generate_all_movesets()
-        for piece in living_pieces:
-            # if a piece is dead or has no available moves
-            if piece.location == "88" or len(piece.moveset) == 0:
-                dead_pieces.add(piece) # add to this set
-        living_pieces -= dead_pieces # remove this set from the total
-
-        piece_to_move = sample(living_pieces, 1)[0] # pick a random piece
-        move = sample(piece_to_move.moveset, 1)[0] # and a random move
-
-        for piece in living_pieces:
-            if self.white_king.location in piece.moveset: # if the AI win now
-                piece_to_move = piece # use an appropriate piece
-                move = self.white_king.location # and win
-
-        # truncate and write the move in the movelist
-        self.movelist = self.movelist[:self.replaycounter]
-        self.movelist_box.delete(self.replaycounter, END) # truncate the movelist box
-        self.replaycounter += 1
-        self.movelist.append(piece_to_move.location + move)
-        self.movelist_box.insert(END, cn.chess11_to_iccf_move(self.movelist[-1])) # write the move to the movelist box
-        self.move(piece_to_move, move) # carry out the move
-        self.unsaved_changes = True # note that there are unsaved changes to this game
-        self.check_castles() # check castling buttons
-        # if audio is on and the AI didn't just win
-        if self.audio and self.white_king.location != "88":
-            self.sound_filenames.get("computer_move.ogg").play() # play the 'computer_move' sound
+        def choose(game):
+            piece, move = game.easy_move()
+            return piece.location + to_location(move)
+        self.think(choose)
 
     def hard_move(self):
         """
@@ -2114,133 +1675,275 @@ class Chess(object):
         the threat or by fleeing. Tries to avoid moving the king too much or
         moving the same piece back and forth repeatedly.
         """
-        # create a set of all AI pieces
-        living_pieces = {self.black_rook_1, self.black_knight_1,
-        self.black_bishop_1, self.black_queen, self.black_king,
-        self.black_bishop_2, self.black_knight_2, self.black_rook_2} | set(self.black_pawns)
-        for l in [self.extra_black_bishops, self.extra_black_knights, self.extra_black_queens, self.extra_black_rooks]:
-            for extra in l:
-                living_pieces.add(extra)
-
-        dead_pieces = set() # empty set for invalid AI pieces
-        self.generate_all_movesets()
-        for piece in living_pieces:
-            # if a piece is dead or has no available moves
-            if piece.location == "88" or len(piece.moveset) == 0:
-                dead_pieces.add(piece) # add to this set
-        living_pieces -= dead_pieces # remove this set from the total
+        def choose(game):
+            piece, move = game.hard_move()
+            return piece.location + to_location(move)
+        self.think(choose)
 
-        piece_to_move = sample(living_pieces, 1)[0] # pick a random piece
-        move = sample(piece_to_move.moveset, 1)[0] # and a random move
-
-        # make a set of all enemy pieces
-        enemy_pieces = {self.white_rook_1, self.white_knight_1,
-        self.white_bishop_1, self.white_queen, self.white_king,
-        self.white_bishop_2, self.white_knight_2, self.white_rook_2} | self.white_pawns
-        for l in [self.extra_white_bishops, self.extra_white_knights, self.extra_white_queens, self.extra_white_rooks]:
-            for extra in l:
-                enemy_pieces.add(extra)
+    def expert_move(self):
+        """
+        Searches ahead for the best move within the engine's limits, and
+        carries it out.
+        """
+        if not self.engine: # without the search module, play a hard move
+            self.hard_move()
+            return
+        # the AI presses a running clock for White, and then for itself once
+        # it has moved
+        if self.timer and self.timer.turn == 1:
+            self.timer.switch()
+        self.think(self.search_move)
 
-        dead_enemies = set() # make an empty set for nonthreatening enemies
-        for piece in enemy_pieces:
-            # if a piece is dead or has no available moves
-            if piece.location == "88" or len(piece.moveset) == 0:
-                dead_enemies.add(piece) # consider it dead
-        enemy_pieces -= dead_enemies # remove this set from the total
+    def search_move(self, game):
+        """
+        Returns the expert AI's move for a game, searched by the engine. Runs
+        in the AI's thread.
+        Parameter:
+            game (GameState): the copy of the game to search
+        """
+        self.engine.state = game
+        return self.engine.search()
 
-        enemy_moves = set() # make an empty set for enemy moves
-        for piece in enemy_pieces:
-            enemy_moves |= piece.moveset # add all pieces' moves to this set
+    def start_ponder(self, move):
+        """
+        Has the expert AI think during the human's turn, about the position
+        after the reply it expects (the next move in its principal
+        variation), so that if the human plays it, the search is already
+        under way.
+        Parameter:
+            move (string): the move the AI just made
+        """
+        pv = self.engine.pv
+        if len(pv) < 2 or pv[0] != move or pv[1] not in self.game.legal_moves():
+            return # no reply to expect
+        game = self.game.copy()
+        game.make_move(pv[1])
+        if game.check_game_over(): # the reply would end the game
+            return
+        self.think(self.search_move, game, pondering=True)
+        self.ponder_move = pv[1]
 
-        safe_moves = set() # a set for safe moves
-        safe_pieces = set() # a set for safe pieces
-        for piece in living_pieces:
-            # if you start with a piece's moveset and then remove all the
-            # squares where the enemy could move and the piece has some squares
-            # still available, it's safe to move
-            if len(piece.moveset - enemy_moves) > 0:
-                # add those moves to the safe moves
-                safe_moves |= piece.moveset - enemy_moves
-                safe_pieces.add(piece) # add that piece to the safe pieces
+    def ponder_hit(self):
+        """
+        Makes the expert AI's pondering its real move, since the human played
+        the reply it expected. The search keeps what it has found, and its
+        time starts now.
+        """
+        self.ponder_move = None
+        if self.timer and self.timer.turn == 1: # press the clock for White
+            self.timer.switch()
+        if self.thinking and self.thinking.is_alive(): # it's still searching
+            self.engine.ponder_hit()
+        elif self.thinking: # it hasn't started, so it can start as a real search
+            self.pondering = False
+        else: # it already finished
+            self.play_ai_move(self.ponder_result)
 
-        # while the randomly-chosen move isn't safe but there were some
-        # available, or the randomly-chosen piece is the king and the RNG
-        # puts a stop to it
-        while (move not in safe_moves and len(safe_moves) > 5) or \
-        (piece_to_move is self.black_king and randint(0,9) in range(9)):
-            try: # try to sample that set
-                piece_to_move = sample(safe_pieces, 1)[0] # pick another piece
-                # and another move
-                move = sample(piece_to_move.moveset & safe_moves, 1)[0]
-            except: # if there are no safe pieces, it'll just use a living piece
-                piece_to_move = sample(living_pieces, 1)[0] # pick a random piece
-                move = sample(piece_to_move.moveset, 1)[0] # and a random move
+    def ai_turn(self, delay):
+        """
+        Has the AI, if there is one, start on its move after a delay. Anything
+        that cancels the AI before then cancels the move too.
+        Parameter:
+            delay (int): milliseconds to wait first, so that the last move's
+                sound can finish
+        """
+        moves = {"easy":self.easy_move, "hard":self.hard_move, "expert":self.expert_move}
+        if self.mode not in moves: # a human is playing black
+            return
+        move = moves[self.mode]
+        if self.ponder_move: # the AI has been thinking about a reply
+            if self.game.movelist[self.game.replaycounter-1] == self.ponder_move:
+                move = self.ponder_hit # and guessed right
+            else:
+                self.cancel_ai() # guessed wrong, so start over
+        token = self.ai_token
+        def start():
+            if token == self.ai_token: # if nothing has been cancelled since
+                move()
+        self.parent.after(delay, start)
+
+    def think(self, choose, game=None, pondering=False):
+        """
+        Starts the AI choosing a move in another thread, on a copy of the
+        game, so that the window keeps drawing and the clock keeps ticking.
+        A move from the opening book, if this level uses it, is played
+        instead of thinking, and so is the hard AI's move from the
+        tablebases (the expert AI's search looks them up itself). The move
+        is carried out once it's ready, by poll_ai.
+        Parameters:
+            choose (function): takes a GameState and returns the move for the
+                player to move in chess11 notation, or None if there isn't one
+            game (GameState): the copy to choose a move in, or None for a
+                copy of the current game
+            pondering (boolean): True if the expert AI is thinking on the
+                human's time
+        """
+        self.ai_token += 1
+        token = self.ai_token
+        game = game or self.game.copy()
+        self.pondering = pondering
+        book = self.book if self.mode in self.book_levels else None
+        tablebases = self.tablebases if self.mode == "hard" else None
+        def run():
+            move = None
+            try:
+                move = book and book.choose(game) or \
+                tablebases and tablebases.best_move(game) or choose(game)
+            finally: # send something back even if it fails, so the game can go on
+                self.ai_queue.put((token, "move", move))
+        self.thinking = threading.Thread(target=run, daemon=True)
+        self.start_thinking(token)
+        self.parent.after(50, lambda: self.poll_ai(token))
+
+    def start_thinking(self, token):
+        """
+        Starts the thread that think made, once the thread of any cancelled
+        search has finished, since the two would share the engine. Until
+        then, checks again every 50ms.
+        Parameter:
+            token (int): the AI move the thread is for
+        """
+        if token != self.ai_token: # it was cancelled before it started
+            return
+        if self.finishing and self.finishing.is_alive():
+            self.parent.after(50, lambda: self.start_thinking(token))
+            return
+        self.finishing = None
+        if self.engine:
+            self.engine.abort.clear()
+            self.engine.pondering = self.pondering
+            # the analysis is drawn by poll_ai, since only this thread may draw
+            self.engine.report = lambda *analysis: self.ai_queue.put((token, "analysis", analysis))
+        self.thinking.start()
+
+    def poll_ai(self, token):
+        """
+        Checks on the AI: shows any analysis it has sent, and carries out its
+        move once it's ready. Until then, checks again every 50ms.
+        Parameter:
+            token (int): the AI move being waited for
+        """
+        if token != self.ai_token: # it was cancelled
+            return
+        while True:
+            try:
+                sent, kind, value = self.ai_queue.get_nowait()
+            except queue.Empty: # nothing more yet
+                break
+            if sent != token: # left over from a cancelled move
+                continue
+            if kind == "analysis":
+                self.show_analysis(*value)
+            else:
+                self.thinking = None
+                if self.ponder_move: # the human hasn't replied yet
+                    self.ponder_result = value # keep it until they do
+                else:
+                    self.play_ai_move(value)
+                return
+        self.parent.after(50, lambda: self.poll_ai(token))
 
-        # make a set of pairs of pieces for comparison
-        piece_pairs = ((self.black_knight_1,self.white_knight_1),
-        (self.black_knight_2,self.white_knight_2),
-        (self.black_bishop_1,self.white_bishop_1),
-        (self.black_bishop_2,self.white_bishop_2),
-        (self.black_rook_1,self.white_rook_1),
-        (self.black_rook_2,self.white_rook_2),
-        (self.black_queen,self.white_queen),
-        (self.black_king,self.white_king))
-        
-        for pair in piece_pairs:
-            decision = self.piece_priority(living_pieces, safe_moves, enemy_pieces,
-            enemy_moves, pair[0], pair[1])
-            if decision[0]: # if there's a capture or escape
-                # if there's a capture or the current plan is to escape with a
-                # lower-priority piece or the moving piece isn't a knight
-                if decision[1] or self.all_squares.get(move).piece is None or \
-                piece_to_move.type != pair[0].type:
-                    piece_to_move = decision[2] # use the returned piece
-                    move = decision[3] # and use the returned move
-        
+    def play_ai_move(self, move):
+        """
+        Carries out the move the AI chose.
+        Parameter:
+            move (string): the move in chess11 notation, or None
+        """
+        if move == "bl": # castles have their own methods
+            self.castle_black_left()
+        elif move == "br":
+            self.castle_black_right()
+        elif move:
+            self.computer_move(self.game.board[to_square(move[:2])], to_square(move[2:4]), move[4:])
+        if self.timer and self.timer.turn == 2:
+            self.timer.switch()
+        if move and self.mode == "expert" and self.ponder_on and not self.game.winner:
+            self.start_ponder(move)
+
+    def cancel_ai(self):
+        """
+        Stops the AI if it's thinking or pondering or about to, and forgets
+        its move. Waits for the thread to finish, which a search does within
+        a few milliseconds of being cancelled, but no more than a second, so
+        that the window never freezes; a thread that's still running after
+        that is kept as finishing, and the next search waits for it.
+        """
+        self.ai_token += 1 # anything sent from now on is out of date
+        self.ponder_move = self.ponder_result = None
+        if self.thinking and self.thinking.is_alive():
+            if self.engine:
+                self.engine.abort.set()
+            self.thinking.join(1)
+            if self.thinking.is_alive():
+                self.finishing = self.thinking
+        self.thinking = None
+
+    def show_analysis(self, depth, score, nodes, seconds, pv):
+        """
+        Shows the expert AI's progress after each iteration of its search,
+        as sent back by its thread. The score is given from White's side.
+        While the AI ponders, the reply it expects is shown first.
+        Parameters:
+            depth (int): the depth searched
+            score (int): the score for the player to move in the position
+                searched
+            nodes (int): the positions searched so far
+            seconds (float): the time spent so far
+            pv (list): the principal variation, in chess11 notation
+        """
+        if self.analysis == "off":
+            return
+        black = self.game.player is self.game.black_player
+        heading = "Depth"
+        if self.ponder_move: # the position searched is after the human's reply
+            black, pv, heading = not black, [self.ponder_move] + pv, "Pondering, depth"
+        if black: # show it from White's side
+            score = -score
+        self.analysis_message.config(text="{} {}  {}  {} nodes  {:.0f} nps\n{}".format(
+        heading, depth, score_text(score), nodes, nodes / seconds if seconds else 0, self.pv_text(pv)))
+
+    def pv_text(self, pv):
+        """
+        Returns a principal variation as text, in ICCF notation or in SAN,
+        depending on the analysis setting.
+        Parameter:
+            pv (list): the moves, in chess11 notation
+        """
+        if self.analysis != "san":
+            return ' '.join(cn.chess11_to_iccf_full(pv))
+        # set up the notation model with the current position
+        cn.model = [[' ']*8 for row in range(8)]
+        for piece in self.game.all_pieces:
+            if piece.square != OFF_BOARD:
+                x, y = coordinates(piece.square)
+                kind = piece.type.partition('_')[2]
+                letter = 'n' if kind == "knight" else kind[0] # k for king, n for knight
+                cn.model[y][x] = letter.upper() if piece.color == "white" else letter
+        cn.result = []
+        for move in pv:
+            cn.do_move(cn.chess11_to_iccf_move(move)) # run the move through the model
+        return ' '.join(item[0] for item in cn.result) # the SAN of each move
+
+    def computer_move(self, piece_to_move, move, promotion=''):
+        """
+        Carries out a move chosen by the AI.
+        Parameters:
+            piece_to_move (Piece): the Piece that the AI is moving
+            move (int): the destination square
+            promotion (string): '1', '2', '3', or '4' for a promotion the AI
+                chose, or empty to use the preset promotion
+        """
         # truncate and write the move in the movelist
-        self.movelist = self.movelist[:self.replaycounter]
-        self.movelist_box.delete(self.replaycounter, END) # truncate the movelist box
-        self.replaycounter += 1
-        # write the move in the movelist
-        self.movelist.append(piece_to_move.location + move)
-        self.movelist_box.insert(END, cn.chess11_to_iccf_move(self.movelist[-1])) # write the move to the movelist box
-        self.move(piece_to_move, move) # move
+        self.movelist_box.delete(self.game.replaycounter, END) # truncate the movelist box
+        self.game.record_move(piece_to_move.location + to_location(move) + promotion)
+        self.movelist_box.insert(END, cn.chess11_to_iccf_move(self.game.movelist[-1])) # write the move to the movelist box
+        self.move(piece_to_move, to_location(move) + promotion) # carry out the move
         self.unsaved_changes = True # note that there are unsaved changes to this game
         self.check_castles() # check castling buttons
-        # if there's audio and the AI didn't just win
-        if self.audio and self.white_king.location != "88":
+        # if audio is on and the AI didn't just end the game
+        if self.audio and not self.game.winner:
             self.sound_filenames.get("computer_move.ogg").play() # play the 'computer_move' sound
 
-    def piece_priority(self, living_pieces, safe_moves, enemy_pieces,
-    enemy_moves, check_ally, check_enemy):
-        """
-        Determines which move is the most important. Tries to capture first. If
-        there's nothing to capture, avoids being captured if necessary. If a
-        piece is in danger but it may be safely rescued by capturing an enemy
-        piece (even if it's a less-valuable piece), it uses that strategy.
-        """
-        for piece in living_pieces:
-            if check_enemy.location in piece.moveset: # if AI can capture
-                return [True, True, piece, check_enemy.location] # do so
-
-        if check_ally.location in enemy_moves: # if AI piece is threatened
-            for enemy in enemy_pieces: # look at enemy pieces
-                if enemy.location in safe_moves: # if enemy can be captured
-                    for piece in living_pieces: # look at available pieces
-                        # find one that can capture the enemy
-                        if enemy.location in piece.moveset:
-                            return[True, True, piece, enemy.location] # do so
-            for loc in check_ally.moveset: # look at the piece's moveset
-                if loc not in enemy_moves: # if a move is safe
-                    # if the AI is considering moving right back where it came
-                    # from and there's other stuff it could do,
-                    if ((check_ally is self.last_ai_piece and loc == \
-                    self.last_source) and len(check_ally.moveset) > 1):
-                        continue # pick a different target
-                    return [True, False, check_ally, loc] # successful escape
-
-        return [False, False] # no capture or escape
-
     def click_click(self, event):
         """
         Carry out a human player's desired move, if possible.
@@ -2252,9 +1955,10 @@ class Chess(object):
         # Parses the mouse cursor location at the time of the click into a
         # string that the game's logic can handle.
         click = str(event.x//(self.screen_size//8)) + str(event.y//(self.screen_size//8))
-        if not self.all_squares.get(click): # if the user click on the edge of the canvas, no piece
+        square = to_square(click)
+        if square == OFF_BOARD: # if the user click on the edge of the canvas, no piece
             return # don't try to do things
-        token = self.all_squares.get(click).piece
+        token = self.game.board[square]
 
         if self.first_click: # if it's the first click
             if not self.choose_piece(token): # and no piece was chosen
@@ -2277,7 +1981,7 @@ class Chess(object):
         # Parses the mouse cursor location at the time of the click into a
         # string that the game's logic can handle.
         click = str(event.x//(self.screen_size//8)) + str(event.y//(self.screen_size//8))
-        token = self.all_squares.get(click).piece
+        token = self.game.board[to_square(click)]
 
         if not self.choose_piece(token): # if no piece was chosen
             return # return out of the method
@@ -2329,25 +2033,28 @@ class Chess(object):
         Parameter:
             token (Piece): the piece that the player wants to select
         """
+        if self.thinking and not self.ponder_move: # if the AI is choosing its move
+            return False # no piece chosen
         if token is None: # if a square with no piece was chosen
             return False # no piece chosen
-        if token.color != self.player.color: # if an opponent's piece was chosen
+        if token.color != self.game.player.color: # if an opponent's piece was chosen
             return False # no piece chosen
         self.chosen_piece = token # by now, we've chosen a piece
-        token.generate_moveset() # what are its possible moves?
-        if len(token.moveset) == 0: # if it can't move
+        # what are its possible moves, without leaving its king in check?
+        self.chosen_moves = self.game.legal_movesets()[token]
+        if len(self.chosen_moves) == 0: # if it can't move
             return False # no piece chosen
-        if self.player is self.white_player: # if it's white's turn
+        if self.game.player is self.game.white_player: # if it's white's turn
             color = "" # don't add a color prefix
         else: # otherwise
             color = "dark" # add 'dark'
         # now we color the piece's square with a variety of blue
-        self.board.itemconfig(self.squares[int(token.location[0])]
-        [int(token.location[1])], fill=color+"blue")
-        for move in token.moveset: # for every move the piece can make
+        x, y = coordinates(token.square)
+        self.board.itemconfig(self.squares[x][y], fill=color+"blue")
+        for move in self.chosen_moves: # for every move the piece can make
             # color those squares a variety of green
-            self.board.itemconfig(self.squares[int(move[0])][int(move[1])],
-            fill=color+"green")
+            x, y = coordinates(move)
+            self.board.itemconfig(self.squares[x][y], fill=color+"green")
         if self.audio: # if audio is on
             self.sound_filenames.get("select_piece.ogg").play() # play the 'select_piece' sound
         return True # piece was chosen
@@ -2367,42 +2074,37 @@ class Chess(object):
                 else:
                     color = self.dark_square_color
                 self.board.itemconfig(self.squares[row][column], fill=color)
-        if self.player is self.white_player: # if it's white's turn
+        if self.game.player is self.game.white_player: # if it's white's turn
             color = "dark" # add a 'dark' color prefix
         else: # otherwise
             color = "" # add no prefix
         # if there was a previous move
-        if self.last_source is not None and self.last_target is not None:
+        if self.game.last_source is not None and self.game.last_target is not None:
             # color that origin square a variety of blue
-            self.board.itemconfig(self.squares[int(self.last_source[0])]
-                [int(self.last_source[1])], fill=color+"blue")
+            x, y = coordinates(self.game.last_source)
+            self.board.itemconfig(self.squares[x][y], fill=color+"blue")
             # and color the target square a variety of green
-            self.board.itemconfig(self.squares[int(self.last_target[0])]
-                [int(self.last_target[1])], fill=color+"green")
+            x, y = coordinates(self.game.last_target)
+            self.board.itemconfig(self.squares[x][y], fill=color+"green")
         if click == None: # if there was no piece on the target square
             self.first_click = True # go back to first click
             return # and return out of this method
-        # if the target square is in the chosen piece's moveset
-        if click in self.chosen_piece.moveset:
-            self.movelist = self.movelist[:self.replaycounter]
-            self.movelist_box.delete(self.replaycounter, END) # truncate the movelist box
-            self.replaycounter += 1
+        # if the target square is one of the chosen piece's legal moves
+        if to_square(click) in self.chosen_moves:
+            self.movelist_box.delete(self.game.replaycounter, END) # truncate the movelist box
             # write the move in the movelist
-            self.movelist.append(self.chosen_piece.location + click)
-            self.movelist_box.insert(END, cn.chess11_to_iccf_move(self.movelist[-1])) # write the move to the movelist box
+            self.game.record_move(self.chosen_piece.location + click)
+            self.movelist_box.insert(END, cn.chess11_to_iccf_move(self.game.movelist[-1])) # write the move to the movelist box
             self.move(self.chosen_piece, click) # move the piece
             self.unsaved_changes = True # note that there are unsaved changes to this game
-            # if black hasn't lost
-            if self.black_king.location != "88":
+            # if the game isn't over
+            if not self.game.winner:
                 delay = 0
-                # if audio is on and white hasn't lost
-                if self.audio and self.white_king.location != "88":
+                # if audio is on
+                if self.audio:
                     delay = 1000 # set a 1000ms delay
                     self.sound_filenames.get("move_piece.ogg").play() # play the 'move_piece' sound
-                if self.mode == "easy": # if easy mode is on
-                    self.parent.after(delay,self.easy_move) # do an easy move
-                if self.mode == "hard": # if hard mode is on
-                    self.parent.after(delay,self.hard_move) # do a hard move
+                self.ai_turn(delay) # the AI, if any, moves next
             self.check_castles() # check castling buttons
 
     def move(self, chosen_piece, destination):
@@ -2412,105 +2114,22 @@ class Chess(object):
             chosen_piece (Piece): the Piece that the player (human or AI) is
                 moving
             destination (string): the string representation of the destination
-                square
-        """
-        promotion = destination[2:] # third character or empty string
-        destination = destination[:2] # first 2 chars
-        # if there was a piece moved previously
-        self.last_source = chosen_piece.location # this piece is the last source
-        self.last_target = destination # its destination is the last target
-        self.safe_pawns() # all pawns are safe from en passant
-        # piece on the target square
-        target_piece = self.all_squares.get(destination).piece
-        # chosen piece's original location
-        original_location = chosen_piece.location
-        if hasattr(chosen_piece, "moved"): # if this piece has a 'moved' attr
-            chosen_piece.moved = True # this piece has moved
-        if "pawn" in chosen_piece.type: # if this piece is a pawn
-            # and it was allowed to move 2 squares
-            if int(destination[1]) - int(chosen_piece.location[1]) in (-2,2):
-                chosen_piece.vulnerable = True # it's vulnerable
-            # the piece on the square behind the pawn
-            behind = self.all_squares.get(destination[0] +
-            str(int(destination[1])-chosen_piece.direction)).piece
-            if behind is not None: # if there's actually a piece there
-                if "pawn" in behind.type: # and it's a pawn
-                    if behind.vulnerable: # and it was vulnerable
-                        behind.location = "88" # that pawn is captured
-                        # and the square is now empty
-                        self.all_squares.get(destination[0] +
-                        str(int(destination[1])-chosen_piece.direction)).piece = None
-            # if the pawn got to the top row
-            if destination[1] == "0":
-                extras = [None, self.extra_white_queens, self.extra_white_rooks, self.extra_white_bishops, self.extra_white_knights]
-                if promotion: # from replay
-                    extra = extras[int(promotion)] # use promotion
-                else: # manual move
-                    extra = self.white_promo # use preset character
-                    self.movelist[-1] += extra # add this char to the saved move
-                    self.movelist_box.delete(END) # remove the last, now-incomplete item from the listbox
-                    self.movelist_box.insert(END, cn.chess11_to_iccf_move(self.movelist[-1])) # and add the 5-char move
-                    extra = extras[int(extra)] # use the proper set of pieces from the list
-                chosen_piece.location = "88" # the pawn gets sort of 'captured'
-                # if there was an enemy on that square
-                if target_piece is not None:
-                    target_piece.location = "88" # it's captured
-                # and the former pawn becomes the next extra queen
-                for p in extra:
-                    if p.location == '88':
-                        target_piece = self.all_squares.get(destination).piece = p
-                        break
-                target_piece.location = destination # located at the destination
-                chosen_piece = target_piece # chosen piece set to target
-            # if the pawn got to the bottom row
-            if destination[1] == "7":
-                extras = [None, self.extra_black_queens, self.extra_black_rooks, self.extra_black_bishops, self.extra_black_knights]
-                if promotion: # from replay
-                    extra = extras[int(promotion)] # use promotion
-                else: # manual move
-                    extra = self.black_promo # use preset character
-                    self.movelist[-1] += extra # add this char to the saved move
-                    self.movelist_box.delete(END) # remove the last, now-incomplete item from the listbox
-                    self.movelist_box.insert(END, cn.chess11_to_iccf_move(self.movelist[-1])) # and add the 5-char move
-                    extra = extras[int(extra)] # use the proper set of pieces from the list
-                chosen_piece.location = "88" # the pawn gets sort of 'captured'
-                # if there was an enemy on that square
-                if target_piece is not None:
-                    target_piece.location = "88" # it's captured
-                # and the former pawn becomes the next extra queen
-                for p in extra:
-                    if p.location == '88':
-                        target_piece = self.all_squares.get(destination).piece = p
-                        break
-                target_piece.location = destination # located at the destination
-                chosen_piece = target_piece # chosen piece set to target
-        if target_piece is not None: # if there was a piece on the target square
-            # if it really was a capture and not a promotion
-            if target_piece.color != chosen_piece.color:
-                target_piece.location = "88" # the target piece is captured
-            if self.black_king.location == "88": # if it was the black king
-                self.game_end("White") # end the game with white winner
-            if self.white_king.location == "88": # if it was the white king
-                self.game_end("Black") # end the game with black winner
-
-        self.all_squares.get(destination).piece = target_piece \
-        = chosen_piece # put chosen piece into target and destination pieces
-        # original location is now empty
-        self.all_squares.get(original_location).piece = None
-        # set the chosen piece's location to the destination
-        chosen_piece.location = destination
-        if self.player is self.white_player: # if it was white's turn
-            self.player = self.black_player # now it's black's
-        else: # if it was black's turn
-            self.player = self.white_player # now it's white's
+                square, possibly followed by a promotion character
+        """
+        # the game state works with squares, so translate the location
+        if self.game.move(chosen_piece, to_square(destination[:2]), destination[2:]): # if a preset promotion was used
+            self.movelist_box.delete(END) # remove the last, now-incomplete item from the listbox
+            self.movelist_box.insert(END, cn.chess11_to_iccf_move(self.game.movelist[-1])) # and add the 5-char move
+        if self.game.check_game_over(): # if it's checkmate or stalemate
+            self.game_end(self.game.winner) # end the game
         if not self.replaying:
             self.movelist_box_top = self.movelist_box.nearest(0) # save the current movelist_box_top
             self.refresh_movelist_box()
             self.refresh_highlighting()
             self.check_castles()
             self.refresh_images()
-        if self.black_king.location != "88" and self.white_king.location != "88": # if the game continues
-            if self.player.mode == "click": # if it's click mode
+        if not self.game.winner: # if the game continues
+            if self.game.player.mode == "click": # if it's click mode
                 self.board.bind("<Button-1>", self.click_click) # bind that
             else: # otherwise
                 self.board.bind("<Button-1>", self.click_hold) # bind drag
@@ -2528,48 +2147,54 @@ class Chess(object):
                     color = self.dark_square_color # or black
                 # recolor the board
                 self.board.itemconfig(self.squares[row][column], fill=color)
-        if self.player is self.white_player: # if white to go
+        if self.game.player is self.game.white_player: # if white to go
             color = "dark" # 'dark' color prefix
             self.status_message.config(text="White's turn.") # announce white
         else: # if black to go
             color = "" # no color prefix
             self.status_message.config(text = "Black's turn.") # announce black
-        if self.last_source != None and self.chosen_piece != None:
+        if self.game.last_source is not None and self.chosen_piece != None:
             # color the last source with a variety of blue
-            self.board.itemconfig(self.squares[int(self.last_source[0])]
-                [int(self.last_source[1])], fill=color+"blue")
+            x, y = coordinates(self.game.last_source)
+            self.board.itemconfig(self.squares[x][y], fill=color+"blue")
             # color the last target with a variety of green
-            self.board.itemconfig(self.squares[int(self.last_target[0])]
-                [int(self.last_target[1])], fill=color+"green")
+            x, y = coordinates(self.game.last_target)
+            self.board.itemconfig(self.squares[x][y], fill=color+"green")
         try:
             self.board
         except AttributeError:
             return
-        if self.mode != 'human' and '88' not in (self.black_king.location, self.white_king.location):
-            if self.player is self.black_player:
+        if self.mode != 'human' and not self.game.winner:
+            if self.game.player is self.game.black_player:
                 self.board.unbind("<Button-1>")
             else:
-                if self.player.mode == "click": # if it's click mode
+                if self.game.player.mode == "click": # if it's click mode
                     self.board.bind("<Button-1>", self.click_click) # bind that
                 else: # otherwise
                     self.board.bind("<Button-1>", self.click_hold) # bind drag
     
     def refresh_movelist_box(self):
         self.movelist_box.selection_clear(0,END) # clear the movelist box selection
-        self.movelist_box.selection_set(self.replaycounter-1) # set the movelist box selection to the proper move
-        self.movelist_box.activate(self.replaycounter-1) # set the movelist box active entry to the proper move
+        self.movelist_box.selection_set(self.game.replaycounter-1) # set the movelist box selection to the proper move
+        self.movelist_box.activate(self.game.replaycounter-1) # set the movelist box active entry to the proper move
         self.movelist_box.see(self.movelist_box.size()-1) # see the last
         self.movelist_box.see(self.movelist_box_top) # make the old top one the top one again
-        self.movelist_box.see(self.replaycounter-1) # scroll to the desired move if it's out of the visible area
+        self.movelist_box.see(self.game.replaycounter-1) # scroll to the desired move if it's out of the visible area
     
     def game_end(self, winner):
         """
         Handles end-of-game actions, including messages, event unbindings,
         and sound effects.
         Parameters:
-            winner (string): "Black" or "White", describing the winner
+            winner (string): "Black" or "White", describing the winner, or
+                "Draw" for a stalemate
         """
-        self.parent.after(1, lambda: self.status_message.config(text = winner + " wins!")) # announce the win
+        self.cancel_ai() # stop any pondering, since there's nothing left to play
+        if winner == "Draw": # if nobody won
+            message = "Stalemate! It's a draw."
+        else:
+            message = winner + " wins!"
+        self.parent.after(1, lambda: self.status_message.config(text = message)) # announce the result
         self.board.unbind("<Button-1>") # unbind the mouse
         self.castlemenu.entryconfig(0, state=DISABLED)
         self.castlemenu.entryconfig(1, state=DISABLED)
@@ -2585,33 +2210,17 @@ class Chess(object):
             mixer.stop()
             self.sound_filenames.get("explosion.ogg").play() # play explosion sound
 
-    def safe_pawns(self):
-        """
-        When a player starts their turn, all of their pieces start out as not
-        vulnerable.
-        """
-        if self.player.color == "white": # if it's white's turn
-            # make all their pawns safe
-            for p in self.white_pawns:
-                p.vulnerable = False
-        else: # if it's black's turn
-            # make all their pawns safe
-            for p in self.black_pawns:
-                p.vulnerable = False
-
     def castle_black_left(self):
         """
         Castles at black queenside.
         """
+        if self.thinking: # if the AI is choosing its own move
+            return # the menu can't castle for it
         if not self.replaying: # only do these things during actual play - not during replays
-            self.movelist = self.movelist[:self.replaycounter]
-            # write the move in the movelist
-            self.movelist_box.delete(self.replaycounter, END) # truncate the movelist box
-            self.movelist.append("bl")
-            self.movelist_box.insert(END, cn.chess1_to_iccf_move(self.movelist[-1]))
+            self.movelist_box.delete(self.game.replaycounter, END) # truncate the movelist box
+            self.game.record_move("bl") # write the move in the movelist
+            self.movelist_box.insert(END, cn.chess11_to_iccf_move(self.game.movelist[-1]))
             self.unsaved_changes = True # note that there are unsaved changes to this game
-            self.replaycounter += 1
-        self.safe_pawns() # sets the current player's pawns to safe
         # color the board with black and white squares
         for row in range(8):
             for column in range(8):
@@ -2623,20 +2232,12 @@ class Chess(object):
         # hard-coded last-move indicator, since this is a hard-coded move
         self.board.itemconfig(self.squares[3][0], fill="darkblue")
         self.board.itemconfig(self.squares[2][0], fill="darkgreen")
-        # give each square its proper piece
-        self.all_squares.get("00").piece = None
-        self.all_squares.get("20").piece = self.black_king
-        self.all_squares.get("30").piece = self.black_rook_1
-        self.all_squares.get("40").piece = None
-        # give its piece its proper location and status
-        self.black_king.location = "20"
-        self.black_king.moved = True
-        self.black_rook_1.location = "30"
-        self.black_rook_1.moved = True
-        self.player = self.white_player # other player's turn
+        self.game.castle_black_left() # move the king and rook
         self.check_castles() # refresh the castling buttons
         self.refresh_images() # as well as the piece icons
         self.refresh_movelist_box() # and the movelist box
+        if self.game.check_game_over(): # if it's checkmate or stalemate
+            self.game_end(self.game.winner) # end the game
         self.status_message.config(text = "Black castled queenside! " + \
         "White's turn.") # announce the event
         if self.audio and not self.replaying: # if audio is on
@@ -2646,15 +2247,13 @@ class Chess(object):
         """
         Castles at black kingside.
         """
+        if self.thinking: # if the AI is choosing its own move
+            return # the menu can't castle for it
         if not self.replaying: # only do these things during actual play - not during replays
-            self.movelist = self.movelist[:self.replaycounter]
-            self.movelist_box.delete(self.replaycounter, END) # truncate the movelist box
-            # write the move in the movelist
-            self.movelist.append("br")
-            self.movelist_box.insert(END, cn.chess11_to_iccf_move(self.movelist[-1]))
+            self.movelist_box.delete(self.game.replaycounter, END) # truncate the movelist box
+            self.game.record_move("br") # write the move in the movelist
+            self.movelist_box.insert(END, cn.chess11_to_iccf_move(self.game.movelist[-1]))
             self.unsaved_changes = True # note that there are unsaved changes to this game
-            self.replaycounter += 1
-        self.safe_pawns() # sets the current player's pawns to safe
         # color the board with black and white squares
         for row in range(8):
             for column in range(8):
@@ -2666,20 +2265,12 @@ class Chess(object):
         # hard-coded last-move indicator, since this is a hard-coded move
         self.board.itemconfig(self.squares[5][0], fill="darkblue")
         self.board.itemconfig(self.squares[6][0], fill="darkgreen")
-        # give each square its proper piece
-        self.all_squares.get("40").piece = None
-        self.all_squares.get("50").piece = self.black_rook_2
-        self.all_squares.get("60").piece = self.black_king
-        self.all_squares.get("70").piece = None
-        # give its piece its proper location and status
-        self.black_rook_2.location = "50"
-        self.black_rook_2.moved = True
-        self.black_king.location = "60"
-        self.black_king.moved = True
-        self.player = self.white_player # other player's turn
+        self.game.castle_black_right() # move the king and rook
         self.check_castles() # refresh the castling buttons
         self.refresh_images() # as well as the piece icons
         self.refresh_movelist_box() # and the movelist box
+        if self.game.check_game_over(): # if it's checkmate or stalemate
+            self.game_end(self.game.winner) # end the game
         self.status_message.config(text = "Black castled kingside! " + \
         "White's turn.") # announce the event
         if self.audio and not self.replaying: # if audio is on
@@ -2690,14 +2281,10 @@ class Chess(object):
         Castles at white queenside.
         """
         if not self.replaying:
-            self.movelist = self.movelist[:self.replaycounter]
-            self.movelist_box.delete(self.replaycounter, END) # truncate the movelist box
-            # write the move in the movelist
-            self.movelist.append("wl")
-            self.movelist_box.insert(END, cn.chess11_to_iccf_move(self.movelist[-1]))
+            self.movelist_box.delete(self.game.replaycounter, END) # truncate the movelist box
+            self.game.record_move("wl") # write the move in the movelist
+            self.movelist_box.insert(END, cn.chess11_to_iccf_move(self.game.movelist[-1]))
             self.unsaved_changes = True # note that there are unsaved changes to this game
-            self.replaycounter += 1
-        self.safe_pawns() # sets the current player's pawns to safe
         # color the board with black and white squares
         for row in range(8):
             for column in range(8):
@@ -2709,30 +2296,21 @@ class Chess(object):
         # hard-coded last-move indicator, since this is a hard-coded move
         self.board.itemconfig(self.squares[3][7], fill="blue")
         self.board.itemconfig(self.squares[2][7], fill="green")
-        # give each square its proper piece
-        self.all_squares.get("07").piece = None
-        self.all_squares.get("27").piece = self.white_king
-        self.all_squares.get("37").piece = self.white_rook_1
-        self.all_squares.get("47").piece = None
-        # give its piece its proper location and status
-        self.white_king.location = "27"
-        self.white_king.moved = True
-        self.white_rook_1.location = "37"
-        self.white_rook_1.moved = True
-        self.player = self.black_player # other player's turn
+        self.game.castle_white_left() # move the king and rook
         self.check_castles() # refresh the castling buttons
         self.refresh_images() # as well as the piece icons
         self.refresh_movelist_box() # and the movelist box
+        if self.game.check_game_over(): # if it's checkmate or stalemate
+            self.game_end(self.game.winner) # end the game
         if self.audio and not self.replaying: # if audio is on
             self.sound_filenames.get("castle.ogg").play() # play 'castle' sound
             delay = 2000 # set a 2000ms delay
         else: # if audio is off
             delay = 0 # set a delay of 0
-        if not self.replaying: # only do these things during actual play - not during replays
-            if self.mode == "easy": # if it's on easy mode
-                self.parent.after(delay,self.easy_move) # AI makes an easy move
-            if self.mode == "hard": # if it's on hard mode
-                self.parent.after(delay,self.hard_move) # AI makes a hard move
+        # only do these things during actual play - not during replays or
+        # after the game has ended
+        if not self.replaying and not self.game.winner:
+            self.ai_turn(delay) # the AI, if any, moves next
         self.status_message.config(text = "White castled kingside! " + \
         "Black's turn.") # announce the event
 
@@ -2742,14 +2320,11 @@ class Chess(object):
         """
         # truncate and write the move in the movelist
         if not self.replaying: # only do these things during actual play - not during replays
-            self.movelist = self.movelist[:self.replaycounter]
-            self.movelist_box.delete(self.replaycounter, END) # truncate the movelist box
-            self.unsaved_changes = True
-            self.movelist.append("wr")
-            self.movelist_box.insert(END, cn.chess11_to_iccf_move(self.movelist[-1]))
-            self.replaycounter += 1
-        
-        self.safe_pawns() # sets the current player's pawns to safe
+            self.movelist_box.delete(self.game.replaycounter, END) # truncate the movelist box
+            self.game.record_move("wr") # write the move in the movelist
+            self.movelist_box.insert(END, cn.chess11_to_iccf_move(self.game.movelist[-1]))
+            self.unsaved_changes = True # note that there are unsaved changes to this game
+        
         # color the board with black and white squares
         for row in range(8):
             for column in range(8):
@@ -2761,30 +2336,21 @@ class Chess(object):
         # hard-coded last-move indicator, since this is a hard-coded move
         self.board.itemconfig(self.squares[5][7], fill="blue")
         self.board.itemconfig(self.squares[6][7], fill="green")
-        # give each square its proper piece
-        self.all_squares.get("47").piece = None
-        self.all_squares.get("57").piece = self.white_rook_2
-        self.all_squares.get("67").piece = self.white_king
-        self.all_squares.get("77").piece = None
-        # give its piece its proper location and status
-        self.white_rook_2.location = "57"
-        self.white_rook_2.moved = True
-        self.white_king.location = "67"
-        self.white_king.moved = True
-        self.player = self.black_player # other player's turn
+        self.game.castle_white_right() # move the king and rook
         self.check_castles() # refresh the castling buttons
         self.refresh_images() # as well as the piece icons
         self.refresh_movelist_box() # and the movelist box
+        if self.game.check_game_over(): # if it's checkmate or stalemate
+            self.game_end(self.game.winner) # end the game
         if self.audio and not self.replaying: # if audio is on
             self.sound_filenames.get("castle.ogg").play() # play 'castle' sound
             delay = 2000 # set a 2000ms delay
         else: # if audio is off
             delay = 0 # set a delay of 0
-        if not self.replaying: # only do these things during actual play - not during replays
-            if self.mode == "easy": # if it's on easy mode
-                self.parent.after(delay,self.easy_move) # AI makes an easy move
-            if self.mode == "hard": # if it's on hard mode
-                self.parent.after(delay,self.hard_move) # AI makes a hard move
+        # only do these things during actual play - not during replays or
+        # after the game has ended
+        if not self.replaying and not self.game.winner:
+            self.ai_turn(delay) # the AI, if any, moves next
         self.status_message.config(text = "White castled kingside! " + \
         "Black's turn.") # announce the event
 
@@ -2798,7 +2364,7 @@ class Chess(object):
         for row in range(8):
             for column in range(8):
                 # get the piece to be drawn
-                drawpiece = self.all_squares.get(str(row)+str(column)).piece
+                drawpiece = self.game.board[to_square(str(row)+str(column))]
                 if drawpiece is not None: # if there's an actual piece there
                     # place the appropriate image in the appropriate spot
                     self.board.itemconfig(self.square_overlay[row][column],
@@ -2813,31 +2379,29 @@ class Chess(object):
         Switches between the "click/click" move functionality and the
         "click/drag" move functionality for the black player.
         """
-        if self.black_player.mode == "click": # if the player is in click mode
-            self.black_player.mode = "drag" # switch to drag mode
+        if self.game.black_player.mode == "click": # if the player is in click mode
+            self.game.black_player.mode = "drag" # switch to drag mode
             # if it's their turn and the game isn't over
-            if self.player is self.black_player and \
-            self.black_king.location != "88" and \
-            self.white_king.location != "88":
+            if self.game.player is self.game.black_player and \
+            not self.game.winner:
                 # bind click_hold() to the mouse button
                 self.board.bind("<Button-1>", self.click_hold)
             self.choose_target(None) # in effect, clears the first_click attr
 
         else: # if the player is in drag mode
-            self.black_player.mode = "click" # switch to click mode
+            self.game.black_player.mode = "click" # switch to click mode
             # if it's their turn and the game isn't over
-            if self.player is self.black_player and \
-            self.black_king.location != "88" and \
-            self.white_king.location != "88":
+            if self.game.player is self.game.black_player and \
+            not self.game.winner:
                 # bind click_click() to the mouse button
                 self.board.bind("<Button-1>", self.click_click)
         
         if self.audio:
             messagebox.showinfo(title="UI mode changed", message="Black UI mode is now click/" + \
-            self.black_player.mode + ".") # alert the user that the UI mode changed
+            self.game.black_player.mode + ".") # alert the user that the UI mode changed
         else:
             self.status_message.config(text="UI mode changed", message="Black UI mode is now click/" + \
-            self.black_player.mode + ".")
+            self.game.black_player.mode + ".")
         if self.audio: # if audio is on
             self.sound_filenames.get("ui_toggle.ogg").play() # play 'ui_toggle' sound
 
@@ -2846,30 +2410,28 @@ class Chess(object):
         Switches between the "click/click" move functionality and the
         "click/drag" move functionality for the white player.
         """
-        if self.white_player.mode is "click": # if the player is in click mode
-            self.white_player.mode = "drag" # switch to drag mode
+        if self.game.white_player.mode is "click": # if the player is in click mode
+            self.game.white_player.mode = "drag" # switch to drag mode
             # if it's their turn and the game isn't over
-            if self.player is self.white_player and \
-            self.black_king.location != "88" and \
-            self.white_king.location != "88":
+            if self.game.player is self.game.white_player and \
+            not self.game.winner:
                 # bind click_hold() to the mouse button
                 self.board.bind("<Button-1>", self.click_hold)
             self.choose_target(None) # in effect, clears the first_click attr
 
         else: # if the player is in drag mode
-            self.white_player.mode = "click" # switch to click mode
+            self.game.white_player.mode = "click" # switch to click mode
             # if it's their turn and the game isn't over
-            if self.player is self.white_player and \
-            self.black_king.location != "88" and \
-            self.white_king.location != "88":
+            if self.game.player is self.game.white_player and \
+            not self.game.winner:
                 # bind click_click() to the mouse button
                 self.board.bind("<Button-1>", self.click_click)
         if self.audio:
             messagebox.showinfo(title="UI mode changed", message="White UI mode is now click/" + \
-            self.white_player.mode + ".") # alert the user that the UI mode changed
+            self.game.white_player.mode + ".") # alert the user that the UI mode changed
         else:
             self.status_message.config(text="UI mode changed", message="White UI mode is now click/" + \
-            self.white_player.mode + ".")
+            self.game.white_player.mode + ".")
         
         if self.audio: # if audio is on
             self.sound_filenames.get("ui_toggle.ogg").play() # play 'ui_toggle' sound
@@ -2896,15 +2458,14 @@ class Chess(object):
                 if temp == 'clear':
                     temp = ''
                 self.dark_square_color = temp # color
-            if len(self.movelist) == 0: # if we're at the beginning of the match
+            if len(self.game.movelist) == 0: # if we're at the beginning of the match
                 try:
                     self.board.destroy() # destroy the board if it's there
                 except:
                     pass # if not, fine
                 self.draw_board() # draw it
             else: # if there are moves,
-                self.replaycounter +=1 # increment the replay counter
-                self.step_back() # and go 'back' to there
+                self.replay_to(self.game.replaycounter) # replay them on a new board
                 
     def set_square_outline_color(self):
         """
@@ -2919,15 +2480,14 @@ class Chess(object):
             self.square_outline_color = temp
         else:
             self.square_outline_color = ''
-        if len(self.movelist) == 0: # if we're at the beginning of the match
+        if len(self.game.movelist) == 0: # if we're at the beginning of the match
             try:
                 self.board.destroy() # destroy the board if it's there
             except:
                 pass # if not, fine
             self.draw_board() # draw it
         else: # if there are moves,
-            self.replaycounter +=1 # increment the replay counter
-            self.step_back() # and go 'back' to there
+            self.replay_to(self.game.replaycounter) # replay them on a new board
             
     def audio_from_folder(self, *args):
         """
@@ -3045,6 +2605,7 @@ class Chess(object):
             if not messagebox.askyesno("Quit", "Really quit?"): # if user clicks no
                 return # just return
         
+        self.cancel_ai() # stop the AI's thread
         self.parent.destroy() # destroys the tkinter window, exiting the game
 
 def main():
@@ -3052,6 +2613,12 @@ def main():
     chess = Chess(root) # Make my game inherit from that object.
     root.mainloop() # Run the main loop.
     mixer.stop()
+    if chess.engine:
+        chess.engine.close() # stop any helper processes
+    if chess.book:
+        chess.book.close()
+    if chess.tablebases:
+        chess.tablebases.close()
     
 if __name__ == '__main__':
     main()
\ No newline at end of file
@@ -0,0 +1,367 @@
+#-------------------------------------------------------------------------------
+# Name:        Evaluation
+# Purpose:     Score positions with NumPy: material and piece-square tables,
+#              tapered between the middlegame and the endgame, plus mobility,
+#              king safety, and pawn structure. A position is boiled down to
+#              a compact array of 64 piece codes, and every term is worked
+#              out with array operations over whole boards at once, so a
+#              batch of positions costs hardly more calls than one.
+#-------------------------------------------------------------------------------
+
+try:
+    import numpy
+except:
+    numpy = None # the search will score positions with the game's incremental score
+    print("The NumPy module is not available. Please install it for the full evaluation.")
+
+# The compact board is 64 codes, one per square, in the order 8*y + x with y
+# counted from the top as in the game's locations: 0 for an empty square,
+# 1-6 for White's pawn, knight, bishop, rook, queen, and king, and 7-12 for
+# Black's.
+KINDS = ("pawn", "knight", "bishop", "rook", "queen", "king")
+CODES = {color + "_" + kind:index + 1 + 6*side
+for side, color in enumerate(("white", "black")) for index, kind in enumerate(KINDS)}
+PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING = range(1, 7) # White's; Black's are 6 more
+BLACK = 6
+# the game's mailbox square for each, with the 8x8 board starting at cell 21
+MAILBOX = [21 + square % 8 + 10*(square // 8) for square in range(64)]
+
+# piece values in centipawns, by code - 1 within a color
+VALUES = (100, 320, 330, 500, 900, 0)
+PHASES = (0, 1, 1, 2, 4, 0) # how much each piece counts towards the middlegame
+MAX_PHASE = 24 # the phase at the start of the game
+CHUNK = 4096 # the most boards scored in one go, to keep the arrays small
+
+# piece-square tables for White, from the top of the board (rank 8) down
+PIECE_SQUARES = (
+( 0,  0,  0,  0,  0,  0,  0,  0, # pawn
+ 50, 50, 50, 50, 50, 50, 50, 50,
+ 10, 10, 20, 30, 30, 20, 10, 10,
+  5,  5, 10, 25, 25, 10,  5,  5,
+  0,  0,  0, 20, 20,  0,  0,  0,
+  5, -5,-10,  0,  0,-10, -5,  5,
+  5, 10, 10,-20,-20, 10, 10,  5,
+  0,  0,  0,  0,  0,  0,  0,  0),
+(-50,-40,-30,-30,-30,-30,-40,-50, # knight
+-40,-20,  0,  0,  0,  0,-20,-40,
+-30,  0, 10, 15, 15, 10,  0,-30,
+-30,  5, 15, 20, 20, 15,  5,-30,
+-30,  0, 15, 20, 20, 15,  0,-30,
+-30,  5, 10, 15, 15, 10,  5,-30,
+-40,-20,  0,  5,  5,  0,-20,-40,
+-50,-40,-30,-30,-30,-30,-40,-50),
+(-20,-10,-10,-10,-10,-10,-10,-20, # bishop
+-10,  0,  0,  0,  0,  0,  0,-10,
+-10,  0,  5, 10, 10,  5,  0,-10,
+-10,  5,  5, 10, 10,  5,  5,-10,
+-10,  0, 10, 10, 10, 10,  0,-10,
+-10, 10, 10, 10, 10, 10, 10,-10,
+-10,  5,  0,  0,  0,  0,  5,-10,
+-20,-10,-10,-10,-10,-10,-10,-20),
+( 0,  0,  0,  0,  0,  0,  0,  0, # rook
+  5, 10, 10, 10, 10, 10, 10,  5,
+ -5,  0,  0,  0,  0,  0,  0, -5,
+ -5,  0,  0,  0,  0,  0,  0, -5,
+ -5,  0,  0,  0,  0,  0,  0, -5,
+ -5,  0,  0,  0,  0,  0,  0, -5,
+ -5,  0,  0,  0,  0,  0,  0, -5,
+  0,  0,  0,  5,  5,  0,  0,  0),
+(-20,-10,-10, -5, -5,-10,-10,-20, # queen
+-10,  0,  0,  0,  0,  0,  0,-10,
+-10,  0,  5,  5,  5,  5,  0,-10,
+ -5,  0,  5,  5,  5,  5,  0, -5,
+  0,  0,  5,  5,  5,  5,  0, -5,
+-10,  5,  5,  5,  5,  5,  0,-10,
+-10,  0,  5,  0,  0,  0,  0,-10,
+-20,-10,-10, -5, -5,-10,-10,-20),
+(-30,-40,-40,-50,-50,-40,-40,-30, # king, in the middlegame
+-30,-40,-40,-50,-50,-40,-40,-30,
+-30,-40,-40,-50,-50,-40,-40,-30,
+-30,-40,-40,-50,-50,-40,-40,-30,
+-20,-30,-30,-40,-40,-30,-30,-20,
+-10,-20,-20,-20,-20,-20,-20,-10,
+ 20, 20,  0,  0,  0,  0, 20, 20,
+ 20, 30, 10,  0,  0, 10, 30, 20))
+KING_ENDGAME = (
+-50,-40,-30,-20,-20,-30,-40,-50,
+-30,-20,-10,  0,  0,-10,-20,-30,
+-30,-10, 20, 30, 30, 20,-10,-30,
+-30,-10, 30, 40, 40, 30,-10,-30,
+-30,-10, 30, 40, 40, 30,-10,-30,
+-30,-10, 20, 30, 30, 20,-10,-30,
+-30,-30,  0,  0,  0,  0,-30,-30,
+-50,-30,-30,-30,-30,-30,-30,-50)
+
+# the other terms, in centipawns
+MOBILITY = (0, 4, 5, 2, 1, 0) # for each square a piece can move to, by kind
+SHIELD = 10 # for each pawn in front of the king, in the middlegame
+KING_ATTACK = 8 # for each attack on the squares around the king, in the middlegame
+DOUBLED = -15 # for each pawn behind another on its file
+ISOLATED = -15 # for each pawn with no pawns of its own on the files beside it
+BACKWARD = -10 # for each pawn left behind the pawns beside it, and held back
+PASSED = (0, 10, 15, 25, 40, 65, 100, 0) # by how far a passed pawn has come
+
+def _tables():
+    """
+    Returns the middlegame and endgame tables: for each code, the value of a
+    piece of that kind on each square, from White's point of view.
+    """
+    middle = numpy.zeros((13, 64), dtype=numpy.int32)
+    end = numpy.zeros((13, 64), dtype=numpy.int32)
+    flip = numpy.arange(64) ^ 56 # Black's tables are White's upside down
+    for kind in range(6):
+        table = numpy.array(PIECE_SQUARES[kind]) + VALUES[kind]
+        end_table = numpy.array(KING_ENDGAME) if kind == KING - 1 else table
+        middle[kind + 1], middle[kind + 1 + BLACK] = table, -table[flip]
+        end[kind + 1], end[kind + 1 + BLACK] = end_table, -end_table[flip]
+    return middle, end
+
+def _steps(offsets):
+    """
+    Returns a 64x64 array of booleans: True where a piece moving by the given
+    offsets could step from the first square to the second.
+    """
+    steps = numpy.zeros((64, 64), dtype=bool)
+    for square in range(64):
+        x, y = square % 8, square // 8
+        for dx, dy in offsets:
+            if 0 <= x + dx < 8 and 0 <= y + dy < 8:
+                steps[square, x + dx + 8*(y + dy)] = True
+    return steps
+
+def _rays():
+    """
+    Returns a 64x8x7 array of the squares along each of the 8 directions from
+    each square, with the rook's four directions first. Past the edge of the
+    board, the rays are padded with 64, which stands for a blocked square.
+    """
+    rays = numpy.full((64, 8, 7), 64, dtype=numpy.intp)
+    for square in range(64):
+        x, y = square % 8, square // 8
+        for direction, (dx, dy) in enumerate(DIRECTIONS):
+            for step in range(7):
+                tx, ty = x + dx*(step + 1), y + dy*(step + 1)
+                if not (0 <= tx < 8 and 0 <= ty < 8):
+                    break
+                rays[square, direction, step] = tx + 8*ty
+    return rays
+
+def _shields():
+    """
+    Returns White's and Black's 64x64 arrays of booleans: True for the
+    squares on the two ranks in front of a king on the first square, on its
+    file and the files beside it, where its pawns shelter it.
+    """
+    shields = numpy.zeros((2, 64, 64), dtype=bool)
+    for square in range(64):
+        x, y = square % 8, square // 8
+        for side, forward in enumerate((-1, 1)):
+            for distance in (1, 2):
+                for dx in (-1, 0, 1):
+                    if 0 <= x + dx < 8 and 0 <= y + forward*distance < 8:
+                        shields[side, square, x + dx + 8*(y + forward*distance)] = True
+    return shields
+
+DIRECTIONS = ((1, 0), (-1, 0), (0, 1), (0, -1), (1, 1), (1, -1), (-1, 1), (-1, -1))
+if numpy is not None:
+    MIDDLEGAME, ENDGAME = _tables()
+    KNIGHT_STEPS = _steps(((1, 2), (2, 1), (2, -1), (1, -2), (-1, -2), (-2, -1), (-2, 1), (-1, 2)))
+    RAYS = _rays()
+    OPEN_RAYS = RAYS < 64 # the steps that are still on the board
+    # the squares around a king on each square, and its own square, with a
+    # square that's never in a zone at the end, for the padding of the rays
+    KING_ZONES = numpy.zeros((64, 65), dtype=bool)
+    KING_ZONES[:, :64] = _steps(DIRECTIONS) | numpy.eye(64, dtype=bool)
+    SHIELDS = _shields()
+    PHASE_TABLE = numpy.array((0,) + PHASES + PHASES)
+    MOBILITY_TABLE = numpy.array((0,) + MOBILITY + tuple(-weight for weight in MOBILITY))
+    # the codes of the pieces that mobility counts for
+    MOBILE = numpy.zeros(13, dtype=bool)
+    MOBILE[[KNIGHT, BISHOP, ROOK, QUEEN, KNIGHT + BLACK, BISHOP + BLACK, ROOK + BLACK, QUEEN + BLACK]] = True
+    # which directions each code slides in: the rook's four, the bishop's four, or all
+    SLIDES = numpy.zeros((13, 8), dtype=bool)
+    for _side in (0, BLACK):
+        SLIDES[BISHOP + _side, 4:] = SLIDES[ROOK + _side, :4] = SLIDES[QUEEN + _side] = True
+    # the passed pawn bonus for each row, from the top, for White
+    PASSED_BY_ROW = numpy.array(PASSED[::-1])
+
+def pawn_structure(state):
+    """
+    Returns the score of the pawns alone, from White's point of view: doubled,
+    isolated, backward, and passed pawns, scored as in the full evaluation.
+    It needs no NumPy, and it only depends on where the pawns are, so the
+    search can keep it in a pawn hash table.
+    Parameter:
+        state (GameState): the position
+    """
+    # each side's pawns by file, as ranks counted from its own side
+    files = ([[] for x in range(8)], [[] for x in range(8)])
+    for side, pawns in ((0, state.white_pawns), (1, state.black_pawns)):
+        for pawn in pawns:
+            if pawn.square:
+                y = pawn.square // 10 - 2
+                files[side][pawn.square % 10 - 1].append(7 - y if side == 0 else y)
+    score = 0
+    for side in (0, 1):
+        own, enemy = files[side], files[1 - side]
+        total = 0
+        for x in range(8):
+            if not own[x]:
+                continue
+            total += DOUBLED * (len(own[x]) - 1)
+            near = [file for file in (x - 1, x + 1) if 0 <= file < 8]
+            beside = [rank for file in near for rank in own[file]]
+            # the enemy's pawns on this file and beside it, by this side's ranks
+            ahead = [7 - rank for file in near + [x] for rank in enemy[file]]
+            for rank in own[x]:
+                if not beside:
+                    total += ISOLATED
+                elif min(beside) > rank and any(7 - other == rank + 2
+                for file in near for other in enemy[file]):
+                    total += BACKWARD
+                if all(other <= rank for other in ahead):
+                    total += PASSED[rank]
+        score += total if side == 0 else -total
+    return score
+
+def board_array(state):
+    """
+    Returns the compact board of a position: a NumPy array of 64 piece codes.
+    Parameter:
+        state (GameState): the position
+    """
+    board = state.board
+    return numpy.array([CODES[piece.type] if piece else 0
+    for piece in [board[square] for square in MAILBOX]], dtype=numpy.int8)
+
+def evaluate(state):
+    """
+    Returns a score for a position from the point of view of the player to
+    move: positive if they're ahead.
+    Parameter:
+        state (GameState): the position
+    """
+    return int(evaluate_boards(board_array(state)[None],
+    numpy.array([state.player is state.white_player]))[0])
+
+def evaluate_states(states):
+    """
+    Returns a NumPy array of scores for a list of positions, each from the
+    point of view of its player to move, in one vectorized call.
+    Parameter:
+        states (list): the positions, as GameState objects
+    """
+    if not states:
+        return numpy.zeros(0, dtype=numpy.int32)
+    return evaluate_boards(numpy.array([board_array(state) for state in states]),
+    numpy.array([state.player is state.white_player for state in states]))
+
+def evaluate_boards(boards, white_to_move=None):
+    """
+    Returns a NumPy array of scores for a batch of compact boards. Large
+    batches are scored CHUNK boards at a time.
+    Parameters:
+        boards (array): an N x 64 array of piece codes
+        white_to_move (array): N booleans, True where White is to move, so
+            that each score is from the point of view of the player to move;
+            or None for every score from White's point of view
+    """
+    boards = numpy.asarray(boards, dtype=numpy.intp).reshape(-1, 64)
+    scores = numpy.concatenate([_evaluate(boards[start:start + CHUNK])
+    for start in range(0, len(boards), CHUNK)] or [numpy.zeros(0, dtype=numpy.int32)])
+    if white_to_move is not None:
+        scores = numpy.where(white_to_move, scores, -scores)
+    return scores
+
+def _evaluate(boards):
+    """
+    Returns the scores of a batch of compact boards from White's point of view.
+    Parameter:
+        boards (array): an N x 64 array of piece codes
+    """
+    count = len(boards)
+    squares = numpy.arange(64)
+    white = (boards >= 1) & (boards <= 6)
+    black = boards > BLACK
+    # material and piece-square tables, blended by how much material is left
+    phase = numpy.minimum(PHASE_TABLE[boards].sum(axis=1), MAX_PHASE)
+    middle = MIDDLEGAME[boards, squares].sum(axis=1)
+    end = ENDGAME[boards, squares].sum(axis=1)
+    # mobility and king safety are worked out piece by piece, for the
+    # knights, bishops, rooks, and queens of every board at once
+    white_king = (boards == KING).argmax(axis=1)
+    black_king = (boards == KING + BLACK).argmax(axis=1)
+    # each square's color: 1 for White, 2 for Black, and 0 if it's empty,
+    # with a blocked square at the end for the padding of the rays
+    colors = numpy.concatenate((white + 2*black, numpy.full((count, 1), 3)), axis=1).astype(numpy.int8)
+    board, square = numpy.nonzero(MOBILE[boards])
+    code = boards[board, square]
+    color = colors[board, square]
+    enemy_king = numpy.where(color == 1, black_king[board], white_king[board])
+    sign = numpy.where(color == 1, 1, -1)
+    # sliders: a square is reached if every square before it on the ray is empty
+    along = colors[board[:, None, None], RAYS[square]] # pieces x 8 x 7
+    reached = numpy.ones(along.shape, dtype=bool)
+    reached[..., 1:] = numpy.cumprod(along[..., :-1] == 0, axis=2, dtype=bool)
+    reached &= OPEN_RAYS[square] & SLIDES[code][..., None]
+    moves = (reached & (along != color[:, None, None])).sum(axis=(1, 2))
+    attacks = (reached & KING_ZONES[enemy_king[:, None, None], RAYS[square]]).sum(axis=(1, 2))
+    # knights
+    knight = code % BLACK == KNIGHT
+    steps = KNIGHT_STEPS[square[knight]]
+    moves[knight] = (steps & (colors[board[knight], :64] != color[knight][:, None])).sum(axis=1)
+    attacks[knight] = (steps & KING_ZONES[enemy_king[knight], :64]).sum(axis=1)
+    mobility = numpy.bincount(board, moves * MOBILITY_TABLE[code], count)
+    # king safety: pawns in front of the king, and attacks on the squares
+    # around it, which both matter less as the pieces come off
+    shield = (SHIELDS[0, white_king] & (boards == PAWN)).sum(axis=1) - \
+    (SHIELDS[1, black_king] & (boards == PAWN + BLACK)).sum(axis=1)
+    safety = SHIELD * shield + KING_ATTACK * numpy.bincount(board, attacks * sign, count)
+    # pawn structure, file by file. Each side's pawns are looked at as if
+    # they were White's, moving up the board, with Black's turned upside down.
+    white_pawns = (boards == PAWN).reshape(count, 8, 8) # by row (from the top), then file
+    black_pawns = (boards == PAWN + BLACK).reshape(count, 8, 8)
+    rows = numpy.arange(8)[None, :, None]
+    structure = numpy.zeros(count, dtype=numpy.int64)
+    for sign, pawns, others in ((1, white_pawns, black_pawns),
+    (-1, black_pawns[:, ::-1], white_pawns[:, ::-1])):
+        files = pawns.sum(axis=1) # N x 8
+        beside = numpy.zeros_like(files)
+        beside[:, 1:] += files[:, :-1]
+        beside[:, :-1] += files[:, 1:]
+        doubled = numpy.maximum(files - 1, 0).sum(axis=1)
+        isolated = (files * (beside == 0)).sum(axis=1)
+        # a pawn is passed if no enemy pawn ahead of it is on its file or
+        # the files beside it
+        front = _widen(numpy.where(others, rows, 8).min(axis=1), numpy.minimum)
+        passed = pawns & (front[:, None, :] >= rows)
+        # and backward if the pawns on the files beside it are all ahead of
+        # it, so none can guard the square in front, which an enemy pawn does
+        rear = numpy.where(pawns, rows, -1).max(axis=1)
+        support = numpy.full_like(rear, -1)
+        support[:, 1:] = rear[:, :-1]
+        support[:, :-1] = numpy.maximum(support[:, :-1], rear[:, 1:])
+        guarded = numpy.zeros_like(pawns)
+        guarded[:, 2:, 1:] |= others[:, :-2, :-1]
+        guarded[:, 2:, :-1] |= others[:, :-2, 1:]
+        backward = (pawns & guarded & (beside > 0)[:, None, :] &
+        (support[:, None, :] < rows)).sum(axis=(1, 2))
+        bonus = (passed * PASSED_BY_ROW[None, :, None]).sum(axis=(1, 2))
+        structure += sign * (DOUBLED * doubled + ISOLATED * isolated + BACKWARD * backward + bonus)
+    # blend, rounding towards zero so that either side is scored the same
+    blended = middle * phase + end * (MAX_PHASE - phase) + safety * phase
+    blended = numpy.sign(blended) * (numpy.abs(blended) // MAX_PHASE)
+    return (blended + mobility + structure).astype(numpy.int32)
+
+def _widen(front, pick):
+    """
+    Returns the nearest enemy pawn on each file or the files beside it, from
+    the nearest on each file alone.
+    Parameters:
+        front (array): N x 8, the rank of the nearest enemy pawn on each file
+        pick (function): numpy.minimum or numpy.maximum, whichever is nearer
+    """
+    widened = front.copy()
+    widened[:, 1:] = pick(widened[:, 1:], front[:, :-1])
+    widened[:, :-1] = pick(widened[:, :-1], front[:, 1:])
+    return widened
@@ -0,0 +1,1743 @@
+#-------------------------------------------------------------------------------
+# Name:        GameState
+# Purpose:     Hold the rules state of a game of chess (pieces, squares, moves,
+#              and whose turn it is) without any dependency on tkinter, so that
+#              games can be validated and simulated on machines with no display.
+#-------------------------------------------------------------------------------
+
+from random import *
+import pickle
+try:
+    import bitboard
+except:
+    bitboard = None # only the mailbox move generator is available
+try:
+    from transposition import TranspositionTable
+except:
+    TranspositionTable = None # the computer opponent will search without one
+try:
+    from evaluation import KINDS, VALUES, PHASES, PIECE_SQUARES, KING_ENDGAME
+except:
+    # the incremental score will count material alone
+    KINDS = ("pawn", "knight", "bishop", "rook", "queen", "king")
+    VALUES = (100, 320, 330, 500, 900, 0)
+    PHASES = (0, 1, 1, 2, 4, 0)
+    PIECE_SQUARES = KING_ENDGAME = None
+
+
+# The board is a 10x12 "mailbox": a list of 120 cells in which the 8x8 board
+# sits inside a border that's two cells deep at the top and bottom and one cell
+# deep at the sides. A square is the index of its cell, so moving a piece is
+# just adding an offset, and any move that leaves the board lands on a border
+# cell instead of needing a range check. Square 21 is the top left of the
+# board ("00"), 28 is the top right ("70"), 91 is the bottom left ("07"), and
+# 98 is the bottom right ("77").
+OFF_BOARD = 0 # the square of a piece that isn't on the board, i.e. "88"
+EDGE = False # the contents of a border cell
+
+# the two-character locations used by the interface and in save files, and
+# the squares that they describe, in both directions
+SQUARE = {str(x)+str(y):21+x+10*y for x in range(8) for y in range(8)}
+LOCATION = {square:location for location,square in SQUARE.items()}
+LOCATION[OFF_BOARD] = "88"
+
+# Zobrist keys for hashing positions. Each piece type on each square, black to
+# move, each castling right, and each square a pawn can be captured en passant
+# on gets a random 64-bit number, and a position's hash is the XOR of the
+# numbers for everything that's true of it. A fixed seed keeps hashes the same
+# from one run (or process) to the next.
+_zobrist = Random(20160315)
+PIECE_KEYS = {color + "_" + kind:[_zobrist.getrandbits(64) for square in range(120)]
+for color in ("white", "black")
+for kind in ("pawn", "rook", "knight", "bishop", "queen", "king")}
+BLACK_TO_MOVE = _zobrist.getrandbits(64)
+# black queenside, black kingside, white queenside, and white kingside
+CASTLING_KEYS = [_zobrist.getrandbits(64) for right in range(4)]
+EN_PASSANT_KEYS = [_zobrist.getrandbits(64) for square in range(120)]
+
+# Values for the incremental score, which is kept up to date with each move
+# in the same way as the hash: each piece type on each square gets its
+# material and piece-square value from White's point of view (negative for
+# Black's pieces), once for the middlegame and once for the endgame, and each
+# piece type gets its weight in the game phase.
+PIECE_MIDDLEGAME = {}
+PIECE_ENDGAME = {}
+PIECE_PHASES = {}
+for _index, _kind in enumerate(KINDS):
+    for _color, _sign in (("white", 1), ("black", -1)):
+        _type = _color + "_" + _kind
+        PIECE_MIDDLEGAME[_type] = [0] * 120
+        PIECE_ENDGAME[_type] = [0] * 120
+        PIECE_PHASES[_type] = PHASES[_index]
+        for _location, _square in SQUARE.items():
+            # the tables are for White, from the top; Black's are upside down
+            _x, _y = int(_location[0]), int(_location[1])
+            _cell = _x + 8*(_y if _color == "white" else 7 - _y)
+            _middle = PIECE_SQUARES[_index][_cell] if PIECE_SQUARES else 0
+            _end = KING_ENDGAME[_cell] if PIECE_SQUARES and _kind == "king" else _middle
+            PIECE_MIDDLEGAME[_type][_square] = _sign * (VALUES[_index] + _middle)
+            PIECE_ENDGAME[_type][_square] = _sign * (VALUES[_index] + _end)
+
+def to_square(location):
+    """
+    Returns the square for a two-character location, or OFF_BOARD if the
+    location isn't on the board.
+    Parameter:
+        location (string): a location like "07"
+    """
+    return SQUARE.get(location, OFF_BOARD)
+
+def to_location(square):
+    """
+    Returns the two-character location for a square.
+    Parameter:
+        square (int): a square on the mailbox board
+    """
+    return LOCATION[square]
+
+def coordinates(square):
+    """
+    Returns the x and y values of a square, each from 0 to 7, with 0,0 at the
+    top left.
+    Parameter:
+        square (int): a square on the mailbox board
+    """
+    return square%10 - 1, square//10 - 2
+
+def new_board():
+    """
+    Returns an empty mailbox board: None on each of the 64 squares and EDGE
+    everywhere else.
+    """
+    board = [EDGE] * 120
+    for square in LOCATION:
+        if square != OFF_BOARD:
+            board[square] = None
+    return board
+
+# what castling changes on the board and whose turn it is, for each castle
+CASTLE_KEYS = {"bl":PIECE_KEYS["black_king"][SQUARE["40"]] ^ PIECE_KEYS["black_king"][SQUARE["20"]] ^
+PIECE_KEYS["black_rook"][SQUARE["00"]] ^ PIECE_KEYS["black_rook"][SQUARE["30"]] ^ BLACK_TO_MOVE,
+"br":PIECE_KEYS["black_king"][SQUARE["40"]] ^ PIECE_KEYS["black_king"][SQUARE["60"]] ^
+PIECE_KEYS["black_rook"][SQUARE["70"]] ^ PIECE_KEYS["black_rook"][SQUARE["50"]] ^ BLACK_TO_MOVE,
+"wl":PIECE_KEYS["white_king"][SQUARE["47"]] ^ PIECE_KEYS["white_king"][SQUARE["27"]] ^
+PIECE_KEYS["white_rook"][SQUARE["07"]] ^ PIECE_KEYS["white_rook"][SQUARE["37"]] ^ BLACK_TO_MOVE,
+"wr":PIECE_KEYS["white_king"][SQUARE["47"]] ^ PIECE_KEYS["white_king"][SQUARE["67"]] ^
+PIECE_KEYS["white_rook"][SQUARE["77"]] ^ PIECE_KEYS["white_rook"][SQUARE["57"]] ^ BLACK_TO_MOVE}
+# and what it changes in the middlegame and endgame scores
+CASTLE_SCORES = {castle:tuple(
+table[color + "_king"][SQUARE[king[1]]] - table[color + "_king"][SQUARE[king[0]]] +
+table[color + "_rook"][SQUARE[rook[1]]] - table[color + "_rook"][SQUARE[rook[0]]]
+for table in (PIECE_MIDDLEGAME, PIECE_ENDGAME))
+for castle, color, king, rook in (("bl", "black", ("40", "20"), ("00", "30")),
+("br", "black", ("40", "60"), ("70", "50")), ("wl", "white", ("47", "27"), ("07", "37")),
+("wr", "white", ("47", "67"), ("77", "57")))}
+
+class Player(object):
+    """
+    An object of this class represents a player.
+    Attributes:
+        color (string): a string representing the player's color
+            (black or white)
+        mode (string): a string representing the player's choice of UI mode -
+            two clicks to move or click-and-drag to move
+    """
+    def __init__(self, color):
+        self.color = color
+        self.mode = "click"
+
+class Piece(object):
+    """
+    An object of this class represents a chess piece.
+    Attributes:
+        board (list): a reference to the game's mailbox board
+        color (string): the color of the piece
+        square (int): the piece's square on the mailbox board, or OFF_BOARD
+    """
+    def __init__(self, board, color, location):
+        self.board = board
+        self.color = color # the color of a piece - either "black" or "white"
+        self.square = to_square(location) # where the piece starts
+
+    @property
+    def location(self):
+        """
+        The piece's location as a 2-char string. "00" is the top left square,
+        "07" is the bottom left, "70" is the top right, "77" is the bottom
+        right, and "88" is off the board.
+        """
+        return LOCATION[self.square]
+
+    @location.setter
+    def location(self, location):
+        self.square = to_square(location)
+
+    def add_if_okay(self, square):
+        """
+        This method is used for pieces whose movesets extend until they hit
+        a piece: queens, rooks, bishops.
+        Parameter:
+            square (int): the destination square of the move
+        """
+        contents = self.board[square]
+        if contents is None: # if the destination is empty
+            self.moveset.add(square) # add to moves
+            return True # could be moves in that direction
+        else: # if there's a piece there, or it's off the board
+            if contents is not EDGE and contents.color != self.color: # and it's an enemy
+                self.moveset.add(square) # add it
+            return False # stop looking for moves in that direction
+
+    def generate_slides(self):
+        """
+        Generates a moveset for a piece that moves in straight lines until it
+        reaches a piece. If the piece is an enemy, that space is a valid move.
+        """
+        self.moveset = set() # start with an empty set
+        if self.square == OFF_BOARD: # if it's not on the board
+            return # it can't move
+        # here we're going to start looking for pieces to add in each of
+        # the piece's directions. it'll first try to add a square, and then
+        # if it's empty it'll move to the next one. if there's a piece in that
+        # square, it'll add it if the piece is an enemy and then stop looking
+        # in that direction. getting to the edge of the board will also stop
+        # that direction.
+        for direction in self.directions:
+            square = self.square + direction
+            while self.add_if_okay(square): # until you hit a piece or the edge
+                square += direction # keep going the same way
+
+    def generate_steps(self):
+        """
+        Generates a moveset for a piece that can move to a predetermined set of
+        locations relative to its current position. If a location is off the
+        board or occupied by an allied piece, that location is not included in
+        the moveset.
+        """
+        self.moveset = set() # start with an empty set
+        if self.square == OFF_BOARD: # if it's not on the board
+            return # it can't move
+        for offset in self.offsets:
+            occupier = self.board[self.square + offset]
+            if occupier is None: # if the square is empty
+                self.moveset.add(self.square + offset) # it's a valid move
+            # if there is an enemy piece there
+            elif occupier is not EDGE and occupier.color != self.color:
+                self.moveset.add(self.square + offset) # it's a valid move
+
+    def slide_captures(self):
+        """
+        Returns the squares where a piece that moves in straight lines can
+        capture: the first piece in each direction, if it's an enemy.
+        """
+        if self.square == OFF_BOARD: # if it's not on the board
+            return set() # it can't capture
+        board = self.board
+        captures = set()
+        for direction in self.directions:
+            square = self.square + direction
+            while board[square] is None: # skip the empty squares
+                square += direction
+            contents = board[square]
+            if contents is not EDGE and contents.color != self.color: # an enemy
+                captures.add(square)
+        return captures
+
+    def step_captures(self):
+        """
+        Returns the squares among a piece's predetermined offsets that hold an
+        enemy piece.
+        """
+        if self.square == OFF_BOARD: # if it's not on the board
+            return set() # it can't capture
+        board = self.board
+        captures = set()
+        for offset in self.offsets:
+            occupier = board[self.square + offset]
+            if occupier and occupier.color != self.color: # an enemy
+                captures.add(self.square + offset)
+        return captures
+
+class Pawn(Piece):
+    """
+    An object of this class represents a pawn piece.
+    Attributes:
+        direction (int): describes the direction the pawn can move - -10 for
+            "up" or 10 for "down"
+        moved (boolean): starts False, and then changes to True if it gets moved
+        vulnerable (boolean): a vulnerable state, caused by a first move
+            spanning two spaces, lasts for one turn and enables the pawn to be
+            captured en passant by enemy pawns
+        type (string): a string describing the piece with its color and type
+        moveset (set): a set of squares where this piece may move
+    """
+    def __init__(self, board, color, location):
+        super().__init__(board, color, location)
+        self.direction = 10
+        if color == "white": # white player
+            self.direction = -10 # moves 'up' the board, one row back
+        self.moved = False # hasn't moved yet
+        self.vulnerable = False # not vulnerable to en passant
+        self.type = self.color + "_pawn" # for dictionary key
+
+    def generate_moveset(self):
+        """
+        Generates a moveset for this piece. Pawns can move ahead one space. If
+        it's their first move, they can move ahead two spaces. If there's an
+        enemy to their front-left or front-right, they can move and capture. If
+        an enemy pawn's first move brings them adjacent to the pawn in question,
+        the enemy pawn can be captured by moving to the front-left or
+        front-right.
+        """
+        self.moveset = set() # start with an empty set
+        if self.square == OFF_BOARD: # if it's not on the board
+            return # it can't move
+        board = self.board
+
+        # look one space ahead
+        ahead = self.square + self.direction
+        if board[ahead] is None: # if it's on the board and empty
+            self.moveset.add(ahead) # add it
+            # look another space ahead and do the same thing, but make sure
+            # it's the first move. we already know the square between is empty.
+            if not self.moved and board[ahead + self.direction] is None:
+                self.moveset.add(ahead + self.direction) # add it
+        for target in (ahead - 1, ahead + 1): # can it capture an enemy?
+            contents = board[target]
+            if contents is None: # no piece there
+                # but there is a piece behind there
+                behind = board[target - self.direction]
+                # and it's a vulnerable enemy pawn
+                if behind and behind.color != self.color and \
+                "pawn" in behind.type and behind.vulnerable:
+                    self.moveset.add(target) # add due to en passant
+            # if there's an enemy piece there
+            elif contents is not EDGE and contents.color != self.color:
+                self.moveset.add(target) # it's a valid move
+
+    def generate_captures(self):
+        """
+        Returns the squares of this pawn's moveset that capture, including en
+        passant, along with a move ahead onto the far side of the board, since
+        a promotion changes the material as much as a capture does. Unlike
+        generate_moveset, this doesn't change the moveset.
+        """
+        captures = set()
+        if self.square == OFF_BOARD: # if it's not on the board
+            return captures # it can't move
+        board = self.board
+        ahead = self.square + self.direction
+        if board[ahead] is None and board[ahead + self.direction] is EDGE:
+            captures.add(ahead) # a promotion
+        for target in (ahead - 1, ahead + 1):
+            contents = board[target]
+            if contents is None: # en passant, as in generate_moveset
+                behind = board[target - self.direction]
+                if behind and behind.color != self.color and \
+                "pawn" in behind.type and behind.vulnerable:
+                    captures.add(target)
+            elif contents is not EDGE and contents.color != self.color:
+                captures.add(target)
+        return captures
+
+class Rook(Piece):
+    """
+    An object of this class represents a rook piece.
+    Attributes:
+        moved (boolean): False if the piece hasn't moved yet, True as soon as
+            it has
+        type (string): a string describing the piece with its color and type
+        moveset: a set of squares where this piece may move
+    """
+    directions = (10, 1, -10, -1) # down, right, up, left
+
+    def __init__(self, board, color, location):
+        super().__init__(board, color, location)
+        self.moved = False # used to check castles
+        self.type = self.color + "_rook" # for dictionary key
+
+    def generate_moveset(self):
+        """
+        Generates a moveset for this piece. Rooks can move in straight lines
+        horizontally or vertically until they reach a piece. If the piece
+        is an enemy, that space is a valid move for the rook.
+        """
+        self.generate_slides()
+
+    def generate_captures(self):
+        """
+        Returns the squares where this rook can capture: the first piece in
+        each horizontal and vertical line, if it's an enemy.
+        """
+        return self.slide_captures()
+
+class Knight(Piece):
+    """
+    An object of this class represents a knight piece.
+    Attributes:
+        type (string): a string describing the piece with its color and type
+        moveset (set): a set of squares where this piece may move
+    """
+    offsets = (-21, -19, -12, -8, 8, 12, 19, 21) # the knight moveset is hard-coded
+
+    def __init__(self, board, color, location):
+        super().__init__(board, color, location)
+        self.type = self.color + "_knight" # for dictionary key
+
+    def generate_moveset(self):
+        """
+        Generates a moveset for this piece. Knights can move to a predetermined
+        set of locations relative to their current position. If a location is
+        off the board or occupied by an allied piece, that location is not
+        included in the moveset.
+        """
+        self.generate_steps()
+
+    def generate_captures(self):
+        """
+        Returns the squares among the knight's hard-coded locations that hold
+        an enemy piece.
+        """
+        return self.step_captures()
+
+class Bishop(Piece):
+    """
+    An object of this class represents a bishop piece.
+    Attributes:
+        type (string): a string describing the piece with its color and type
+        moveset (set): a set of squares where this piece may move
+    """
+    directions = (11, -9, -11, 9) # down-right, up-right, up-left, down-left
+
+    def __init__(self, board, color, location):
+        super().__init__(board, color, location)
+        self.type = self.color + "_bishop" # for dictionary key
+
+    def generate_moveset(self):
+        """
+        Generates a moveset for this piece. Bishops can move in diagonal lines
+        until they reach a piece. If the piece is an enemy, that space is a
+        valid move for the bishop.
+        """
+        self.generate_slides()
+
+    def generate_captures(self):
+        """
+        Returns the squares where this bishop can capture: the first piece in
+        each diagonal line, if it's an enemy.
+        """
+        return self.slide_captures()
+
+class King(Piece):
+    """
+    An object of this class represents a king piece.
+    Attributes:
+        moved (boolean): False if the piece hasn't moved yet, True as soon as
+            it has
+        type (string): a string describing the piece with its color and type
+        moveset (set): a set of squares where this piece may move
+    """
+    offsets = (-11, -1, 9, -10, 10, -9, 1, 11) # the king moveset is hard-coded
+
+    def __init__(self, board, color, location):
+        super().__init__(board, color, location)
+        self.moved = False
+        self.type = self.color + "_king" # for dictionary key
+
+    def generate_moveset(self):
+        """
+        Generates a moveset for this piece. Kings can move to a predetermined
+        set of locations relative to their current position. If a location is
+        off the board or occupied by an allied piece, that location is not
+        included in the moveset.
+        """
+        self.generate_steps()
+
+    def generate_captures(self):
+        """
+        Returns the adjacent squares that hold an enemy piece. Whether the
+        king would be safe there is left to legal_movesets.
+        """
+        return self.step_captures()
+
+class Queen(Piece):
+    """
+    An object of this class represents a queen piece.
+    Attributes:
+        type (string): a string describing the piece with its color and type
+        moveset (set): a set of squares where this piece may move
+    """
+    # diagonal, horizontal, and vertical
+    directions = Bishop.directions + Rook.directions
+
+    def __init__(self, board, color, location):
+        super().__init__(board, color, location)
+        self.type = self.color + "_queen" # for dictionary key
+
+    def generate_moveset(self):
+        """
+        Generates a moveset for this piece. Queens can move in diagonal,
+        horizontal, or vertical lines until they reach a piece. If the piece is
+        an enemy, that space is a valid move for the queen.
+        """
+        self.generate_slides()
+
+    def generate_captures(self):
+        """
+        Returns the squares where this queen can capture: the first piece in
+        each diagonal, horizontal, and vertical line, if it's an enemy.
+        """
+        return self.slide_captures()
+
+class Undo(object):
+    """
+    An object of this class holds everything needed to take back one move.
+    Attributes:
+        moves (list): a (piece, square, moved) tuple for each piece that moved,
+            with the square it came from and its moved flag before the move
+            (None if it doesn't have one)
+        captured (list): a (piece, square) tuple for each captured piece
+        promoted (Piece): the extra piece that a promoted pawn became, or None
+        vulnerable (list): the pawns that were vulnerable to en passant before
+            the move
+        player (Player): the player whose turn it was
+        last_source (int): the game's last_source before the move
+        last_target (int): the game's last_target before the move
+        winner (string): the game's winner before the move
+        hash (int): the game's hash before the move
+        pawn_hash (int): the game's pawn_hash before the move
+    """
+    def __init__(self, state):
+        self.moves = []
+        self.captured = []
+        self.promoted = None
+        self.vulnerable = [p for p in state.white_pawns + state.black_pawns if p.vulnerable]
+        self.player = state.player
+        self.last_source = state.last_source
+        self.last_target = state.last_target
+        self.winner = state.winner
+        self.hash = state.hash
+        self.pawn_hash = state.pawn_hash
+        self.score = state.middlegame, state.endgame, state.phase
+
+class GameState(object):
+    """
+    An object of this class represents the state of a chess game, with no
+    user interface. The Chess class draws itself from one of these, but it can
+    also be created and played on its own.
+    Attributes:
+        board (list): the mailbox board. Each cell holds the Piece on that
+            square, None if the square is empty, or EDGE if it's off the board.
+        white_player (Player): a Player object, using the white pieces
+        black_player (Player): a Player object, using the black pieces
+        player (Player): a reference to the currently-active Player
+        black_rook_1 (Rook): the queenside black rook
+        black_knight_1 (Knight): the queenside black knight
+        black_bishop_1 (Bishop): the queenside black bishop
+        black_queen (Queen): the black queen
+        black_king (King): the black king
+        black_bishop_2 (Bishop): the kingside black bishop
+        black_knight_2 (Knight): the kingside black knight
+        black_rook_2 (Rook): the kingside black rook
+        black_pawns (list): a list of black Pawns starting from the left
+        extra_black_queens (list): a list of the extra queens that black can
+            unlock via pawn promotion (likewise extra_black_rooks,
+            extra_black_bishops, and extra_black_knights)
+        white_pawns (list): a list of white Pawns starting from the left
+        white_rook_1 (Rook): the queenside white rook
+        white_knight_1 (Knight): the queenside white knight
+        white_bishop_1 (Bishop): the queenside white bishop
+        white_queen (Queen): the white queen
+        white_king (King): the white king
+        white_bishop_2 (Bishop): the kingside white bishop
+        white_knight_2 (Knight): the kingside white knight
+        white_rook_2 (Rook): the kingside white rook
+        extra_white_queens (list): a list of the extra queens that white can
+            unlock via pawn promotion (likewise extra_white_rooks,
+            extra_white_bishops, and extra_white_knights)
+        all_pieces (list): a list that points to each piece
+        movelist (list): a list of moves, in the form of "0077" for moving from
+            top left corner to bottom right corner, or "wl" for white
+            castling queenside
+        replaycounter (int): an int that tells us what move we're on, to keep track
+            of where we are within the movelist
+        last_source (int): the last-moved piece's previous square
+        last_target (int): the last-moved piece's current square
+        last_ai_piece (Piece): a reference to the last Piece object the AI
+            player moved
+        white_promo (str): a character '1', '2', '3', or '4' that represents the next white promo
+        black_promo (str): a character '1', '2', '3', or '4' that represents the next black promo
+        winner (string): "White" or "Black" once a king has been captured, None
+            while the game continues
+        backend (string): "mailbox" to generate movesets with each piece's
+            generate_moveset method, or "bitboard" to use the bitboard module
+        incremental (boolean): True to have the mailbox backend regenerate only
+            the movesets that the moves since the last generation may have
+            changed, False to regenerate every moveset each time
+        check_movesets (boolean): a debugging switch. If True, each incremental
+            update is checked against a full regeneration.
+        changed_squares (set): the squares whose contents have changed since
+            movesets were last generated
+        undo_stack (list): an Undo for each move made since setup, so that
+            moves can be taken back with unmake_move
+        hash (int): a 64-bit Zobrist hash of the position: the pieces on the
+            board, whose turn it is, the castling rights, and the pawn that
+            can be captured en passant. It's updated with each move.
+        pawn_hash (int): a hash of the pawns alone, by the same keys, for the
+            pawn hash table. It's updated with each move, like the hash.
+        middlegame (int): the material and piece-square values of the pieces
+            on the board, from White's point of view, by the middlegame
+            tables. It's updated with each move, like the hash.
+        endgame (int): the same, by the endgame tables
+        phase (int): how much of the middlegame is left, by the pieces on
+            the board, for blending those two scores
+        check_score (boolean): a debugging switch. If True, the score after
+            each move is checked against one computed from scratch.
+        hash_megabytes (int): the memory budget for the transposition table
+        table (TranspositionTable): the computer opponent's transposition
+            table, created on first use by transposition_table
+        pawn_table (PawnTable): the computer opponent's table of pawn
+            structure scores, created by the search on first use
+    """
+    def __init__(self, backend="mailbox"):
+        # Create the two players, white and black.
+        self.white_player = Player("white")
+        self.black_player = Player("black")
+
+        # Set a default pawn promotion to queen for each player.
+        self.white_promo = '1'
+        self.black_promo = '1'
+
+        self.movelist = [] # a fresh movelist
+        self.replaycounter = 0 # start from the beginning of a new match
+        self.backend = backend
+        self.incremental = True # only update the movesets that need it
+        self.check_movesets = False # and trust that they're right
+        self.check_score = False # likewise for the incremental score
+        self.hash_megabytes = 16 # memory for the transposition table
+        self.table = None # which isn't needed until the computer searches
+        self.pawn_table = None # and neither is this one
+        self.setup()
+
+    def setup(self):
+        """
+        Puts every piece back on its starting square and gives the first turn
+        to white. The movelist and replaycounter are left alone, so that a
+        replay can be stepped through again from the beginning.
+        """
+        range8 = range(8) # make a range(8) object and save it
+
+        # Make an empty mailbox board.
+        self.board = new_board()
+
+        # The pieces.
+        self.black_rook_1 = Rook(self.board, "black", "00")
+        self.black_knight_1 = Knight(self.board, "black", "10")
+        self.black_bishop_1 = Bishop(self.board, "black", "20")
+        self.black_queen = Queen(self.board, "black", "30")
+        self.black_king = King(self.board, "black", "40")
+        self.black_bishop_2 = Bishop(self.board, "black", "50")
+        self.black_knight_2 = Knight(self.board, "black", "60")
+        self.black_rook_2 = Rook(self.board, "black", "70")
+        self.black_pawns = [Pawn(self.board, "black", str(i)+'1') for i in range8]
+        self.extra_black_queens = [Queen(self.board, "black", "88") for i in range8]
+        self.extra_black_rooks = [Rook(self.board, "black", "88") for i in range8]
+        self.extra_black_bishops = [Bishop(self.board, "black", "88") for i in range8]
+        self.extra_black_knights = [Knight(self.board, "black", "88") for i in range8]
+
+        self.white_pawns = [Pawn(self.board, "white", str(i)+'6') for i in range8]
+        self.white_rook_1 = Rook(self.board, "white", "07")
+        self.white_knight_1 = Knight(self.board, "white", "17")
+        self.white_bishop_1 = Bishop(self.board, "white", "27")
+        self.white_queen = Queen(self.board, "white", "37")
+        self.white_king = King(self.board, "white", "47")
+        self.white_bishop_2 = Bishop(self.board, "white", "57")
+        self.white_knight_2 = Knight(self.board, "white", "67")
+        self.white_rook_2 = Rook(self.board, "white", "77")
+        self.extra_white_queens = [Queen(self.board, "white", "88") for i in range8]
+        self.extra_white_rooks = [Rook(self.board, "white", "88") for i in range8]
+        self.extra_white_bishops = [Bishop(self.board, "white", "88") for i in range8]
+        self.extra_white_knights = [Knight(self.board, "white", "88") for i in range8]
+
+        # This will put pieces in each square to set up the game.
+        self.board[SQUARE["00"]] = self.black_rook_1
+        self.board[SQUARE["10"]] = self.black_knight_1
+        self.board[SQUARE["20"]] = self.black_bishop_1
+        self.board[SQUARE["30"]] = self.black_queen
+        self.board[SQUARE["40"]] = self.black_king
+        self.board[SQUARE["50"]] = self.black_bishop_2
+        self.board[SQUARE["60"]] = self.black_knight_2
+        self.board[SQUARE["70"]] = self.black_rook_2
+
+        for p in range8:
+            self.board[SQUARE[str(p)+'1']] = self.black_pawns[p]
+            self.board[SQUARE[str(p)+'6']] = self.white_pawns[p]
+
+        self.board[SQUARE["07"]] = self.white_rook_1
+        self.board[SQUARE["17"]] = self.white_knight_1
+        self.board[SQUARE["27"]] = self.white_bishop_1
+        self.board[SQUARE["37"]] = self.white_queen
+        self.board[SQUARE["47"]] = self.white_king
+        self.board[SQUARE["57"]] = self.white_bishop_2
+        self.board[SQUARE["67"]] = self.white_knight_2
+        self.board[SQUARE["77"]] = self.white_rook_2
+
+        # this will store the Piece objects in a list so that they can be easily
+        # iterated through later on
+        self.all_pieces = [self.black_rook_1, self.black_knight_1,
+        self.black_bishop_1, self.black_queen, self.black_king,
+        self.black_bishop_2, self.black_knight_2, self.black_rook_2] + self.black_pawns
+
+        for i in range8:
+            self.all_pieces.append(self.extra_black_queens[i])
+            self.all_pieces.append(self.extra_black_rooks[i])
+            self.all_pieces.append(self.extra_black_bishops[i])
+            self.all_pieces.append(self.extra_black_knights[i])
+
+        self.all_pieces += (self.white_pawns +
+        [self.white_rook_1, self.white_knight_1, self.white_bishop_1,
+        self.white_queen, self.white_king, self.white_bishop_2,
+        self.white_knight_2, self.white_rook_2])
+
+        for i in range8:
+            self.all_pieces.append(self.extra_white_queens[i])
+            self.all_pieces.append(self.extra_white_rooks[i])
+            self.all_pieces.append(self.extra_white_bishops[i])
+            self.all_pieces.append(self.extra_white_knights[i])
+
+        # Make sure the first player is white.
+        self.player = self.white_player
+
+        self.last_source = self.last_target = None # no moves yet
+        self.winner = None # nobody has won yet
+
+        self.last_ai_piece = self.black_king # the AI needs to check what piece
+        # it moved last, so this makes sure it can do that even before its first
+        # move
+
+        self.undo_stack = [] # nothing to take back yet
+        self.hash = self.compute_hash() # hash the starting position
+        self.pawn_hash = self.compute_pawn_hash()
+        self.middlegame, self.endgame, self.phase = self.compute_score() # and score it
+
+        # Now generate initial movesets.
+        self.changed_squares = set()
+        self.generate_all_movesets(full=True)
+
+    def load_fen(self, fen):
+        """
+        Sets up the position described by a FEN string, like
+        "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1". The
+        movelist and replaycounter are left alone. Raises ValueError if the
+        FEN can't be read.
+        Parameter:
+            fen (string): the position in Forsyth-Edwards Notation
+        """
+        fields = fen.split()
+        if len(fields) < 4 or fields[0].count('/') != 7 or fields[1] not in ("w", "b"):
+            raise ValueError("Invalid FEN: " + fen)
+        self.setup() # fresh pieces
+        for piece in self.all_pieces: # all off the board for now
+            if piece.square != OFF_BOARD:
+                self.board[piece.square] = None
+                piece.square = OFF_BOARD
+        rights = fields[2]
+        # the rooks that castle must be the ones the castle methods move
+        castlers = {"Q":self.white_rook_1, "K":self.white_rook_2,
+        "q":self.black_rook_1, "k":self.black_rook_2}
+        corners = {"07":"Q", "77":"K", "00":"q", "70":"k"}
+        castling_rooks = [castlers[right] for right in rights if right in castlers]
+        # the pieces that can still be put on the board, by color and type
+        pools = {"white":{"p":list(self.white_pawns), "k":[self.white_king],
+        "q":[self.white_queen] + self.extra_white_queens,
+        "r":[self.white_rook_1, self.white_rook_2] + self.extra_white_rooks,
+        "b":[self.white_bishop_1, self.white_bishop_2] + self.extra_white_bishops,
+        "n":[self.white_knight_1, self.white_knight_2] + self.extra_white_knights},
+        "black":{"p":list(self.black_pawns), "k":[self.black_king],
+        "q":[self.black_queen] + self.extra_black_queens,
+        "r":[self.black_rook_1, self.black_rook_2] + self.extra_black_rooks,
+        "b":[self.black_bishop_1, self.black_bishop_2] + self.extra_black_bishops,
+        "n":[self.black_knight_1, self.black_knight_2] + self.extra_black_knights}}
+        for rook in castling_rooks: # these go on their own corners
+            pools[rook.color]["r"].remove(rook)
+        for y, row in enumerate(fields[0].split('/')):
+            x = 0
+            for char in row:
+                if char.isdigit():
+                    x += int(char)
+                    if x > 8: # more squares than the row has
+                        raise ValueError("Invalid FEN: " + fen)
+                    continue
+                if char in "Pp" and y in (0, 7): # pawns can't stand on the first or last rank
+                    raise ValueError("Invalid FEN: " + fen)
+                color = "white" if char.isupper() else "black"
+                square = SQUARE.get(str(x) + str(y))
+                right = corners.get(str(x) + str(y))
+                if char in "Rr" and right and right in rights and castlers[right].color == color:
+                    piece = castlers[right] # a rook that can castle
+                elif char.lower() in "pkqrbn" and square and pools[color][char.lower()]:
+                    piece = pools[color][char.lower()].pop(0)
+                else:
+                    raise ValueError("Invalid FEN: " + fen)
+                self.board[square] = piece
+                piece.square = square
+                if hasattr(piece, "moved"): # pawns off their first rank, and
+                    # kings and rooks without castling rights, have moved
+                    if "pawn" in piece.type:
+                        piece.moved = y != (6 if color == "white" else 1)
+                    elif "king" in piece.type:
+                        piece.moved = not any(right in rights for right in
+                        ("KQ" if color == "white" else "kq"))
+                    else:
+                        piece.moved = piece not in castling_rooks
+                x += 1
+            if x != 8: # a row must cover all eight squares
+                raise ValueError("Invalid FEN: " + fen)
+        if OFF_BOARD in (self.white_king.square, self.black_king.square): # each side needs its king
+            raise ValueError("Invalid FEN: " + fen)
+        self.player = self.white_player if fields[1] == "w" else self.black_player
+        if fields[3] != "-": # a pawn can be captured en passant
+            target = SQUARE.get(str("abcdefgh".find(fields[3][0])) + str(8 - int(fields[3][1:] or 0)))
+            direction = 10 if fields[1] == "w" else -10 # the pawn's direction
+            pawn = self.board[target + direction] if target else None
+            if not pawn or "pawn" not in pawn.type or pawn.color == self.player.color:
+                raise ValueError("Invalid FEN: " + fen)
+            pawn.vulnerable = True
+            self.last_source = target - direction
+            self.last_target = pawn.square
+        self.hash = self.compute_hash()
+        self.pawn_hash = self.compute_pawn_hash()
+        self.middlegame, self.endgame, self.phase = self.compute_score()
+        self.generate_all_movesets(full=True)
+
+    def legal_moves(self, captures=False):
+        """
+        Returns a list of the player to move's legal moves, in the same string
+        form as the movelist: "4644" or "wl", with each promotion given as one
+        move per piece, like "16071".
+        Parameter:
+            captures (boolean): True for only the captures and promotions
+        """
+        moves = []
+        for piece, squares in self.legal_movesets(captures).items():
+            source = LOCATION[piece.square]
+            for square in squares:
+                move = source + LOCATION[square]
+                # a pawn reaching the far side is promoted
+                if "pawn" in piece.type and self.board[square + piece.direction] is EDGE:
+                    moves.extend(move + promotion for promotion in "1234")
+                else:
+                    moves.append(move)
+        if captures: # castles never capture
+            return moves
+        for move, available in zip(("bl", "br", "wl", "wr"), self.castle_options()):
+            if available: # castle_options only allows the player to move
+                moves.append(move)
+        return moves
+
+    def record_move(self, move):
+        """
+        Writes a move into the movelist at the current replay position,
+        discarding any moves that came after it.
+        Parameter:
+            move (string): the move to record, like "0677" or "wl"
+        """
+        self.movelist = self.movelist[:self.replaycounter] # truncate
+        self.movelist.append(move) # write the move in the movelist
+        self.replaycounter += 1
+
+    def make_move(self, move):
+        """
+        Carries out a move from the movelist, given in the same string form
+        that's saved to disk. It can be taken back with unmake_move.
+        Parameter:
+            move (string): a move like "0677", "06770" with a promotion, or
+                "wl" for white castling queenside
+        """
+        if move == "bl": # if it's 'bl',
+            self.castle_black_left() # castle black left
+        elif move == "br": # if it's 'br',
+            self.castle_black_right() # castle black right
+        elif move == "wl": # if it's 'wl',
+            self.castle_white_left() # castle white left
+        elif move == "wr": # if it's 'wr',
+            self.castle_white_right() # castle white right
+        else: # if it's not a castle, it's a regular move
+            # do the move
+            self.move(self.board[SQUARE[move[0:2]]], SQUARE[move[2:4]], move[4:])
+
+    def transposition_table(self):
+        """
+        Returns the transposition table, creating it (or resizing it, if
+        hash_megabytes has changed) as needed. Returns None if the
+        transposition module isn't available.
+        """
+        if TranspositionTable is None:
+            return None
+        if self.table is None:
+            self.table = TranspositionTable(self.hash_megabytes)
+        elif self.table.megabytes != self.hash_megabytes:
+            self.table.resize(self.hash_megabytes)
+        return self.table
+
+    def copy(self):
+        """
+        Returns a separate copy of the game, which the computer opponent can
+        search on another thread while this one is drawn and played. The copy
+        shares this game's transposition table and pawn table rather than
+        copying them.
+        """
+        table, self.table = self.table, None
+        pawn_table, self.pawn_table = self.pawn_table, None
+        try:
+            game = pickle.loads(pickle.dumps(self))
+        finally:
+            self.table = table
+            self.pawn_table = pawn_table
+        game.table = table
+        game.pawn_table = pawn_table
+        return game
+
+    def compute_hash(self):
+        """
+        Returns the Zobrist hash of the position, computed from scratch. The
+        hash attribute should always be equal to this.
+        """
+        key = 0
+        for piece in self.all_pieces:
+            if piece.square != OFF_BOARD:
+                key ^= PIECE_KEYS[piece.type][piece.square]
+        if self.player is self.black_player:
+            key ^= BLACK_TO_MOVE
+        return key ^ self.castling_key() ^ self.en_passant_key()
+
+    def compute_pawn_hash(self):
+        """
+        Returns the hash of the pawns alone, computed from scratch. The
+        pawn_hash attribute should always be equal to this.
+        """
+        key = 0
+        for pawn in self.white_pawns + self.black_pawns:
+            if pawn.square != OFF_BOARD:
+                key ^= PIECE_KEYS[pawn.type][pawn.square]
+        return key
+
+    def compute_score(self):
+        """
+        Returns the (middlegame, endgame, phase) score of the position,
+        computed from scratch. The middlegame, endgame, and phase attributes
+        should always be equal to these.
+        """
+        middlegame = endgame = phase = 0
+        for piece in self.all_pieces:
+            if piece.square != OFF_BOARD:
+                middlegame += PIECE_MIDDLEGAME[piece.type][piece.square]
+                endgame += PIECE_ENDGAME[piece.type][piece.square]
+                phase += PIECE_PHASES[piece.type]
+        return middlegame, endgame, phase
+
+    def rescore(self, piece_type, square, sign):
+        """
+        Adds a piece's values on a square to the incremental score, or takes
+        them away, along with the pawn hash for a pawn.
+        Parameters:
+            piece_type (string): the piece's type, like "white_pawn"
+            square (int): the square
+            sign (int): 1 for a piece arriving, -1 for one leaving
+        """
+        self.middlegame += sign * PIECE_MIDDLEGAME[piece_type][square]
+        self.endgame += sign * PIECE_ENDGAME[piece_type][square]
+        self.phase += sign * PIECE_PHASES[piece_type]
+        if piece_type.endswith("pawn"):
+            self.pawn_hash ^= PIECE_KEYS[piece_type][square]
+
+    def verify_score(self):
+        """
+        Raises AssertionError if the incremental score or the pawn hash has
+        drifted from one computed from scratch. Called after each move when
+        check_score is on.
+        """
+        score = self.compute_score()
+        if (self.middlegame, self.endgame, self.phase) != score:
+            raise AssertionError("Incremental score is " +
+            str((self.middlegame, self.endgame, self.phase)) + ", should be " + str(score))
+        if self.pawn_hash != self.compute_pawn_hash():
+            raise AssertionError("Incremental pawn hash is " + hex(self.pawn_hash) +
+            ", should be " + hex(self.compute_pawn_hash()))
+
+    def castling_key(self):
+        """
+        Returns the part of the hash for the castling rights: each king and
+        rook pair that hasn't moved, with the rook still on its corner.
+        """
+        key = 0
+        for i, (king, rook, corner) in enumerate((
+        (self.black_king, self.black_rook_1, "00"),
+        (self.black_king, self.black_rook_2, "70"),
+        (self.white_king, self.white_rook_1, "07"),
+        (self.white_king, self.white_rook_2, "77"))):
+            if not king.moved and not rook.moved and rook.square == SQUARE[corner]:
+                key ^= CASTLING_KEYS[i]
+        return key
+
+    def en_passant_key(self):
+        """
+        Returns the part of the hash for en passant: the square of the pawn
+        that just moved two squares, if the player to move could capture it.
+        Pawns stay vulnerable until their own player's next turn, so only the
+        last-moved piece counts.
+        """
+        pawn = self.board[self.last_target] if self.last_target else None
+        if pawn and "pawn" in pawn.type and pawn.vulnerable and \
+        pawn.color != self.player.color:
+            return EN_PASSANT_KEYS[self.last_target]
+        return 0
+
+    def make_null_move(self):
+        """
+        Passes the turn to the other player without moving anything, for the
+        search's null-move pruning. The player passing loses any en passant
+        capture they had. It can be taken back with unmake_move.
+        """
+        undo = Undo(self) # remember how to take this back
+        self.hash ^= self.en_passant_key() # no capture en passant after this
+        self.safe_pawns() # as at the start of any move
+        if self.player is self.white_player: # if it was white's turn
+            self.player = self.black_player # now it's black's
+        else: # if it was black's turn
+            self.player = self.white_player # now it's white's
+        self.hash ^= BLACK_TO_MOVE ^ self.en_passant_key()
+        self.undo_stack.append(undo)
+
+    def unmake_move(self):
+        """
+        Takes back the last move made with make_move, move, or one of the
+        castle methods, restoring captured and promoted pieces, moved and
+        vulnerable flags, the last move, the winner, and whose turn it is.
+        Returns the Undo that was used, or None if there was nothing to take
+        back.
+        """
+        if not self.undo_stack: # if no moves have been made
+            return None
+        undo = self.undo_stack.pop()
+        board = self.board
+        changed = self.changed_squares
+        if undo.promoted: # take the extra piece off the board
+            board[undo.promoted.square] = None
+            changed.add(undo.promoted.square)
+            undo.promoted.square = OFF_BOARD
+        for piece, square, moved in undo.moves: # lift each moved piece
+            if piece.square != OFF_BOARD: # a promoted pawn is already off
+                board[piece.square] = None
+                changed.add(piece.square)
+        for piece, square, moved in undo.moves: # and put it back
+            board[square] = piece
+            piece.square = square
+            changed.add(square)
+            if moved is not None:
+                piece.moved = moved
+            if "pawn" in piece.type: # a pawn that just moved two squares
+                piece.vulnerable = False
+        for piece, square in undo.captured: # put back captured pieces
+            board[square] = piece
+            piece.square = square
+            changed.add(square)
+        for p in undo.vulnerable: # and make pawns vulnerable again
+            p.vulnerable = True
+            changed.add(p.square)
+        self.player = undo.player
+        self.last_source = undo.last_source
+        self.last_target = undo.last_target
+        self.winner = undo.winner
+        self.hash = undo.hash
+        self.pawn_hash = undo.pawn_hash
+        self.middlegame, self.endgame, self.phase = undo.score
+        return undo
+
+    def castle_options(self):
+        """
+        Checks if anyone can castle. Returns a list of four booleans, for
+        black queenside, black kingside, white queenside, and white kingside.
+        """
+        # if the castling area is empty, it's that player's turn, and the rook
+        # and king haven't moved (and the rook hasn't been captured), it's
+        # available, as long as the king isn't in check and doesn't pass
+        # through or land on an attacked square. if the game is over, nothing
+        # is available.
+        return [
+        (not self.black_rook_1.moved and self.black_rook_1.square == SQUARE["00"] and
+        not self.black_king.moved and
+        self.black_king.square != OFF_BOARD and \
+        self.white_king.square != OFF_BOARD and
+        self.player is self.black_player and
+        self.board[SQUARE["10"]] is None and
+        self.board[SQUARE["20"]] is None and
+        self.board[SQUARE["30"]] is None and
+        not any(self.attacked(SQUARE[location], "white") for location in ("40", "30", "20"))),
+        (not self.black_rook_2.moved and self.black_rook_2.square == SQUARE["70"] and
+        not self.black_king.moved and
+        self.black_king.square != OFF_BOARD and \
+        self.white_king.square != OFF_BOARD and
+        self.player is self.black_player and
+        self.board[SQUARE["50"]] is None and
+        self.board[SQUARE["60"]] is None and
+        not any(self.attacked(SQUARE[location], "white") for location in ("40", "50", "60"))),
+        (not self.white_rook_1.moved and self.white_rook_1.square == SQUARE["07"] and
+        not self.white_king.moved and
+        self.black_king.square != OFF_BOARD and \
+        self.white_king.square != OFF_BOARD and
+        self.player is self.white_player and
+        self.board[SQUARE["17"]] is None and
+        self.board[SQUARE["27"]] is None and
+        self.board[SQUARE["37"]] is None and
+        not any(self.attacked(SQUARE[location], "black") for location in ("47", "37", "27"))),
+        (not self.white_rook_2.moved and self.white_rook_2.square == SQUARE["77"] and
+        not self.white_king.moved and
+        self.black_king.square != OFF_BOARD and \
+        self.white_king.square != OFF_BOARD and
+        self.player is self.white_player and
+        self.board[SQUARE["57"]] is None and
+        self.board[SQUARE["67"]] is None and
+        not any(self.attacked(SQUARE[location], "black") for location in ("47", "57", "67")))]
+
+    def generate_all_movesets(self, full=False):
+        """
+        Goes through each piece and generates a moveset for it. In incremental
+        mode, only the pieces that the changed squares affect are regenerated,
+        unless a full regeneration is requested.
+        Parameter:
+            full (boolean): True to regenerate every moveset
+        """
+        if self.backend == "bitboard" and bitboard:
+            bitboard.generate_movesets(self)
+        elif self.incremental and not full:
+            self.update_movesets()
+            if self.check_movesets: # compare with a full regeneration
+                updated = [piece.moveset for piece in self.all_pieces]
+                self.regenerate_movesets()
+                for piece, moveset in zip(self.all_pieces, updated):
+                    if piece.moveset != moveset:
+                        raise AssertionError("Incremental moveset for " + piece.type +
+                        " at " + piece.location + " is " + str(sorted(moveset)) +
+                        ", should be " + str(sorted(piece.moveset)))
+        else:
+            self.regenerate_movesets()
+        self.changed_squares = set() # every moveset is current now
+
+    def update_movesets(self):
+        """
+        Regenerates the movesets of the pieces on the changed squares and of
+        the pieces whose movesets those squares affect, and empties the
+        movesets of pieces that have left the board. Rather than asking every
+        piece whether it's affected, this looks outward from each changed
+        square: a knight or king a step away, a pawn that could move or capture
+        there or capture en passant beside it, or a slider that can reach it
+        without passing an occupied square that didn't change.
+        """
+        changed = self.changed_squares
+        changed.discard(OFF_BOARD)
+        board = self.board
+        affected = set()
+        for square in changed:
+            for offset in Knight.offsets:
+                piece = board[square + offset]
+                if piece and piece.type.endswith("knight"):
+                    affected.add(piece)
+            for offset in King.offsets:
+                piece = board[square + offset]
+                if piece and piece.type.endswith("king"):
+                    affected.add(piece)
+            # pawns ahead of, diagonally ahead of, two ahead of, or beside it
+            for offset in (10, 20, 9, 11, -10, -20, -9, -11, -1, 1):
+                piece = board[square + offset]
+                if piece and piece.type.endswith("pawn") and \
+                -offset in (piece.direction, 2*piece.direction, piece.direction-1,
+                piece.direction+1, -1, 1):
+                    affected.add(piece)
+            for direction in Queen.directions:
+                between = square + direction
+                while board[between] is None or (between in changed and board[between] is not EDGE):
+                    between += direction
+                piece = board[between]
+                if piece and -direction in getattr(piece, "directions", ()):
+                    affected.add(piece)
+            if board[square]: # and the piece that's there now
+                affected.add(board[square])
+        for piece in affected:
+            piece.generate_moveset()
+        for piece in self.all_pieces:
+            if piece.square == OFF_BOARD and piece.moveset: # captured or promoted
+                piece.moveset = set()
+
+    def attacked(self, square, color):
+        """
+        Returns True if any of a color's pieces attack a square, looking
+        outward from the square for knights, kings, pawns, and sliders.
+        Parameters:
+            square (int): the square that might be attacked
+            color (string): the attacking color, "white" or "black"
+        """
+        board = self.board
+        for offset in Knight.offsets:
+            piece = board[square + offset]
+            if piece and piece.color == color and piece.type.endswith("knight"):
+                return True
+        for offset in King.offsets:
+            piece = board[square + offset]
+            if piece and piece.color == color and piece.type.endswith("king"):
+                return True
+        # an attacking pawn is diagonally behind the square, from its own side
+        behind = 10 if color == "white" else -10
+        for offset in (behind - 1, behind + 1):
+            piece = board[square + offset]
+            if piece and piece.color == color and piece.type.endswith("pawn"):
+                return True
+        for direction in Queen.directions:
+            between = square + direction
+            while board[between] is None:
+                between += direction
+            piece = board[between]
+            if piece and piece.color == color and direction in getattr(piece, "directions", ()):
+                return True
+        return False
+
+    def in_check(self):
+        """
+        Returns True if the player to move is in check.
+        """
+        if self.player is self.white_player:
+            return self.attacked(self.white_king.square, "black")
+        return self.attacked(self.black_king.square, "white")
+
+    def legal_movesets(self, captures=False):
+        """
+        Returns a dictionary of piece:set of squares with the legal moves of
+        each of the player to move's pieces, not counting castles. A piece's
+        moveset is narrowed to the squares that block or capture the piece
+        giving check, if there is one (only the king can move if there are
+        two), and to its pin ray if it's pinned against its king. The king
+        can't move to an attacked square. En passant, which removes a pawn
+        that isn't on the target square, is tested directly.
+        Parameter:
+            captures (boolean): True for only the captures and promotions,
+                from each piece's generate_captures method, without bringing
+                the full movesets up to date
+        """
+        color = self.player.color
+        enemy = "black" if color == "white" else "white"
+        king = self.white_king if color == "white" else self.black_king
+        pieces = [piece for piece in self.all_pieces
+        if piece.color == color and piece.square != OFF_BOARD]
+        if captures:
+            movesets = {piece:piece.generate_captures() for piece in pieces}
+        else:
+            self.generate_all_movesets() # the pseudo-legal movesets
+            movesets = {piece:piece.moveset for piece in pieces}
+        if king.square == OFF_BOARD: # if the king was captured, nothing is safe
+            return {piece:set(movesets[piece]) for piece in pieces}
+        board = self.board
+        home = king.square
+
+        checkers = 0
+        check_mask = None # the squares that answer a check
+        pins = {} # pinned piece:the squares it can stay pinned on
+        for offset in Knight.offsets:
+            piece = board[home + offset]
+            if piece and piece.color == enemy and piece.type.endswith("knight"):
+                checkers += 1
+                check_mask = {piece.square}
+        ahead = -10 if color == "white" else 10
+        for offset in (ahead - 1, ahead + 1):
+            piece = board[home + offset]
+            if piece and piece.color == enemy and piece.type.endswith("pawn"):
+                checkers += 1
+                check_mask = {piece.square}
+        for direction in Queen.directions:
+            ray = [] # the squares from the king to a slider, inclusive
+            pinned = None # an allied piece between them
+            square = home + direction
+            while board[square] is not EDGE:
+                ray.append(square)
+                piece = board[square]
+                if piece:
+                    if piece.color == color:
+                        if pinned: # two allies, so no pin
+                            break
+                        pinned = piece
+                    else:
+                        if direction in getattr(piece, "directions", ()):
+                            if pinned: # it pins the ally against the king
+                                pins[pinned] = set(ray)
+                            else: # it gives check
+                                checkers += 1
+                                check_mask = set(ray)
+                        break
+                square += direction
+
+        moves = {}
+        board[home] = None # lift the king so it can't hide behind itself
+        moves[king] = {square for square in movesets[king] if not self.attacked(square, enemy)}
+        board[home] = king
+        for piece in pieces:
+            if piece is king:
+                continue
+            if checkers > 1: # only the king can move out of double check
+                moves[piece] = set()
+                continue
+            moveset = movesets[piece]
+            passant = set()
+            if piece.type.endswith("pawn"):
+                passant = {square for square in moveset if board[square] is None and
+                square - piece.square in (piece.direction - 1, piece.direction + 1)}
+                moveset = moveset - passant
+            if check_mask is not None:
+                moveset = moveset & check_mask
+            if piece in pins:
+                moveset = moveset & pins[piece]
+            for square in passant: # try it and see if the king is safe
+                captured = square - piece.direction
+                taken = board[captured]
+                board[piece.square], board[captured], board[square] = None, None, piece
+                if not self.attacked(home, enemy):
+                    moveset = moveset | {square}
+                board[piece.square], board[captured], board[square] = piece, taken, None
+            moves[piece] = set(moveset)
+        return moves
+
+    def check_game_over(self):
+        """
+        Checks whether the player to move has any legal moves. If they don't,
+        the game is over: it's won by the other player if they're in check
+        (checkmate), and it's a draw if they aren't (stalemate). Returns the
+        winner: "White", "Black", "Draw", or None if the game continues.
+        """
+        if self.winner: # already over
+            return self.winner
+        if any(self.legal_movesets().values()):
+            return None
+        options = self.castle_options()
+        if self.player is self.white_player and (options[2] or options[3]) or \
+        self.player is self.black_player and (options[0] or options[1]):
+            return None
+        if not self.in_check():
+            self.winner = "Draw" # stalemate
+        elif self.player is self.white_player:
+            self.winner = "Black" # checkmate
+        else:
+            self.winner = "White"
+        return self.winner
+
+    def regenerate_movesets(self):
+        """
+        Generates a moveset for every piece with its generate_moveset method.
+        """
+        self.black_rook_1.generate_moveset()
+        self.black_knight_1.generate_moveset()
+        self.black_bishop_1.generate_moveset()
+        self.black_queen.generate_moveset()
+        self.black_king.generate_moveset()
+        self.black_bishop_2.generate_moveset()
+        self.black_knight_2.generate_moveset()
+        self.black_rook_2.generate_moveset()
+        for l in [self.black_pawns, self.extra_black_bishops, self.extra_black_knights, self.extra_black_queens, self.extra_black_rooks]:
+            for p in l:
+                p.generate_moveset()
+
+        self.white_rook_1.generate_moveset()
+        self.white_knight_1.generate_moveset()
+        self.white_bishop_1.generate_moveset()
+        self.white_queen.generate_moveset()
+        self.white_king.generate_moveset()
+        self.white_bishop_2.generate_moveset()
+        self.white_knight_2.generate_moveset()
+        self.white_rook_2.generate_moveset()
+        for l in [self.white_pawns, self.extra_white_bishops, self.extra_white_knights, self.extra_white_queens, self.extra_white_rooks]:
+            for p in l:
+                p.generate_moveset()
+
+    def side_pieces(self, color):
+        """
+        Returns a set of all of one player's pieces, including any that have
+        been captured and the extra pieces that promotions haven't used yet.
+        Parameter:
+            color (string): "white" or "black"
+        """
+        pieces = {getattr(self, color + name) for name in ("_rook_1", "_knight_1",
+        "_bishop_1", "_queen", "_king", "_bishop_2", "_knight_2", "_rook_2")}
+        pieces |= set(getattr(self, color + "_pawns"))
+        for kind in ("bishops", "knights", "queens", "rooks"):
+            pieces |= set(getattr(self, "extra_" + color + "_" + kind))
+        return pieces
+
+    def easy_move(self):
+        """
+        This does nothing but choose a valid piece and move for the player to
+        move. Returns the chosen Piece and its destination, without carrying
+        out the move.
+        """
+        enemy = "black" if self.player.color == "white" else "white"
+        living_pieces = self.side_pieces(self.player.color) # all AI pieces
+
+        dead_pieces = set() # empty set for invalid AI pieces
+        legal = self.legal_movesets() # moves that don't leave the king in check
+        for piece in living_pieces:
+            # if a piece is dead or has no available moves
+            if piece.square == OFF_BOARD or len(legal[piece]) == 0:
+                dead_pieces.add(piece) # add to this set
+        living_pieces -= dead_pieces # remove this set from the total
+
+        piece_to_move = sample(list(living_pieces), 1)[0] # pick a random piece
+        move = sample(list(legal[piece_to_move]), 1)[0] # and a random move
+
+        enemy_king = getattr(self, enemy + "_king")
+        for piece in living_pieces:
+            if enemy_king.square in legal[piece]: # if the AI win now
+                piece_to_move = piece # use an appropriate piece
+                move = enemy_king.square # and win
+
+        return piece_to_move, move
+
+    def hard_move(self):
+        """
+        Chooses a move for the player to move. Tries to capture valuable
+        pieces. Defends valuable pieces by capturing the threat or by fleeing.
+        Tries to avoid moving the king too much or moving the same piece back
+        and forth repeatedly. Returns the chosen Piece and its destination,
+        without carrying out the move.
+        """
+        color = self.player.color
+        enemy = "black" if color == "white" else "white"
+        living_pieces = self.side_pieces(color) # all AI pieces
+
+        dead_pieces = set() # empty set for invalid AI pieces
+        legal = self.legal_movesets() # moves that don't leave the king in check
+        captures = self.legal_movesets(captures=True) # just the captures
+        for piece in living_pieces:
+            # if a piece is dead or has no available moves
+            if piece.square == OFF_BOARD or len(legal[piece]) == 0:
+                dead_pieces.add(piece) # add to this set
+        living_pieces -= dead_pieces # remove this set from the total
+
+        piece_to_move = sample(list(living_pieces), 1)[0] # pick a random piece
+        move = sample(list(legal[piece_to_move]), 1)[0] # and a random move
+
+        enemy_pieces = self.side_pieces(enemy) # all enemy pieces
+
+        dead_enemies = set() # make an empty set for nonthreatening enemies
+        for piece in enemy_pieces:
+            # if a piece is dead or has no available moves
+            if piece.square == OFF_BOARD or len(piece.moveset) == 0:
+                dead_enemies.add(piece) # consider it dead
+        enemy_pieces -= dead_enemies # remove this set from the total
+
+        enemy_moves = set() # make an empty set for enemy moves
+        for piece in enemy_pieces:
+            enemy_moves |= piece.moveset # add all pieces' moves to this set
+
+        safe_moves = set() # a set for safe moves
+        safe_pieces = set() # a set for safe pieces
+        for piece in living_pieces:
+            # if you start with a piece's moveset and then remove all the
+            # squares where the enemy could move and the piece has some squares
+            # still available, it's safe to move
+            if len(legal[piece] - enemy_moves) > 0:
+                # add those moves to the safe moves
+                safe_moves |= legal[piece] - enemy_moves
+                safe_pieces.add(piece) # add that piece to the safe pieces
+
+        # while the randomly-chosen move isn't safe but there were some
+        # available, or the randomly-chosen piece is the king and the RNG
+        # puts a stop to it
+        while (move not in safe_moves and len(safe_moves) > 5) or \
+        (piece_to_move is getattr(self, color + "_king") and randint(0,9) in range(9)):
+            try: # try to sample that set
+                piece_to_move = sample(list(safe_pieces), 1)[0] # pick another piece
+                # and another move
+                move = sample(list(legal[piece_to_move] & safe_moves), 1)[0]
+            except: # if there are no safe pieces, it'll just use a living piece
+                piece_to_move = sample(list(living_pieces), 1)[0] # pick a random piece
+                move = sample(list(legal[piece_to_move]), 1)[0] # and a random move
+
+        # make a set of pairs of pieces for comparison
+        piece_pairs = [(getattr(self, color + name), getattr(self, enemy + name))
+        for name in ("_knight_1", "_knight_2", "_bishop_1", "_bishop_2",
+        "_rook_1", "_rook_2", "_queen", "_king")]
+        
+        for pair in piece_pairs:
+            decision = self.piece_priority(living_pieces, safe_moves, enemy_pieces,
+            enemy_moves, pair[0], pair[1], legal, captures)
+            if decision[0]: # if there's a capture or escape
+                # if there's a capture or the current plan is to escape with a
+                # lower-priority piece or the moving piece isn't a knight
+                if decision[1] or self.board[move] is None or \
+                piece_to_move.type != pair[0].type:
+                    piece_to_move = decision[2] # use the returned piece
+                    move = decision[3] # and use the returned move
+
+        return piece_to_move, move
+
+    def piece_priority(self, living_pieces, safe_moves, enemy_pieces,
+    enemy_moves, check_ally, check_enemy, legal, captures):
+        """
+        Determines which move is the most important. Tries to capture first. If
+        there's nothing to capture, avoids being captured if necessary. If a
+        piece is in danger but it may be safely rescued by capturing an enemy
+        piece (even if it's a less-valuable piece), it uses that strategy.
+        """
+        for piece in living_pieces:
+            if check_enemy.square in captures[piece]: # if AI can capture
+                return [True, True, piece, check_enemy.square] # do so
+
+        if check_ally.square in enemy_moves: # if AI piece is threatened
+            for enemy in enemy_pieces: # look at enemy pieces
+                if enemy.square in safe_moves: # if enemy can be captured
+                    for piece in living_pieces: # look at available pieces
+                        # find one that can capture the enemy
+                        if enemy.square in captures[piece]:
+                            return[True, True, piece, enemy.square] # do so
+            for loc in legal[check_ally]: # look at the piece's legal moves
+                if loc not in enemy_moves: # if a move is safe
+                    # if the AI is considering moving right back where it came
+                    # from and there's other stuff it could do,
+                    if ((check_ally is self.last_ai_piece and loc == \
+                    self.last_source) and len(legal[check_ally]) > 1):
+                        continue # pick a different target
+                    return [True, False, check_ally, loc] # successful escape
+
+        return [False, False] # no capture or escape
+
+    def move(self, chosen_piece, destination, promotion=''):
+        """
+        Carries out a player's move (human or computer), with win logic.
+        Returns True if a pawn was promoted with the player's preset promotion,
+        which is then added to the last move in the movelist.
+        Parameters:
+            chosen_piece (Piece): the Piece that the player (human or AI) is
+                moving
+            destination (int): the destination square
+            promotion (string): '1', '2', '3', or '4' for a promotion from a
+                replay, or empty to use the player's preset promotion
+        """
+        promoted = False # no preset promotion used yet
+        undo = Undo(self) # remember how to take this move back
+        undo.moves.append((chosen_piece, chosen_piece.square, getattr(chosen_piece, "moved", None)))
+        # take the castling rights, en passant, and the moving piece out of the
+        # hash, to be put back in once the move is done
+        self.hash ^= self.castling_key() ^ self.en_passant_key() ^ \
+        PIECE_KEYS[chosen_piece.type][chosen_piece.square]
+        self.rescore(chosen_piece.type, chosen_piece.square, -1) # and out of the score
+        # if there was a piece moved previously
+        self.last_source = chosen_piece.square # this piece is the last source
+        self.last_target = destination # its destination is the last target
+        self.safe_pawns() # all pawns are safe from en passant
+        # piece on the target square
+        target_piece = self.board[destination]
+        # chosen piece's original square
+        original_square = chosen_piece.square
+        if hasattr(chosen_piece, "moved"): # if this piece has a 'moved' attr
+            chosen_piece.moved = True # this piece has moved
+        if "pawn" in chosen_piece.type: # if this piece is a pawn
+            # and it was allowed to move 2 squares
+            if destination - chosen_piece.square in (-20,20):
+                chosen_piece.vulnerable = True # it's vulnerable
+            # the piece on the square behind the pawn
+            behind = self.board[destination - chosen_piece.direction]
+            if behind: # if there's actually a piece there
+                if "pawn" in behind.type: # and it's a pawn
+                    if behind.vulnerable: # and it was vulnerable
+                        undo.captured.append((behind, behind.square))
+                        self.hash ^= PIECE_KEYS[behind.type][behind.square]
+                        self.rescore(behind.type, behind.square, -1)
+                        behind.square = OFF_BOARD # that pawn is captured
+                        # and the square is now empty
+                        self.board[destination - chosen_piece.direction] = None
+                        self.changed_squares.add(destination - chosen_piece.direction)
+            # if the pawn got to the top row or the bottom row
+            if self.board[destination + chosen_piece.direction] is EDGE:
+                if chosen_piece.color == "white":
+                    extras = [None, self.extra_white_queens, self.extra_white_rooks, self.extra_white_bishops, self.extra_white_knights]
+                    preset = self.white_promo
+                else:
+                    extras = [None, self.extra_black_queens, self.extra_black_rooks, self.extra_black_bishops, self.extra_black_knights]
+                    preset = self.black_promo
+                if not promotion: # manual move
+                    promotion = preset # use preset character
+                    self.movelist[-1] += promotion # add this char to the saved move
+                    promoted = True
+                extra = extras[int(promotion)] # use the proper set of pieces from the list
+                chosen_piece.square = OFF_BOARD # the pawn gets sort of 'captured'
+                # if there was an enemy on that square
+                if target_piece is not None:
+                    undo.captured.append((target_piece, destination))
+                    self.hash ^= PIECE_KEYS[target_piece.type][destination]
+                    self.rescore(target_piece.type, destination, -1)
+                    target_piece.square = OFF_BOARD # it's captured
+                # and the former pawn becomes the next extra queen
+                for p in extra:
+                    if p.square == OFF_BOARD:
+                        target_piece = self.board[destination] = p
+                        break
+                target_piece.square = destination # located at the destination
+                chosen_piece = undo.promoted = target_piece # chosen piece set to target
+        if target_piece is not None: # if there was a piece on the target square
+            # if it really was a capture and not a promotion
+            if target_piece.color != chosen_piece.color:
+                undo.captured.append((target_piece, destination))
+                self.hash ^= PIECE_KEYS[target_piece.type][destination]
+                self.rescore(target_piece.type, destination, -1)
+                target_piece.square = OFF_BOARD # the target piece is captured
+            if self.black_king.square == OFF_BOARD: # if it was the black king
+                self.winner = "White" # white wins
+            if self.white_king.square == OFF_BOARD: # if it was the white king
+                self.winner = "Black" # black wins
+
+        self.board[destination] = target_piece \
+        = chosen_piece # put chosen piece into target and destination pieces
+        # original square is now empty
+        self.board[original_square] = None
+        self.changed_squares.update((original_square, destination))
+        # set the chosen piece's square to the destination
+        chosen_piece.square = destination
+        if self.player is self.white_player: # if it was white's turn
+            self.player = self.black_player # now it's black's
+        else: # if it was black's turn
+            self.player = self.white_player # now it's white's
+        # put the moved (or promoted) piece, the turn, castling rights, and en
+        # passant into the hash
+        self.hash ^= PIECE_KEYS[chosen_piece.type][destination] ^ BLACK_TO_MOVE ^ \
+        self.castling_key() ^ self.en_passant_key()
+        self.rescore(chosen_piece.type, destination, 1) # and into the score
+        self.undo_stack.append(undo)
+        if self.check_score:
+            self.verify_score()
+        return promoted
+
+    def safe_pawns(self):
+        """
+        When a player starts their turn, all of their pieces start out as not
+        vulnerable.
+        """
+        if self.player.color == "white": # if it's white's turn
+            # make all their pawns safe
+            for p in self.white_pawns:
+                if p.vulnerable: # its neighbors can't capture it en passant now
+                    self.changed_squares.add(p.square)
+                p.vulnerable = False
+        else: # if it's black's turn
+            # make all their pawns safe
+            for p in self.black_pawns:
+                if p.vulnerable: # its neighbors can't capture it en passant now
+                    self.changed_squares.add(p.square)
+                p.vulnerable = False
+
+    def castle_black_left(self):
+        """
+        Castles at black queenside.
+        """
+        undo = Undo(self) # remember how to take this move back
+        undo.moves = [(self.black_king, self.black_king.square, self.black_king.moved),
+        (self.black_rook_1, self.black_rook_1.square, self.black_rook_1.moved)]
+        self.hash ^= self.castling_key() ^ self.en_passant_key() ^ CASTLE_KEYS["bl"]
+        self.middlegame += CASTLE_SCORES["bl"][0] # the king and rook's new squares
+        self.endgame += CASTLE_SCORES["bl"][1]
+        self.safe_pawns() # sets the current player's pawns to safe
+        # give each square its proper piece
+        self.board[SQUARE["00"]] = None
+        self.board[SQUARE["20"]] = self.black_king
+        self.board[SQUARE["30"]] = self.black_rook_1
+        self.board[SQUARE["40"]] = None
+        self.changed_squares.update(SQUARE[location] for location in ("00", "20", "30", "40"))
+        # give its piece its proper location and status
+        self.black_king.square = SQUARE["20"]
+        self.black_king.moved = True
+        self.black_rook_1.square = SQUARE["30"]
+        self.black_rook_1.moved = True
+        self.player = self.white_player # other player's turn
+        self.hash ^= self.castling_key() ^ self.en_passant_key()
+        self.undo_stack.append(undo)
+        if self.check_score:
+            self.verify_score()
+
+    def castle_black_right(self):
+        """
+        Castles at black kingside.
+        """
+        undo = Undo(self) # remember how to take this move back
+        undo.moves = [(self.black_king, self.black_king.square, self.black_king.moved),
+        (self.black_rook_2, self.black_rook_2.square, self.black_rook_2.moved)]
+        self.hash ^= self.castling_key() ^ self.en_passant_key() ^ CASTLE_KEYS["br"]
+        self.middlegame += CASTLE_SCORES["br"][0] # the king and rook's new squares
+        self.endgame += CASTLE_SCORES["br"][1]
+        self.safe_pawns() # sets the current player's pawns to safe
+        # give each square its proper piece
+        self.board[SQUARE["40"]] = None
+        self.board[SQUARE["50"]] = self.black_rook_2
+        self.board[SQUARE["60"]] = self.black_king
+        self.board[SQUARE["70"]] = None
+        self.changed_squares.update(SQUARE[location] for location in ("40", "50", "60", "70"))
+        # give its piece its proper location and status
+        self.black_rook_2.square = SQUARE["50"]
+        self.black_rook_2.moved = True
+        self.black_king.square = SQUARE["60"]
+        self.black_king.moved = True
+        self.player = self.white_player # other player's turn
+        self.hash ^= self.castling_key() ^ self.en_passant_key()
+        self.undo_stack.append(undo)
+        if self.check_score:
+            self.verify_score()
+
+    def castle_white_left(self):
+        """
+        Castles at white queenside.
+        """
+        undo = Undo(self) # remember how to take this move back
+        undo.moves = [(self.white_king, self.white_king.square, self.white_king.moved),
+        (self.white_rook_1, self.white_rook_1.square, self.white_rook_1.moved)]
+        self.hash ^= self.castling_key() ^ self.en_passant_key() ^ CASTLE_KEYS["wl"]
+        self.middlegame += CASTLE_SCORES["wl"][0] # the king and rook's new squares
+        self.endgame += CASTLE_SCORES["wl"][1]
+        self.safe_pawns() # sets the current player's pawns to safe
+        # give each square its proper piece
+        self.board[SQUARE["07"]] = None
+        self.board[SQUARE["27"]] = self.white_king
+        self.board[SQUARE["37"]] = self.white_rook_1
+        self.board[SQUARE["47"]] = None
+        self.changed_squares.update(SQUARE[location] for location in ("07", "27", "37", "47"))
+        # give its piece its proper location and status
+        self.white_king.square = SQUARE["27"]
+        self.white_king.moved = True
+        self.white_rook_1.square = SQUARE["37"]
+        self.white_rook_1.moved = True
+        self.player = self.black_player # other player's turn
+        self.hash ^= self.castling_key() ^ self.en_passant_key()
+        self.undo_stack.append(undo)
+        if self.check_score:
+            self.verify_score()
+
+    def castle_white_right(self):
+        """
+        Castles at white kingside.
+        """
+        undo = Undo(self) # remember how to take this move back
+        undo.moves = [(self.white_king, self.white_king.square, self.white_king.moved),
+        (self.white_rook_2, self.white_rook_2.square, self.white_rook_2.moved)]
+        self.hash ^= self.castling_key() ^ self.en_passant_key() ^ CASTLE_KEYS["wr"]
+        self.middlegame += CASTLE_SCORES["wr"][0] # the king and rook's new squares
+        self.endgame += CASTLE_SCORES["wr"][1]
+        self.safe_pawns() # sets the current player's pawns to safe
+        # give each square its proper piece
+        self.board[SQUARE["47"]] = None
+        self.board[SQUARE["57"]] = self.white_rook_2
+        self.board[SQUARE["67"]] = self.white_king
+        self.board[SQUARE["77"]] = None
+        self.changed_squares.update(SQUARE[location] for location in ("47", "57", "67", "77"))
+        # give its piece its proper location and status
+        self.white_rook_2.square = SQUARE["57"]
+        self.white_rook_2.moved = True
+        self.white_king.square = SQUARE["67"]
+        self.white_king.moved = True
+        self.player = self.black_player # other player's turn
+        self.hash ^= self.castling_key() ^ self.en_passant_key()
+        self.undo_stack.append(undo)
+        if self.check_score:
+            self.verify_score()
@@ -0,0 +1,151 @@
+#-------------------------------------------------------------------------------
+# Name:        Ordering
+# Purpose:     Hand the search its moves best-first - the hash move, then
+#              captures, then killer moves, then the rest by history - one
+#              stage at a time, so that a cutoff early on saves generating
+#              the later stages at all.
+#-------------------------------------------------------------------------------
+
+try:
+    from gamestate import SQUARE
+except:
+    print("The GameState module is not available. Please add it to the working folder and try again.")
+
+# piece ranks for MVV-LVA, by the second half of a piece's type
+RANKS = {"pawn":1, "knight":2, "bishop":3, "rook":4, "queen":5, "king":6}
+PROMOTIONS = {'1':"queen", '2':"rook", '3':"bishop", '4':"knight"}
+MAX_PLY = 128 # the deepest ply that gets killer moves
+
+def mvv_lva(state, move):
+    """
+    Returns a sort key for a capture or promotion: the most valuable victim
+    first and, among captures of the same victim, the least valuable
+    attacker first. A promotion counts as capturing the piece it becomes.
+    Parameters:
+        state (GameState): the position before the move
+        move (string): a move like "3423" or "16071"
+    """
+    board = state.board
+    attacker = board[SQUARE[move[:2]]]
+    victim = board[SQUARE[move[2:4]]]
+    if victim:
+        score = 8 * RANKS[victim.type.partition('_')[2]]
+    elif move[0] != move[2]: # a pawn moving sideways onto an empty square
+        score = 8 * RANKS["pawn"] # en passant
+    else:
+        score = 0
+    if move[4:]:
+        score += 8 * RANKS[PROMOTIONS[move[4]]]
+    return score - RANKS[attacker.type.partition('_')[2]]
+
+def is_quiet(state, move):
+    """
+    Returns True if a move neither captures nor promotes.
+    Parameters:
+        state (GameState): the position before the move
+        move (string): a move like "4644" or "wl"
+    """
+    if move in ("bl", "br", "wl", "wr"):
+        return True
+    return not move[4:] and state.board[SQUARE[move[2:4]]] is None and \
+    (move[0] == move[2] or "pawn" not in state.board[SQUARE[move[:2]]].type)
+
+class MoveOrder(object):
+    """
+    An object of this class orders moves for a search, learning from the
+    cutoffs it's told about.
+    Attributes:
+        killers (list): for each ply, the last two quiet moves that caused a
+            cutoff there, newest first
+        history (dictionary): move:score for quiet moves, raised each time
+            the move causes a cutoff, by more for deeper searches
+    """
+    def __init__(self):
+        self.killers = [[None, None] for ply in range(MAX_PLY)]
+        self.history = {}
+
+    def new_search(self):
+        """
+        Forgets the killer moves, which belong to the old search's plies, and
+        halves the history scores, so that old results count for less.
+        """
+        self.killers = [[None, None] for ply in range(MAX_PLY)]
+        self.history = {move:score//2 for move, score in self.history.items() if score > 1}
+
+    def moves(self, state, hash_move=None, ply=0):
+        """
+        Yields the legal moves of the player to move in stages: the hash move,
+        the captures and promotions by MVV-LVA, this ply's killer moves, and
+        then the other quiet moves by history score. Each stage is only
+        generated once the moves before it have been searched, and no move is
+        yielded twice.
+        Parameters:
+            state (GameState): the position to move from, which must be the
+                same each time the generator resumes
+            hash_move (string): the best move from the transposition table,
+                or None
+            ply (int): the distance from the root
+        """
+        tried = set()
+        if hash_move and self.playable(state, hash_move):
+            tried.add(hash_move)
+            yield hash_move
+        captures = state.legal_moves(captures=True)
+        captures.sort(key=lambda move: mvv_lva(state, move), reverse=True)
+        for move in captures:
+            if move not in tried:
+                tried.add(move)
+                yield move
+        quiets = [move for move in state.legal_moves() if move not in tried]
+        if ply < MAX_PLY:
+            for killer in self.killers[ply]:
+                if killer in quiets:
+                    quiets.remove(killer)
+                    yield killer
+        history = self.history
+        quiets.sort(key=lambda move: history.get(move, 0), reverse=True)
+        yield from quiets
+
+    def playable(self, state, move):
+        """
+        Returns True if a hash move can be made in the position. The table
+        only gives back moves for the same hash, so this only guards against
+        two positions sharing a hash.
+        Parameters:
+            state (GameState): the position to move from
+            move (string): the move from the table
+        """
+        if move in ("bl", "br", "wl", "wr"):
+            return state.castle_options()[("bl", "br", "wl", "wr").index(move)]
+        piece = state.board[SQUARE[move[:2]]]
+        target = state.board[SQUARE[move[2:4]]]
+        return bool(piece) and piece.color == state.player.color and \
+        not (target and target.color == piece.color)
+
+    def is_killer(self, move, ply):
+        """
+        Returns True if a move is one of the killer moves for a ply.
+        Parameters:
+            move (string): the move
+            ply (int): the distance from the root
+        """
+        return ply < MAX_PLY and move in self.killers[ply]
+
+    def cutoff(self, state, move, depth, ply):
+        """
+        Records that a move caused a beta cutoff. A quiet move becomes a
+        killer for its ply and gains history, so that it's tried early in
+        sibling positions.
+        Parameters:
+            state (GameState): the position the move was made from
+            move (string): the move
+            depth (int): the remaining depth when the move was searched
+            ply (int): the distance from the root
+        """
+        if not is_quiet(state, move):
+            return # captures are already tried early
+        if ply < MAX_PLY:
+            killers = self.killers[ply]
+            if killers[0] != move:
+                killers[1], killers[0] = killers[0], move
+        self.history[move] = self.history.get(move, 0) + depth * depth
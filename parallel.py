@@ -0,0 +1,265 @@
+#-------------------------------------------------------------------------------
+# Name:        Parallel
+# Purpose:     Search with several processes at once (Lazy SMP): helper
+#              processes search the same position as the main search and
+#              share one transposition table with it, so that each finds the
+#              others' results and the main search reaches deeper in the same
+#              time.
+#-------------------------------------------------------------------------------
+
+import multiprocessing
+import pickle
+import queue
+import time
+from multiprocessing import shared_memory
+try:
+    from transposition import TranspositionTable
+except:
+    print("The Transposition module is not available. Please add it to the working folder and try again.")
+try:
+    from search import Engine
+    from ordering import MoveOrder
+except:
+    print("The Search module is not available. Please add it to the working folder and try again.")
+try:
+    from tablebase import Tablebases
+except:
+    print("The Tablebase module is not available. Please add it to the working folder and try again.")
+
+COLLECT_TIMEOUT = 10 # seconds to wait for a helper to report once halted
+
+class SharedTable(TranspositionTable):
+    """
+    An object of this class is a transposition table kept in shared memory,
+    so that every process of a parallel search reads and writes the same
+    entries. The process that creates the table owns the memory, and the
+    others attach to it by name. Entries need no locking, since the table
+    already treats a half-written entry as a miss. The current age is kept
+    in the shared memory too, after the entries, so that the helpers store
+    results as part of the main search's search.
+    Attributes:
+        name (string): the shared memory's name, for attaching to it
+        owner (boolean): True in the process that created the memory
+        memory (SharedMemory): the shared memory, or None once closed
+        views (list): the entries, data, and age, as views of the memory
+    """
+    def __init__(self, megabytes=16, name=None):
+        self.name = name
+        self.owner = name is None
+        self.memory = None
+        self.views = []
+        TranspositionTable.__init__(self, megabytes)
+
+    def clear(self):
+        """
+        Empties the table. The owner creates new memory of the current size,
+        which starts out zeroed, and the helpers pick up its new name with
+        their next search. Any other process just attaches to the memory.
+        """
+        if self.owner:
+            self.close()
+            self.memory = shared_memory.SharedMemory(create=True, size=(2 * self.size + 1) * 8)
+            self.name = self.memory.name
+        elif self.memory is None:
+            self.memory = shared_memory.SharedMemory(self.name)
+        entries = self.memory.buf.cast('Q')
+        self.keys = entries[:self.size]
+        self.data = entries[self.size:2 * self.size]
+        self.ages = entries[2 * self.size:]
+        self.views = [self.keys, self.data, self.ages, entries]
+        self.age = self.ages[0]
+        self.probes = 0
+        self.hits = 0
+
+    def new_search(self):
+        """
+        Starts a new search. Only the owner moves the age on; the other
+        processes join the search it started.
+        """
+        if self.owner:
+            TranspositionTable.new_search(self)
+            self.ages[0] = self.age
+        else:
+            self.age = self.ages[0]
+
+    def close(self):
+        """
+        Lets go of the shared memory, and frees it if this process owns it.
+        """
+        for view in self.views:
+            view.release()
+        self.views = []
+        if self.memory is not None:
+            self.memory.close()
+            if self.owner:
+                self.memory.unlink()
+            self.memory = None
+
+def run_helper(tasks, results, halt):
+    """
+    The main loop of a helper process. Searches each position it's sent
+    until the search is halted or reaches its depth, filling the shared
+    table as it goes, and sends back what it found. Stops when sent None.
+    Parameters:
+        tasks (Queue): (search, position, table name, megabytes, start depth,
+            max depth, tablebase folder, evaluation function) tuples, where
+            the position is a pickled GameState and the folder is None
+            without tablebases
+        results (Queue): where to put a (search, depth, score, best move, PV,
+            nodes) tuple for each task
+        halt (Event): set by the main search when it's done
+    """
+    table = None
+    tablebases = None
+    order = MoveOrder() # killers and history carry over between moves
+    pawn_table = None # and so do pawn structures
+    while True:
+        task = tasks.get()
+        if task is None:
+            break
+        search, position, name, megabytes, start_depth, max_depth, folder, evaluate = task
+        if table is None or table.name != name: # the owner has resized it
+            if table is not None:
+                table.close()
+            table = SharedTable(megabytes, name)
+        if tablebases is not None and tablebases.folder != folder:
+            tablebases.close()
+            tablebases = None
+        if tablebases is None and folder is not None:
+            tablebases = Tablebases(folder)
+        state = pickle.loads(position)
+        state.table, state.hash_megabytes = table, megabytes
+        state.pawn_table = pawn_table
+        engine = Engine(state, max_depth=max_depth, max_time=None)
+        engine.order = order
+        engine.abort = halt
+        engine.start_depth = start_depth
+        engine.tablebases = tablebases
+        engine.evaluate = evaluate
+        engine.search()
+        pawn_table = state.pawn_table
+        results.put((search, engine.depth, engine.score, engine.best_move, engine.pv, engine.nodes))
+    if table is not None:
+        table.close()
+    if tablebases is not None:
+        tablebases.close()
+
+class ParallelEngine(Engine):
+    """
+    An object of this class searches like an Engine, with helper processes
+    searching alongside it through a shared transposition table. Every other
+    helper starts a ply deeper than the main search, so that they tend to
+    work ahead of it rather than repeat it. The main search keeps to the
+    limits and reports as usual, and halts the helpers when it stops; if a
+    helper finished a deeper iteration, its move is played instead.
+    Attributes:
+        threads (int): the processes searching, counting this one
+        helpers (list): the helper processes, started with the first search
+        tasks (list): a queue of positions for each helper
+        results (Queue): where the helpers send back what they found
+        halt (Event): set to halt the helpers
+        searches (int): the searches so far, to tell a late result from a
+            helper apart from one for the current search
+    """
+    def __init__(self, state, threads=2, max_depth=64, max_nodes=None, max_time=3.0):
+        Engine.__init__(self, state, max_depth, max_nodes, max_time)
+        # share the table from the start, so that copies of the game made to
+        # search on another thread share it too
+        if not isinstance(state.table, SharedTable):
+            state.table = SharedTable(state.hash_megabytes)
+        self.threads = threads
+        self.helpers = []
+        self.tasks = []
+        self.results = None
+        self.halt = None
+        self.searches = 0
+
+    def start_helpers(self):
+        """
+        Starts the helper processes, if they aren't running already. They're
+        spawned rather than forked, which works the same on every platform
+        and doesn't copy the window into each helper.
+        """
+        if self.helpers:
+            return
+        context = multiprocessing.get_context("spawn")
+        self.results = context.Queue()
+        self.halt = context.Event()
+        for index in range(self.threads - 1):
+            tasks = context.Queue()
+            helper = context.Process(target=run_helper, args=(tasks, self.results, self.halt), daemon=True)
+            helper.start()
+            self.tasks.append(tasks)
+            self.helpers.append(helper)
+
+    def prepare(self):
+        """
+        Gets ready for a new search, moving the transposition table into
+        shared memory if it isn't there yet, and sends the position to the
+        helpers.
+        """
+        state = self.state
+        if not isinstance(state.table, SharedTable):
+            state.table = SharedTable(state.hash_megabytes)
+        Engine.prepare(self)
+        self.start_helpers()
+        self.halt.clear()
+        self.searches += 1
+        # the table can't be pickled, and the helpers attach to it by name;
+        # they keep pawn tables of their own
+        table, state.table = state.table, None
+        pawn_table, state.pawn_table = state.pawn_table, None
+        try:
+            position = pickle.dumps(state)
+        finally:
+            state.table = table
+            state.pawn_table = pawn_table
+        for index, tasks in enumerate(self.tasks):
+            tasks.put((self.searches, position, table.name, table.megabytes,
+            1 + (index + 1) % 2, self.max_depth, self.tablebases and self.tablebases.folder,
+            self.evaluate))
+
+    def search(self):
+        """
+        Searches the position until a limit is reached, then halts the
+        helpers, and returns the best move from the deepest iteration any
+        process finished. The nodes searched by every process are counted.
+        """
+        try:
+            Engine.search(self)
+        finally:
+            self.halt.set()
+        # every helper reports once for each search it's sent, so read until
+        # they all have for this one, passing over any left from earlier ones
+        reported = 0
+        deadline = time.monotonic() + COLLECT_TIMEOUT
+        while reported < len(self.tasks):
+            try:
+                result = self.results.get(timeout=max(0, deadline - time.monotonic()))
+            except queue.Empty: # a helper has stopped answering
+                break
+            search, depth, score, best_move, pv, nodes = result
+            if search != self.searches: # left over from a search that timed out
+                continue
+            reported += 1
+            self.nodes += nodes
+            if depth > self.depth and best_move:
+                self.depth, self.score, self.best_move, self.pv = depth, score, best_move, pv
+        return self.best_move
+
+    def close(self):
+        """
+        Stops the helper processes and frees the shared table.
+        """
+        if self.halt is not None:
+            self.halt.set()
+        for tasks in self.tasks:
+            tasks.put(None)
+        for helper in self.helpers:
+            helper.join(COLLECT_TIMEOUT)
+            if helper.is_alive():
+                helper.terminate()
+        self.helpers, self.tasks = [], []
+        if isinstance(self.state.table, SharedTable):
+            self.state.table.close()
+            self.state.table = None
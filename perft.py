@@ -0,0 +1,165 @@
+#-------------------------------------------------------------------------------
+# Name:        Perft
+# Purpose:     Count the positions reachable in a given number of moves, to
+#              check the move generator against known results and to measure
+#              how fast it is, with no user interface.
+#
+#              Usage: python perft.py [*depth N] [*position name | *fen FEN]
+#                                     [*divide on] [*movegen bitboard]
+#                                     [*checkscore on]
+#              With no position or FEN, runs every standard position.
+#-------------------------------------------------------------------------------
+
+import sys
+import time
+try:
+    from gamestate import GameState
+except:
+    print("The GameState module is not available. Please add it to the working folder and try again.")
+
+# standard perft positions and their known node counts from depth 1 onward
+POSITIONS = {
+"start":("rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1",
+[20, 400, 8902, 197281, 4865609]),
+"kiwipete":("r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1",
+[48, 2039, 97862, 4085603]),
+"endgame":("8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1",
+[14, 191, 2812, 43238, 674624]),
+"promotions":("r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1",
+[6, 264, 9467, 422333]),
+"middlegame":("rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8",
+[44, 1486, 62379, 2103487]),
+"symmetrical":("r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w - - 0 10",
+[46, 2079, 89890, 3894594]),
+}
+
+# castles as the king's move, which is how other programs list them
+CASTLES = {"bl":"e8c8", "br":"e8g8", "wl":"e1c1", "wr":"e1g1"}
+
+def algebraic(move):
+    """
+    Returns a move from the movelist in long algebraic notation, like "e2e4"
+    for "4644", "b7a8q" for "10001", or "e1g1" for "wr".
+    Parameter:
+        move (string): a move in the movelist's format
+    """
+    if move in CASTLES:
+        return CASTLES[move]
+    return ''.join("abcdefgh"[int(move[i])] + str(8 - int(move[i+1])) for i in (0, 2)) + \
+    {'':'', '1':'q', '2':'r', '3':'b', '4':'n'}[move[4:]]
+
+def perft(state, depth):
+    """
+    Returns the number of positions reachable from the game's current
+    position in the given number of moves. The game is left as it was.
+    Parameters:
+        state (GameState): the game to count from
+        depth (int): the number of moves
+    """
+    if depth == 0:
+        return 1
+    moves = state.legal_moves()
+    if depth == 1: # count the last moves without making them
+        return len(moves)
+    nodes = 0
+    for move in moves:
+        state.make_move(move)
+        nodes += perft(state, depth - 1)
+        state.unmake_move()
+    return nodes
+
+def divide(state, depth):
+    """
+    Returns a list of (move, nodes) pairs: each legal move from the current
+    position, with the perft count below it. Comparing this with another
+    program's output narrows a wrong total down to the move responsible.
+    Parameters:
+        state (GameState): the game to count from
+        depth (int): the number of moves, including the first
+    """
+    results = []
+    for move in state.legal_moves():
+        state.make_move(move)
+        results.append((move, perft(state, depth - 1)))
+        state.unmake_move()
+    return results
+
+def run(fen, depth, expected=(), show_divide=False, backend="mailbox", check_score=False):
+    """
+    Prints the perft count for each depth from 1 up to the given depth, with
+    the time taken and nodes per second, checking each count against the
+    expected ones. Returns True if every count was as expected.
+    Parameters:
+        fen (string): the position to count from
+        depth (int): the deepest depth to count
+        expected (list): the known counts from depth 1, if any
+        show_divide (boolean): True to print each root move's count at the
+            deepest depth
+        backend (string): GameState's move generator, "mailbox" or "bitboard"
+        check_score (boolean): True to check the incremental score against
+            one computed from scratch after every move
+    """
+    state = GameState(backend)
+    state.load_fen(fen)
+    state.check_score = check_score
+    passed = True
+    results = [] # the divide counts, if asked for
+    for d in range(1, depth + 1):
+        start = time.perf_counter()
+        if show_divide and d == depth:
+            results = divide(state, d)
+            nodes = sum(count for move, count in results)
+        else:
+            nodes = perft(state, d)
+        elapsed = time.perf_counter() - start
+        line = "  depth {}: {:>10} nodes {:>8.2f}s {:>10.0f} nps".format(d, nodes,
+        elapsed, nodes / elapsed if elapsed else 0)
+        if d <= len(expected):
+            if nodes == expected[d-1]:
+                line += "  ok"
+            else:
+                line += "  FAILED, expected {}".format(expected[d-1])
+                passed = False
+        print(line)
+    if show_divide:
+        for move, count in sorted(results, key=lambda result: algebraic(result[0])):
+            print("    {}: {}".format(algebraic(move), count))
+    return passed
+
+def main():
+    # look for argv options the same way the game does, but keep the case of
+    # the values, since FEN is case-sensitive
+    argvs = {pair.partition(' ')[0].lower():pair.partition(' ')[2].strip()
+    for pair in (' '.join(sys.argv)).split(' *')[1:]}
+    # switches:
+    # *depth int
+    # *position name
+    # *fen string
+    # *divide on off
+    # *movegen mailbox bitboard
+    # *checkscore on off
+    depth = int(argvs.get('depth', 3))
+    show_divide = argvs.get('divide') == "on"
+    backend = argvs.get('movegen', "mailbox")
+    check_score = argvs.get('checkscore') == "on"
+    if depth < 1:
+        print("The depth must be at least 1.")
+        sys.exit(2)
+    if argvs.get('fen'):
+        positions = [("fen", argvs['fen'], [])]
+    elif argvs.get('position'):
+        name = argvs['position'].lower()
+        if name not in POSITIONS:
+            print("Unknown position " + argvs['position'] + ". Choose from: " + ', '.join(POSITIONS))
+            sys.exit(2)
+        positions = [(name,) + POSITIONS[name]]
+    else:
+        positions = [(name,) + POSITIONS[name] for name in POSITIONS]
+    passed = True
+    for name, fen, expected in positions:
+        print(name + ": " + fen)
+        passed = run(fen, depth, expected, show_divide, backend, check_score) and passed
+    sys.exit(0 if passed else 1)
+
+if __name__ == '__main__':
+    main()
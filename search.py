@@ -0,0 +1,623 @@
+#-------------------------------------------------------------------------------
+# Name:        Search
+# Purpose:     Choose moves for the computer opponent by searching the game
+#              tree with alpha-beta negamax and iterative deepening, within a
+#              budget of depth, nodes, and time.
+#-------------------------------------------------------------------------------
+
+import time
+try:
+    from transposition import EXACT, LOWER, UPPER, PawnTable
+except:
+    EXACT, LOWER, UPPER = 1, 2, 3 # the engine will search without a table
+    PawnTable = None # and score without the pawn structure
+try:
+    from ordering import MoveOrder, mvv_lva, is_quiet, MAX_PLY
+except:
+    print("The Ordering module is not available. Please add it to the working folder and try again.")
+try:
+    from evaluation import MAX_PHASE, pawn_structure
+except:
+    MAX_PHASE = 24 # the game phase with every piece on the board
+    pawn_structure = None
+
+MATE = 30000 # the score for giving checkmate now; mate in n scores less
+INFINITY = 32000
+MAX_PV = 12 # the longest line to read out of the tablebases
+
+# time management
+MOVES_TO_GO = 40 # how many more moves to budget for early in the game
+MIN_MOVES_TO_GO = 15 # and at least this many, however long the game has gone
+MOVE_OVERHEAD = 0.2 # seconds kept back for making the move and redrawing
+MIN_TIME = 0.05 # the least time to think, even when the clock is nearly out
+
+# selective pruning
+NULL_REDUCTION = 2 # plies skipped by the null-move search, plus one when deep
+NULL_MIN_DEPTH = 3 # the shallowest depth to try a null move at
+LMR_MOVES = 3 # moves searched at full depth before reductions start
+LMR_MIN_DEPTH = 3 # the shallowest depth to reduce at
+FUTILITY_MARGINS = (0, 200, 500) # by remaining depth: how far below alpha to give up
+
+# aspiration windows
+ASPIRATION_DEPTH = 3 # the first iteration to search with a narrow window
+ASPIRATION_WINDOW = 50 # how far either side of the last score, widened on failure
+
+# castles, as the king's source and destination locations
+CASTLES = {"bl":("40", "20"), "br":("40", "60"), "wl":("47", "27"), "wr":("47", "67")}
+CASTLE_CODES = {}
+
+def pack_move(move):
+    """
+    Returns a move from the movelist packed into 15 bits, for the
+    transposition table: the source and destination squares (0-63) and the
+    promotion (0 for none). Castles are packed as the king's move. 0 is never
+    a move.
+    Parameter:
+        move (string): a move like "4644", "10001", or "wr"
+    """
+    if move in CASTLES:
+        source, destination = CASTLES[move]
+    else:
+        source, destination = move[:2], move[2:4]
+    return (int(source[0]) + 8*int(source[1]) |
+    (int(destination[0]) + 8*int(destination[1])) << 6 | int(move[4:] or 0) << 12)
+
+def unpack_move(code):
+    """
+    Returns the move string for a move packed by pack_move.
+    Parameter:
+        code (int): the packed move
+    """
+    if code in CASTLE_CODES:
+        return CASTLE_CODES[code]
+    source, destination, promotion = code & 63, (code >> 6) & 63, code >> 12
+    return (str(source%8) + str(source//8) + str(destination%8) + str(destination//8) +
+    (str(promotion) if promotion else ''))
+
+CASTLE_CODES.update({pack_move(move):move for move in CASTLES})
+
+def plan_time(timer, player, moves_played):
+    """
+    Returns a (target, deadline) pair of seconds from now for a player on a
+    TimeControl clock: the time to aim for, after which no new iteration
+    should be started, and the most that may be spent on this move.
+    Parameters:
+        timer (TimeControl): the running clock
+        player (int): 1 for player 1 (white) or 2 for player 2 (black)
+        moves_played (int): the moves made so far in the game, by both players
+    """
+    if player == 1:
+        remaining, periods = timer.p1_remaining, timer.p1_byo_yomi
+    else:
+        remaining, periods = timer.p2_remaining, timer.p2_byo_yomi
+    # the clock counts the current byo-yomi period only when it's switched
+    elapsed = time.monotonic() - timer.last_event if timer.turn == player else 0
+    if timer.mode == 'byoyomi' and periods:
+        # the clock spends byo-yomi periods before the main time, and any
+        # time left in a period comes back on the next move, so thinking
+        # within the current period is free
+        period = periods[0] - elapsed
+        return max(MIN_TIME, period / 2), max(MIN_TIME, period - MOVE_OVERHEAD)
+    if timer.mode == 'bronstein':
+        # the delay is used up before the main time, which p2_remaining
+        # already reduces by the time elapsed
+        free, bank = max(0, timer.delay - elapsed), remaining + timer.delay
+    elif timer.mode == 'fischer':
+        # the increment was added to the remaining time when the turn began
+        free, bank = timer.delay, remaining
+    else:
+        free, bank = 0, remaining
+    moves_to_go = max(MIN_MOVES_TO_GO, MOVES_TO_GO - moves_played//2)
+    target = free + max(0, bank - free) / moves_to_go
+    if timer.mode == 'hourglass': # time spent is also given to the opponent
+        target /= 2
+    deadline = min(target * 4, bank - MOVE_OVERHEAD)
+    return max(MIN_TIME, min(target, deadline)), max(MIN_TIME, deadline)
+
+def score_text(score):
+    """
+    Returns a score as text: pawns to two decimal places, like "+0.35", or
+    the moves to checkmate, like "#3" (or "-#3" for getting checkmated).
+    Parameter:
+        score (int): a score in centipawns, or a mate score
+    """
+    if abs(score) >= MATE - MAX_PLY:
+        moves = (MATE - abs(score) + 1) // 2
+        return ("#" if score > 0 else "-#") + str(moves)
+    return "{:+.2f}".format(score / 100)
+
+def has_pieces(state):
+    """
+    Returns True if the player to move has a knight, bishop, rook, or queen.
+    With only a king and pawns, passing is often the best move if it were
+    allowed (zugzwang), so a null move proves nothing.
+    Parameter:
+        state (GameState): the position
+    """
+    color = state.player.color
+    for piece in state.all_pieces:
+        if piece.square and piece.color == color and \
+        not piece.type.endswith(("pawn", "king")):
+            return True
+    return False
+
+def evaluate(state):
+    """
+    Returns a score for the position from the point of view of the player to
+    move: positive if they're ahead. Counts material and piece-square values,
+    which the game keeps up to date as moves are made, blending the middlegame
+    and endgame scores by how much material is left, and the pawn structure,
+    which is looked up by the pawn hash and only worked out when it's new.
+    Parameter:
+        state (GameState): the position to score
+    """
+    phase = min(state.phase, MAX_PHASE)
+    score = (state.middlegame * phase + state.endgame * (MAX_PHASE - phase)) // MAX_PHASE
+    if pawn_structure is not None and PawnTable is not None:
+        table = state.pawn_table
+        if table is None:
+            table = state.pawn_table = PawnTable()
+        pawns = table.probe(state.pawn_hash)
+        if pawns is None:
+            pawns = pawn_structure(state)
+            table.store(state.pawn_hash, pawns)
+        score += pawns
+    return score if state.player is state.white_player else -score
+
+class Engine(object):
+    """
+    An object of this class searches a game for the best move for the player
+    to move, stopping at whichever of its limits it reaches first.
+    Attributes:
+        state (GameState): the game to search
+        max_depth (int): the deepest iteration to search, in plies
+        max_nodes (int): the most positions to visit, or None for no limit
+        max_time (float): the most seconds to spend, or None for no limit
+        timer (TimeControl): a clock to plan each move's time from instead of
+            max_time while it's running, or None
+        target (float): the seconds after which the current search won't
+            start another iteration, or None
+        deadline (float): the seconds after which the current search stops,
+            or None
+        table (TranspositionTable): results of earlier searches, or None
+        order (MoveOrder): the killer moves and history for move ordering
+        null_move (boolean): True to try passing the turn, and prune if the
+            opponent still can't reach beta
+        late_move_reductions (boolean): True to search quiet moves that are
+            ordered late less deeply, unless they beat alpha
+        futility (boolean): True to skip quiet moves near the leaves when
+            the position is too far below alpha for them to help
+        evaluate (function): scores a position for the player to move; the
+            game's incremental material and piece-square score by default,
+            or the full evaluation from the Evaluation module, which sees
+            more but costs far more per call
+        nodes (int): the positions visited in the current search
+        depth (int): the deepest iteration completed in the current search
+        score (int): the best move's score at that depth
+        best_move (string): the best move found so far
+        pv (list): the principal variation from the deepest iteration
+            completed: the best move and the best replies expected after it
+        pv_table (list): for each ply, the best line found from the node
+            being searched there. Each node's line is its best move followed
+            by the line of the child it came from, so the table only ever
+            holds one line per ply (a triangular table, since lines get
+            shorter with depth)
+        report (function): called after each iteration with the depth,
+            score, nodes, seconds, and PV, or None
+        abort (Event): stops the search once set, so that another thread or
+            process can end it early, or None
+        start_depth (int): the first iteration's depth, so that the helpers
+            of a parallel search can stay a ply ahead of the main search
+        pondering (boolean): True to search without limits, on the
+            opponent's time, until aborted or told by ponder_hit that the
+            opponent played the expected move
+        tablebases (Tablebases): endgame tables to play from and to score
+            positions with during the search, or None
+        probing (boolean): True if the current search is close enough to
+            the tables' material to look positions up in them
+        stopped (boolean): True once a limit has been reached
+    """
+    def __init__(self, state, max_depth=64, max_nodes=None, max_time=3.0):
+        self.state = state
+        self.max_depth = max_depth
+        self.max_nodes = max_nodes
+        self.max_time = max_time
+        self.timer = None
+        self.target = self.deadline = None
+        self.order = MoveOrder()
+        self.null_move = True
+        self.late_move_reductions = True
+        self.futility = True
+        self.evaluate = evaluate
+        self.nodes = 0
+        self.depth = 0
+        self.score = 0
+        self.best_move = None
+        self.pv = []
+        self.pv_table = [[] for ply in range(MAX_PLY + 1)]
+        self.report = None
+        self.abort = None
+        self.start_depth = 1
+        self.pondering = False
+        self.tablebases = None
+        self.probing = False
+        self.stopped = False
+
+    def out_of_budget(self):
+        """
+        Returns True, and stops the search, if the node or time limit has been
+        reached or the search has been aborted. The clock and the abort event
+        are only checked every 256 nodes.
+        """
+        if self.max_nodes is not None and not self.pondering and self.nodes >= self.max_nodes:
+            self.stopped = True
+        elif not self.nodes & 255:
+            if self.deadline is not None and time.perf_counter() - self.start >= self.deadline:
+                self.stopped = True
+            elif self.abort is not None and self.abort.is_set():
+                self.stopped = True
+        return self.stopped
+
+    def prepare(self):
+        """
+        Gets ready for a new search: starts the clock, plans the time, and
+        starts a new search in the transposition table and move ordering.
+        """
+        self.start = time.perf_counter()
+        if self.pondering: # the limits start once the opponent has moved
+            self.target = self.deadline = None
+        else:
+            self.target, self.deadline = self.budget()
+        self.nodes = 0
+        self.depth = 0
+        self.score = 0
+        self.stopped = False
+        self.table = self.state.transposition_table()
+        if self.table:
+            self.table.new_search()
+        self.order.new_search()
+        # a couple of captures can bring the position within the tables' reach
+        self.probing = bool(self.tablebases and self.tablebases.pieces) and \
+        sum(1 for piece in self.state.all_pieces if piece.square) <= self.tablebases.pieces + 2
+
+    def budget(self):
+        """
+        Returns the (target, deadline) seconds for a search starting now:
+        planned from the clock if it's running, or max_time otherwise.
+        """
+        if self.timer and self.timer.turn: # if the clock is running
+            player = 1 if self.state.player is self.state.white_player else 2
+            return plan_time(self.timer, player, self.state.replaycounter)
+        return self.max_time, self.max_time
+
+    def ponder_hit(self):
+        """
+        Turns pondering into a real search, for when the opponent has played
+        the move it was pondering after. The search carries on, keeping
+        everything found so far, and its time starts from now. May be called
+        from another thread while the search runs.
+        """
+        elapsed = time.perf_counter() - self.start
+        target, deadline = self.budget()
+        self.target = None if target is None else elapsed + target
+        self.deadline = None if deadline is None else elapsed + deadline
+        self.pondering = False
+
+    def close(self):
+        """
+        Releases anything held between searches. A search in this process
+        holds nothing, but a parallel one holds its helper processes.
+        """
+        pass
+
+    def search(self):
+        """
+        Searches the position one ply deeper at a time until a limit is
+        reached, and returns the best move from the deepest iteration that
+        finished (or from the unfinished one, if it had already found a
+        better move). Returns None if there are no legal moves.
+        """
+        self.prepare()
+        state = self.state
+        if self.probing and self.play_from_tables():
+            return self.best_move
+        # captures first, by MVV-LVA, until an iteration finds a best move
+        moves = sorted(state.legal_moves(), key=lambda move:
+        (True, 0) if is_quiet(state, move) else (False, -mvv_lva(state, move)))
+        self.best_move = moves[0] if moves else None
+        self.pv = self.best_move and [self.best_move] or []
+        # positions that have already been played, for spotting repetitions
+        self.history = {undo.hash for undo in self.state.undo_stack}
+        if not moves: # checkmate or stalemate: there's nothing to search
+            self.depth, self.score = 0, -MATE if state.in_check() else 0
+            return None
+        score = 0
+        for depth in range(self.start_depth, min(self.max_depth, MAX_PLY - 1) + 1):
+            if len(moves) < 2 and depth > 1: # nothing to decide
+                break
+            # expect a score near the last one, and widen the window on
+            # whichever side the search falls outside it
+            delta = ASPIRATION_WINDOW
+            if depth >= ASPIRATION_DEPTH and abs(score) < MATE - MAX_PLY:
+                alpha, beta = score - delta, score + delta
+            else:
+                alpha, beta = -INFINITY, INFINITY
+            while True:
+                score = self.root(moves, depth, alpha, beta)
+                if self.stopped:
+                    break
+                if alpha <= -INFINITY and beta >= INFINITY: # already fully open
+                    break
+                if score <= alpha:
+                    alpha = max(-INFINITY, alpha - delta)
+                elif score >= beta:
+                    beta = min(INFINITY, beta + delta)
+                else:
+                    break
+                delta *= 2
+            if self.stopped:
+                break
+            self.depth, self.score = depth, score
+            self.pv = list(self.pv_table[0])
+            if self.report:
+                self.report(depth, score, self.nodes, time.perf_counter() - self.start, self.pv)
+            if abs(score) >= MATE - depth: # a forced mate was found
+                break
+            # the next iteration would take several times as long as this one
+            if self.target is not None and time.perf_counter() - self.start >= self.target:
+                break
+        return self.best_move
+
+    def play_from_tables(self):
+        """
+        Looks the position up in the tablebases and, if it's there, takes the
+        best move from them, with the line they expect and an exact score, and
+        returns True. Returns False if the search is needed.
+        """
+        state = self.state
+        tablebases = self.tablebases
+        entry = tablebases.probe(state)
+        move = entry and tablebases.best_move(state)
+        if not move:
+            return False
+        result, plies = entry
+        self.score = MATE - plies if result > 0 else -MATE + plies if result < 0 else 0
+        self.pv = []
+        while move and len(self.pv) < MAX_PV:
+            self.pv.append(move)
+            state.make_move(move)
+            move = tablebases.best_move(state)
+        for move in self.pv:
+            state.unmake_move()
+        self.best_move = self.pv[0]
+        self.depth = len(self.pv)
+        if self.report:
+            self.report(self.depth, self.score, self.nodes, time.perf_counter() - self.start, self.pv)
+        return True
+
+    def root(self, moves, depth, alpha, beta):
+        """
+        Searches each move at the root within a window and returns the best
+        score, which is only an upper bound if it's at or below alpha, or a
+        lower bound if it's at or above beta. The best move so far is
+        searched first, and the list is reordered so that the new best move
+        leads the next search.
+        Parameters:
+            moves (list): the legal moves
+            depth (int): the depth to search to
+            alpha (int): the bottom of the window
+            beta (int): the top of the window
+        """
+        state = self.state
+        pv = self.pv_table
+        moves.sort(key=lambda move: move != self.best_move)
+        original_alpha = alpha
+        best, best_move = -INFINITY, None
+        for move in moves:
+            state.make_move(move)
+            pv[1] = []
+            score = self.principal_variation(best_move is None, depth - 1, alpha, beta, 1)
+            state.unmake_move()
+            if self.stopped:
+                break
+            if score > best:
+                best = score
+                if score > alpha:
+                    alpha, best_move = score, move
+                    pv[0] = [move] + pv[1]
+                    if score >= beta:
+                        break
+        if best_move: # even a partial search has searched the old best first
+            self.best_move = best_move
+        if self.table and not self.stopped and best > original_alpha:
+            self.table.store(state.hash, depth, best, LOWER if best >= beta else EXACT,
+            pack_move(self.best_move))
+        return best
+
+    def principal_variation(self, first, depth, alpha, beta, ply, reduction=0):
+        """
+        Searches the move just made and returns its score for the player who
+        made it. The first move is searched with the full window. Any other
+        is expected to be worse, so it's searched with a null window (alpha,
+        alpha+1) to prove it, at a reduced depth if one is given, and only
+        searched again in full if it turns out better.
+        Parameters:
+            first (boolean): True for the node's first move
+            depth (int): the remaining depth after the move
+            alpha (int): the score the player who moved is assured of
+            beta (int): the score their opponent is assured of
+            ply (int): the distance of the position after the move from the root
+            reduction (int): plies to take off the null window search
+        """
+        if first:
+            return -self.negamax(depth, -beta, -alpha, ply)
+        score = -self.negamax(depth - reduction, -alpha - 1, -alpha, ply)
+        if reduction and score > alpha and not self.stopped:
+            score = -self.negamax(depth, -alpha - 1, -alpha, ply)
+        if alpha < score < beta and not self.stopped:
+            score = -self.negamax(depth, -beta, -alpha, ply)
+        return score
+
+    def negamax(self, depth, alpha, beta, ply, null_allowed=True):
+        """
+        Returns the score of the position for the player to move, searched
+        to the given depth with alpha-beta pruning. Scores at or below alpha
+        are upper bounds, and scores at or above beta are lower bounds.
+        Parameters:
+            depth (int): the remaining depth
+            alpha (int): the score the player to move is already assured of
+            beta (int): the score the opponent is already assured of
+            ply (int): the distance from the root
+            null_allowed (boolean): False right after a null move, so that
+                the players don't just pass back and forth
+        """
+        if depth <= 0: # settle the captures before scoring the position
+            return self.quiesce(alpha, beta, ply)
+        self.nodes += 1
+        if self.out_of_budget():
+            return 0
+        state = self.state
+        key = state.hash
+        if key in self.history: # a repetition is as good as a draw
+            return 0
+        if self.probing:
+            entry = self.tablebases.probe(state)
+            if entry:
+                result, plies = entry
+                return MATE - ply - plies if result > 0 else -MATE + ply + plies if result < 0 else 0
+
+        hash_move = None
+        if self.table:
+            entry = self.table.probe(key)
+            if entry:
+                entry_depth, score, bound, code = entry
+                # mate scores are stored relative to this position
+                if score >= MATE - 512:
+                    score -= ply
+                elif score <= -MATE + 512:
+                    score += ply
+                if entry_depth >= depth and (bound == EXACT or
+                bound == LOWER and score >= beta or bound == UPPER and score <= alpha):
+                    return score
+                if code:
+                    hash_move = unpack_move(code)
+
+        in_check = state.in_check()
+        static = None if in_check else self.evaluate(state)
+        # if passing the turn still leaves the opponent unable to reach beta,
+        # a real move would too, so don't bother searching one
+        if self.null_move and null_allowed and not in_check and \
+        depth >= NULL_MIN_DEPTH and abs(beta) < MATE - 512 and \
+        static >= beta and has_pieces(state):
+            reduction = NULL_REDUCTION + (depth > 6)
+            state.make_null_move()
+            score = -self.negamax(depth - 1 - reduction, -beta, -beta + 1, ply + 1, False)
+            state.unmake_move()
+            if self.stopped:
+                return 0
+            if score >= beta:
+                return beta
+        # near the leaves, a quiet move can't make up a big enough deficit
+        futile = self.futility and depth < len(FUTILITY_MARGINS) and not in_check and \
+        abs(alpha) < MATE - 512 and static + FUTILITY_MARGINS[depth] <= alpha
+
+        self.history.add(key)
+        pv = self.pv_table
+        original_alpha = alpha
+        best, best_move = -INFINITY, None
+        legal = 0 # moves generated, searched or not
+        for move in self.order.moves(state, hash_move, ply):
+            legal += 1
+            quiet = is_quiet(state, move)
+            reducible = self.late_move_reductions and quiet and legal > LMR_MOVES and \
+            depth >= LMR_MIN_DEPTH and not in_check and not self.order.is_killer(move, ply)
+            state.make_move(move)
+            if (futile or reducible) and quiet and legal > 1:
+                gives_check = state.in_check()
+                if futile and not gives_check: # prune it
+                    state.unmake_move()
+                    best = max(best, static + FUTILITY_MARGINS[depth])
+                    continue
+                reducible = reducible and not gives_check
+            # search a late quiet move less deeply, and again in full only if
+            # it turns out to beat alpha
+            reduction = (1 if legal <= 2 * LMR_MOVES else 2) if reducible else 0
+            pv[ply + 1] = []
+            score = self.principal_variation(legal == 1, depth - 1, alpha, beta, ply + 1, reduction)
+            state.unmake_move()
+            if self.stopped:
+                break
+            if score > best:
+                best, best_move = score, move
+                if score > alpha:
+                    alpha = score
+                    pv[ply] = [move] + pv[ply + 1]
+                    if alpha >= beta:
+                        self.order.cutoff(state, move, depth, ply)
+                        break
+        self.history.discard(key)
+        if self.stopped:
+            return 0
+        if not legal: # there were no legal moves
+            return -MATE + ply if in_check else 0 # checkmate or stalemate
+
+        if self.table:
+            if best <= original_alpha:
+                bound = UPPER
+            elif best >= beta:
+                bound = LOWER
+            else:
+                bound = EXACT
+            stored = best # mate scores are stored relative to this position
+            if stored >= MATE - 512:
+                stored += ply
+            elif stored <= -MATE + 512:
+                stored -= ply
+            self.table.store(key, depth, stored, bound, pack_move(best_move))
+        return best
+
+    def quiesce(self, alpha, beta, ply, evasions=True):
+        """
+        Returns the score of the position for the player to move once the
+        captures and promotions have played out, so that the search doesn't
+        stop in the middle of an exchange (the horizon effect). The player to
+        move may stand pat on the position's score instead of capturing,
+        unless they're in check on the first ply of captures, in which case
+        every move is searched. Checks after that are left alone, since
+        searching every evasion of every check multiplies the captures many
+        times over.
+        Parameters:
+            alpha (int): the score the player to move is already assured of
+            beta (int): the score the opponent is already assured of
+            ply (int): the distance from the root
+            evasions (boolean): True to search every move if in check
+        """
+        self.nodes += 1
+        if self.out_of_budget():
+            return 0
+        state = self.state
+        if evasions and state.in_check():
+            moves = state.legal_moves()
+            if not moves: # checkmate
+                return -MATE + ply
+            best = -INFINITY
+        else:
+            best = self.evaluate(state) # stand pat
+            if best >= beta:
+                return best
+            alpha = max(alpha, best)
+            moves = state.legal_moves(captures=True)
+            moves.sort(key=lambda move: mvv_lva(state, move), reverse=True)
+        for move in moves:
+            state.make_move(move)
+            score = -self.quiesce(-beta, -alpha, ply + 1, False)
+            state.unmake_move()
+            if self.stopped:
+                return 0
+            if score > best:
+                best = score
+                if score > alpha:
+                    alpha = score
+                    if alpha >= beta:
+                        break
+        return best
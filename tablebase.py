@@ -0,0 +1,597 @@
+#-------------------------------------------------------------------------------
+# Name:        Tablebase
+# Purpose:     Generate endgame tablebases for small sets of material by
+#              retrograde analysis, and probe them so that the computer
+#              opponent plays those endgames perfectly. A table holds one
+#              byte for every placement of its pieces with either side to
+#              move: the result and the distance to mate. It's written as a
+#              flat file that's memory-mapped rather than read.
+#
+#              Usage: python tablebase.py *material KQK KRK KPK KBNK
+#                                         [*folder tablebases]
+#              Tables that the requested ones reach by captures and
+#              promotions are generated too. Pure Python takes seconds for
+#              three pieces, and minutes for four.
+#-------------------------------------------------------------------------------
+
+import mmap
+import os
+import sys
+import time
+try:
+    from gamestate import coordinates
+except:
+    print("The GameState module is not available. Please add it to the working folder and try again.")
+
+FOLDER = "tablebases" # where tables are written and looked for
+MAGIC = b"CHESSTB1"
+HEADER = 16 # the magic, then the material padded with spaces to 8 bytes
+MAX_PIECES = 4 # counting the kings
+
+# piece letters, strongest first, which is the order pieces are indexed in
+ORDER = "KQRBNP"
+VALUES = {"K":0, "Q":9, "R":5, "B":3, "N":3, "P":1}
+LETTERS = {"king":'K', "queen":'Q', "rook":'R', "bishop":'B', "knight":'N', "pawn":'P'}
+PROMOTIONS = "QRBN"
+DRAWN = ("KK", "KBK", "KNK") # nobody can be checkmated, so there's no table
+
+# The board here is 64 squares, 8*y + x, with y counted from the top as in
+# the game's locations: White's pawns move towards y = 0.
+def _steps(offsets):
+    return [[(x + dx) + 8*(y + dy) for dx, dy in offsets if 0 <= x + dx < 8 and 0 <= y + dy < 8]
+    for y in range(8) for x in range(8)]
+
+def _rays(directions):
+    rays = []
+    for square in range(64):
+        x, y = square % 8, square // 8
+        rays.append([])
+        for dx, dy in directions:
+            ray = []
+            tx, ty = x + dx, y + dy
+            while 0 <= tx < 8 and 0 <= ty < 8:
+                ray.append(tx + 8*ty)
+                tx, ty = tx + dx, ty + dy
+            if ray:
+                rays[square].append(ray)
+    return rays
+
+ROOK_DIRECTIONS = ((1, 0), (-1, 0), (0, 1), (0, -1))
+BISHOP_DIRECTIONS = ((1, 1), (1, -1), (-1, 1), (-1, -1))
+STEPS = {'K':_steps(ROOK_DIRECTIONS + BISHOP_DIRECTIONS),
+'N':_steps(((1, 2), (2, 1), (2, -1), (1, -2), (-1, -2), (-2, -1), (-2, 1), (-1, 2)))}
+RAYS = {'R':_rays(ROOK_DIRECTIONS), 'B':_rays(BISHOP_DIRECTIONS),
+'Q':_rays(ROOK_DIRECTIONS + BISHOP_DIRECTIONS)}
+STEP_SETS = {kind:[set(squares) for squares in steps] for kind, steps in STEPS.items()}
+PAWN_ATTACKS = [[set(squares) for squares in _steps(((-1, -1), (1, -1)))], # White's
+[set(squares) for squares in _steps(((-1, 1), (1, 1)))]] # Black's
+# for each pair of squares on a line: the kind of slider that moves along it
+# ('R' or 'B') and the squares in between, or None
+LINES = [[None]*64 for square in range(64)]
+for _kind in "RB":
+    for _square in range(64):
+        for _ray in RAYS[_kind][_square]:
+            for _step, _target in enumerate(_ray):
+                LINES[_square][_target] = (_kind, _ray[:_step])
+
+# the board's symmetries, as maps from each square to its image
+MAPS = [[(tx + 8*ty) for y in range(8) for x in range(8)
+for tx, ty in [transform(x, y)]] for transform in (
+lambda x, y: (x, y), lambda x, y: (7 - x, y), lambda x, y: (x, 7 - y),
+lambda x, y: (7 - x, 7 - y), lambda x, y: (y, x), lambda x, y: (7 - y, x),
+lambda x, y: (y, 7 - x), lambda x, y: (7 - y, 7 - x))]
+# the squares the white king is indexed on: with pawns, files a-d, since
+# pawns only allow mirroring left to right; without, the a1-d1-d4 triangle,
+# which every square can be mapped into
+PAWN_SLOTS = [square for square in range(64) if square % 8 < 4]
+PAWNLESS_SLOTS = [square for square in range(64)
+if square % 8 < 4 and square // 8 >= 4 and square % 8 >= 7 - square // 8]
+
+def material(pieces):
+    """
+    Returns the name of the table for some pieces and whether the colors are
+    swapped in it: the stronger side is always White in a table, so "KRK"
+    also holds the positions where Black has the rook.
+    Parameter:
+        pieces (list): (color, letter, square) for each piece, with color 0
+            for White and 1 for Black
+    """
+    sides = ["".join(sorted((letter for color, letter, square in pieces if color == side),
+    key=ORDER.index)) for side in (0, 1)]
+    strength = [(sum(VALUES[letter] for letter in side), [-ORDER.index(letter) for letter in side])
+    for side in sides]
+    swapped = strength[1] > strength[0]
+    return (sides[1] + sides[0] if swapped else sides[0] + sides[1]), swapped
+
+def normalize(name):
+    """
+    Returns a table's name with each side's pieces in order and the stronger
+    side first, so that "KNBK" and "KKBN" both give "KBNK".
+    Parameter:
+        name (string): the material, each side starting with its king
+    """
+    name = name.upper()
+    split = name.index('K', 1)
+    return material([(0, letter, 0) for letter in name[:split]] +
+    [(1, letter, 0) for letter in name[split:]])[0]
+
+class Table(object):
+    """
+    An object of this class is the tablebase for one set of material. Each
+    entry is a byte: 0 for a draw (or an impossible position), or else the
+    number of plies to checkmate, plus one. An odd number of plies means
+    the player to move gives the mate, and an even number means they get
+    mated, so 1 is checkmate already. Castling and en passant are ignored.
+    Attributes:
+        name (string): the material, like "KRK": White's pieces and then
+            Black's, each starting with the king
+        types (list): each piece's letter, in index order
+        colors (list): each piece's color, 0 for White and 1 for Black
+        kings (list): the index of each color's king
+        slots (list): the squares the white king is indexed on; any other
+            square is mapped onto one of them by a symmetry of the board
+        slot (dictionary): square:index in slots
+        maps (list): for each square, the symmetries (as maps) that take a
+            white king there onto a slot; two for the squares that reach the
+            diagonal of the triangle, which that diagonal's mirror leaves alone
+        size (int): the number of entries
+        data (bytearray or mmap): the entries
+        offset (int): where the entries start in data
+    """
+    def __init__(self, name, data=None, offset=0):
+        self.name = name
+        split = name.index('K', 1)
+        self.types = list(name)
+        self.colors = [0]*split + [1]*(len(name) - split)
+        self.kings = [0, split]
+        self.slots = PAWN_SLOTS if 'P' in name else PAWNLESS_SLOTS
+        self.slot = {square:index for index, square in enumerate(self.slots)}
+        symmetries = (0, 1) if 'P' in name else range(8)
+        self.maps = [[MAPS[symmetry] for symmetry in symmetries if MAPS[symmetry][square] in self.slot]
+        for square in range(64)]
+        self.size = 2 * len(self.slots) * 64**(len(name) - 1)
+        self.data = data
+        self.offset = offset
+
+    def transform(self, squares):
+        """
+        Returns the symmetry that a position is mapped by before indexing: the
+        one that puts the white king on a slot or, if two do, the one that
+        gives the smaller index, so that every position has just one entry.
+        Parameter:
+            squares (list): each piece's square, in index order
+        """
+        maps = self.maps[squares[0]]
+        if len(maps) == 1:
+            return maps[0]
+        return min(maps, key=lambda transform: [transform[square] for square in squares])
+
+    def index(self, squares, side):
+        """
+        Returns a position's entry, after mapping it onto its slots.
+        Parameters:
+            squares (list): each piece's square, in index order
+            side (int): 0 if White is to move, 1 if Black is
+        """
+        transform = self.transform(squares)
+        index = self.slot[transform[squares[0]]]
+        for square in squares[1:]:
+            index = index*64 + transform[square]
+        return index*2 + side
+
+    def decode(self, index):
+        """
+        Returns the (squares, side) of an entry.
+        Parameter:
+            index (int): the entry
+        """
+        side = index & 1
+        index >>= 1
+        squares = []
+        for piece in range(len(self.types) - 1):
+            index, square = divmod(index, 64)
+            squares.append(square)
+        squares.append(self.slots[index])
+        squares.reverse()
+        return squares, side
+
+    def value(self, squares, side):
+        """
+        Returns a position's entry byte.
+        Parameters:
+            squares (list): each piece's square, in index order
+            side (int): 0 if White is to move, 1 if Black is
+        """
+        return self.data[self.offset + self.index(squares, side)]
+
+    def attacked(self, target, side, squares):
+        """
+        Returns True if a square is attacked by one side's pieces.
+        Parameters:
+            target (int): the square
+            side (int): the attacking side
+            squares (list): each piece's square, or -1 if it's been captured
+        """
+        for piece, square in enumerate(squares):
+            if square < 0 or self.colors[piece] != side:
+                continue
+            kind = self.types[piece]
+            if kind == 'K' or kind == 'N':
+                if target in STEP_SETS[kind][square]:
+                    return True
+            elif kind == 'P':
+                if target in PAWN_ATTACKS[side][square]:
+                    return True
+            else:
+                line = LINES[square][target]
+                if line and (kind == 'Q' or kind == line[0]) and \
+                not any(between in squares for between in line[1]):
+                    return True
+        return False
+
+    def legal(self, squares, side):
+        """
+        Returns True if a position can happen: no two pieces on a square, no
+        pawns on the first or last rank, and the player who just moved isn't
+        in check.
+        Parameters:
+            squares (list): each piece's square
+            side (int): the player to move
+        """
+        if len(set(squares)) < len(squares):
+            return False
+        for piece, square in enumerate(squares):
+            if self.types[piece] == 'P' and square // 8 in (0, 7):
+                return False
+        return not self.attacked(squares[self.kings[side ^ 1]], side, squares)
+
+    def moves(self, squares, side):
+        """
+        Yields each legal move of the player to move as a (squares, promotion)
+        pair: each piece's square after it, with a captured piece's set to
+        -1, and the letter a pawn promotes to, or None.
+        Parameters:
+            squares (list): each piece's square
+            side (int): the player to move
+        """
+        occupant = {square:piece for piece, square in enumerate(squares)}
+        for piece, square in enumerate(squares):
+            if self.colors[piece] != side:
+                continue
+            kind = self.types[piece]
+            targets = []
+            if kind == 'K' or kind == 'N':
+                targets = [target for target in STEPS[kind][square]
+                if target not in occupant or self.colors[occupant[target]] != side]
+            elif kind == 'P':
+                ahead = square - 8 if side == 0 else square + 8
+                if ahead not in occupant:
+                    targets.append(ahead)
+                    start = 6 if side == 0 else 1
+                    double = ahead - 8 if side == 0 else ahead + 8
+                    if square // 8 == start and double not in occupant:
+                        targets.append(double)
+                targets.extend(target for target in PAWN_ATTACKS[side][square]
+                if target in occupant and self.colors[occupant[target]] != side)
+            else:
+                for ray in RAYS[kind][square]:
+                    for target in ray:
+                        if target in occupant:
+                            if self.colors[occupant[target]] != side:
+                                targets.append(target)
+                            break
+                        targets.append(target)
+            for target in targets:
+                after = list(squares)
+                after[piece] = target
+                if target in occupant:
+                    after[occupant[target]] = -1 # captured
+                if self.attacked(after[self.kings[side]], side ^ 1, after):
+                    continue # it would leave the king in check
+                if kind == 'P' and target // 8 in (0, 7):
+                    for promotion in PROMOTIONS:
+                        yield after, promotion
+                else:
+                    yield after, None
+
+    def unmoves(self, squares, side):
+        """
+        Yields the positions that the player who just moved could have come
+        from without capturing or promoting, as lists of squares. In each,
+        that player is to move and the other isn't in check.
+        Parameters:
+            squares (list): each piece's square
+            side (int): the player to move now
+        """
+        mover = side ^ 1
+        occupied = set(squares)
+        for piece, square in enumerate(squares):
+            if self.colors[piece] != mover:
+                continue
+            kind = self.types[piece]
+            if kind == 'K' or kind == 'N':
+                origins = [origin for origin in STEPS[kind][square] if origin not in occupied]
+            elif kind == 'P':
+                origins = []
+                behind = square + 8 if mover == 0 else square - 8
+                home = 7 if mover == 0 else 0 # no pawn starts from there
+                if behind not in occupied and behind // 8 != home:
+                    origins.append(behind)
+                    double = behind + 8 if mover == 0 else behind - 8
+                    if square // 8 == (4 if mover == 0 else 3) and double not in occupied:
+                        origins.append(double)
+            else:
+                origins = []
+                for ray in RAYS[kind][square]:
+                    for origin in ray:
+                        if origin in occupied:
+                            break
+                        origins.append(origin)
+            for origin in origins:
+                before = list(squares)
+                before[piece] = origin
+                if not self.attacked(before[self.kings[side]], mover, before):
+                    yield before
+
+class Tablebases(object):
+    """
+    An object of this class is a folder of tablebases, each loaded the first
+    time it's needed. It probes positions from the game and generates new
+    tables.
+    Attributes:
+        folder (string): where the tables are kept
+        tables (dictionary): name:Table for the tables loaded so far, or
+            name:None for those that aren't there
+        pieces (int): the most pieces, counting the kings, in any table in
+            the folder
+        files (list): the open files behind the memory-mapped tables
+    """
+    def __init__(self, folder=FOLDER):
+        self.folder = folder
+        self.tables = {}
+        self.files = []
+        names = [filename[:-3] for filename in os.listdir(folder)
+        if filename.endswith(".tb")] if os.path.isdir(folder) else []
+        self.pieces = max([len(name) for name in names] or [0])
+
+    def table(self, name):
+        """
+        Returns the table for some material, memory-mapping its file the
+        first time, or None if there isn't one.
+        Parameter:
+            name (string): the material, as given by the material function
+        """
+        if name not in self.tables:
+            self.tables[name] = None
+            try:
+                file = open(os.path.join(self.folder, name + ".tb"), 'rb')
+            except OSError:
+                return None
+            data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+            if data[:8] == MAGIC and data[8:HEADER].decode().strip() == name:
+                self.tables[name] = Table(name, data, HEADER)
+                self.files.append(file)
+            else: # not a table, or one for other material
+                data.close()
+                file.close()
+        return self.tables[name]
+
+    def lookup(self, pieces, side):
+        """
+        Returns the entry byte for a position, or None if its table isn't
+        available.
+        Parameters:
+            pieces (list): (color, letter, square) for each piece
+            side (int): 0 if White is to move, 1 if Black is
+        """
+        name, swapped = material(pieces)
+        if name in DRAWN:
+            return 0
+        table = self.table(name)
+        if table is None:
+            return None
+        if swapped: # turn the board around, so the stronger side is White
+            pieces = [(color ^ 1, letter, square ^ 56) for color, letter, square in pieces]
+            side ^= 1
+        pieces.sort(key=lambda piece: (piece[0], ORDER.index(piece[1])))
+        return table.value([square for color, letter, square in pieces], side)
+
+    def probe(self, state):
+        """
+        Returns the result of a position with perfect play as a (result,
+        plies) pair: result is 1 if the player to move wins, -1 if they lose,
+        or 0 for a draw, and plies is the distance to mate. Returns None if
+        the position has too many pieces or no table, or if castling or en
+        passant is possible, which the tables don't know about.
+        Parameter:
+            state (GameState): the position
+        """
+        pieces = []
+        for piece in state.all_pieces:
+            if piece.square:
+                if len(pieces) == self.pieces:
+                    return None
+                x, y = coordinates(piece.square)
+                color, kind = piece.type.split('_')
+                pieces.append((0 if color == "white" else 1, LETTERS[kind], x + 8*y))
+        if state.castling_key() or state.en_passant_key():
+            return None
+        value = self.lookup(pieces, 0 if state.player is state.white_player else 1)
+        if value is None:
+            return None
+        if not value:
+            return 0, 0
+        plies = value - 1
+        return (1 if plies % 2 else -1), plies
+
+    def best_move(self, state):
+        """
+        Returns the best move in a position in the tables: the quickest mate
+        when winning, a move that holds the draw, or the slowest loss. Returns
+        None if the position isn't in the tables.
+        Parameter:
+            state (GameState): the position
+        """
+        if self.probe(state) is None:
+            return None
+        best, best_rank = None, None
+        for move in state.legal_moves():
+            state.make_move(move)
+            entry = self.probe(state)
+            state.unmake_move()
+            if entry is None: # a double step that allows en passant
+                continue
+            result, plies = entry # for the opponent
+            rank = (-result, -plies if result < 0 else plies)
+            if best_rank is None or rank > best_rank:
+                best, best_rank = move, rank
+        return best
+
+    def generate(self, name, report=print):
+        """
+        Generates the table for some material and writes it to the folder,
+        first generating any table it leads to by a capture or promotion that
+        isn't there yet. Returns the Table.
+        Parameters:
+            name (string): the material, like "KRK"
+            report (function): called with a line of text about the progress
+        """
+        name = normalize(name)
+        if name in DRAWN or self.table(name):
+            return self.table(name)
+        if len(name) > MAX_PIECES:
+            raise ValueError("Tables have at most " + str(MAX_PIECES) + " pieces.")
+        table = Table(name)
+        split = name.index('K', 1)
+        for piece, letter in enumerate(name):
+            if letter == 'K':
+                continue
+            rest = [(0 if index < split else 1, other, 0) for index, other in enumerate(name)]
+            del rest[piece]
+            self.generate(material(rest)[0], report) # a capture
+            if letter == 'P':
+                for promotion in PROMOTIONS:
+                    rest = [(0 if index < split else 1, promotion if index == piece else other, 0)
+                    for index, other in enumerate(name)]
+                    self.generate(material(rest)[0], report)
+        start = time.perf_counter()
+        data = self.solve(table)
+        os.makedirs(self.folder, exist_ok=True)
+        with open(os.path.join(self.folder, name + ".tb"), 'wb') as file:
+            file.write(MAGIC + name.ljust(HEADER - len(MAGIC)).encode())
+            file.write(data)
+        table.data = data
+        self.tables[name] = table
+        self.pieces = max(self.pieces, len(name))
+        wins = sum(1 for value in data if value and value % 2 == 0)
+        longest = max(data) - 1
+        report("{}: {} entries, {} won for the side to move, longest mate {} plies, {:.1f}s".format(
+        name, table.size, wins, max(longest, 0), time.perf_counter() - start))
+        return table
+
+    def solve(self, table):
+        """
+        Works out every entry of a table by retrograde analysis and returns
+        them. Each position's moves are counted once, and moves that capture
+        or promote are scored from the smaller tables. Then, starting from
+        the checkmates, the results are spread backwards one ply at a time:
+        a position that can move into a loss for the opponent is won, and a
+        position whose moves all lead to wins for the opponent is lost. What
+        is never reached is a draw.
+        Parameter:
+            table (Table): the table, with no data yet
+        """
+        size = table.size
+        values = bytearray(size) # the entries, 0 until a result is found
+        counts = bytearray(size) # moves within the table not yet known to lose
+        exit_win = bytearray(size) # the quickest win by capturing or promoting, plus one
+        exit_loss = bytearray(size) # the slowest loss by capturing or promoting
+        exit_draw = bytearray(size) # 1 if capturing or promoting draws
+        pending = [[] for plies in range(256)] # positions to settle at each distance
+        colors = table.colors
+        for index in range(size):
+            squares, side = table.decode(index)
+            if not table.legal(squares, side) or table.index(squares, side) != index:
+                continue # impossible, or the mirror image of another entry
+            successors = set()
+            moved = False
+            for after, promotion in table.moves(squares, side):
+                moved = True
+                if promotion is None and -1 not in after:
+                    successors.add(table.index(after, side ^ 1))
+                    continue
+                pieces = [(colors[piece], promotion if promotion and table.types[piece] == 'P' and
+                square // 8 in (0, 7) else table.types[piece], square)
+                for piece, square in enumerate(after) if square >= 0]
+                value = self.lookup(pieces, side ^ 1)
+                if not value:
+                    exit_draw[index] = 1
+                elif (value - 1) % 2 == 0: # the opponent gets mated
+                    if not exit_win[index] or value < exit_win[index]:
+                        exit_win[index] = value
+                else: # the opponent mates
+                    exit_loss[index] = max(exit_loss[index], value)
+            if not moved:
+                if table.attacked(squares[table.kings[side]], side ^ 1, squares):
+                    pending[0].append(index) # checkmate
+                continue # stalemate is a draw
+            counts[index] = len(successors)
+            if exit_win[index]:
+                pending[exit_win[index]].append(index)
+            elif not successors and not exit_draw[index]:
+                pending[exit_loss[index]].append(index)
+        for plies in range(255):
+            for index in pending[plies]:
+                if values[index]:
+                    continue # settled sooner
+                values[index] = plies + 1
+                squares, side = table.decode(index)
+                seen = set()
+                for before in table.unmoves(squares, side):
+                    previous = table.index(before, side ^ 1)
+                    if values[previous]:
+                        continue
+                    if plies % 2 == 0: # lost for the player to move here
+                        pending[plies + 1].append(previous)
+                        continue
+                    # won for the player to move here: one fewer move saves
+                    # the player before. Count each move once, as the forward
+                    # pass did, even where symmetry makes two unmoves match it.
+                    if previous in seen:
+                        continue
+                    transform = table.transform(before)
+                    if table.index([transform[square] for square in squares], side) != index:
+                        continue
+                    seen.add(previous)
+                    counts[previous] -= 1
+                    if not counts[previous] and not exit_win[previous] and not exit_draw[previous]:
+                        pending[max(plies + 1, exit_loss[previous])].append(previous)
+            pending[plies] = None
+        return values
+
+    def close(self):
+        """
+        Unmaps and closes every table file.
+        """
+        for table in self.tables.values():
+            if table is not None and isinstance(table.data, mmap.mmap):
+                table.data.close()
+        for file in self.files:
+            file.close()
+        self.tables, self.files = {}, []
+
+def main():
+    # look for argv options the same way the game does
+    argvs = {pair.partition(' ')[0].lower():pair.partition(' ')[2].strip()
+    for pair in (' '.join(sys.argv)).split(' *')[1:]}
+    # switches:
+    # *material names
+    # *folder folder
+    names = argvs.get('material', "KQK KRK KPK").split()
+    tablebases = Tablebases(argvs.get('folder', FOLDER))
+    for name in names:
+        tablebases.generate(name)
+    tablebases.close()
+
+if __name__ == '__main__':
+    main()
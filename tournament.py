@@ -0,0 +1,347 @@
+#-------------------------------------------------------------------------------
+# Name:        Tournament
+# Purpose:     Play the computer opponents against each other with no user
+#              interface, several games at a time, to measure whether a
+#              change to one makes it stronger or only slower.
+#
+#              Usage: python tournament.py [*players hard easy] [*games N]
+#                                          [*processes N] [*time seconds]
+#                                          [*mode hourglass bronstein fischer byoyomi]
+#                                          [*delay seconds] [*byoyomi seconds ...]
+#                                          [*sprt elo0 elo1] [*output folder]
+#              The first player is the one being measured: its results and
+#              Elo are reported against the second. The players take turns
+#              playing White. Each game is written to the output folder as
+#              an ICCF move list, one move per line, and results.txt lists
+#              how each one ended.
+#-------------------------------------------------------------------------------
+
+import math
+import multiprocessing
+import os
+import random
+import sys
+import time
+try:
+    import timecontrol as tc
+except:
+    print("The TimeControl module is not available. Please add it to the working folder and try again.")
+try:
+    from gamestate import GameState, to_location
+except:
+    print("The GameState module is not available. Please add it to the working folder and try again.")
+try:
+    from search import Engine
+except:
+    Engine = None # the expert opponent will play like the hard one
+    print("The Search module is not available.")
+try:
+    import evaluation
+except:
+    evaluation = None # the expert opponent will count material
+try:
+    import chess_notation as cn
+except:
+    cn = None # games will be written in the game's own notation
+try:
+    from book import OpeningBook
+except:
+    OpeningBook = None
+try:
+    from tablebase import Tablebases
+except:
+    Tablebases = None
+
+MAX_PLIES = 400 # a game this long is adjudicated a draw
+FIFTY_MOVES = 100 # plies without a capture or pawn move that draw the game
+RESULTS = {"White":"1-0", "Black":"0-1", "Draw":"1/2-1/2"}
+Z_95 = 1.959964 # standard deviations either side of the mean for 95% confidence
+
+def easy_level(state, engine):
+    """
+    Returns the easy AI's move for the player to move, in chess11 notation.
+    Parameters:
+        state (GameState): the game
+        engine (Engine): the player's engine, which this level doesn't use
+    """
+    piece, move = state.easy_move()
+    return piece.location + to_location(move)
+
+def hard_level(state, engine):
+    """
+    Returns the hard AI's move for the player to move, in chess11 notation.
+    Parameters:
+        state (GameState): the game
+        engine (Engine): the player's engine, which this level doesn't use
+    """
+    piece, move = state.hard_move()
+    return piece.location + to_location(move)
+
+def expert_level(state, engine):
+    """
+    Returns the expert AI's move for the player to move, in chess11
+    notation, searched by its engine within its share of the clock. Without
+    the search module, it plays a hard move.
+    Parameters:
+        state (GameState): the game
+        engine (Engine): the player's engine, or None
+    """
+    if engine is None:
+        return hard_level(state, engine)
+    engine.state = state
+    return engine.search()
+
+# the opponents that can play, by name. A new level only needs a function
+# that takes the game and an engine and returns a move.
+LEVELS = {"easy":easy_level, "hard":hard_level, "expert":expert_level}
+
+def insufficient_material(state):
+    """
+    Returns True if neither player has the pieces left to give checkmate:
+    only the kings, or the kings and one knight or bishop.
+    Parameter:
+        state (GameState): the game
+    """
+    others = [piece.type for piece in state.all_pieces
+    if piece.square and "king" not in piece.type]
+    return not others or len(others) == 1 and others[0].endswith(("knight", "bishop"))
+
+def play_game(task):
+    """
+    Plays one game between two levels, and returns a (game, white, black,
+    result, reason, moves) tuple: the result as "1-0", "0-1", or "1/2-1/2",
+    why the game ended, and its movelist in chess11 notation.
+    Parameter:
+        task (tuple): (game, white, black, clock, settings): the game's
+            number, the levels playing White and Black, the keywords for
+            its TimeControl, and a dict of the players' other settings
+    """
+    game, white, black, clock, settings = task
+    random.seed(settings["seed"] + game) # the easy and hard levels play at random
+    state = GameState()
+    timer = tc.TimeControl(**clock)
+    book = tablebases = None
+    if settings["book"] and OpeningBook:
+        book = OpeningBook(settings["book"])
+    if settings["tablebases"] and Tablebases:
+        tablebases = Tablebases(settings["tablebases"])
+    engines = {}
+    tables = {"white":None, "black":None} # each engine searches with a table of its own
+    for color, level in (("white", white), ("black", black)):
+        if level == "expert" and Engine:
+            engine = engines[color] = Engine(state, max_depth=settings["depth"],
+            max_time=settings["movetime"])
+            engine.timer = timer
+            engine.tablebases = tablebases
+            if settings["evaluation"] == "full" and evaluation and evaluation.numpy is not None:
+                engine.evaluate = evaluation.evaluate
+    seen = {state.hash:1} # how many times each position has come up
+    quiet = 0 # plies since the last capture or pawn move
+    result = reason = None
+    try:
+        timer.start()
+        while True:
+            winner = state.check_game_over()
+            if winner:
+                result = RESULTS[winner]
+                reason = "checkmate" if winner != "Draw" else "stalemate"
+            elif seen[state.hash] >= 3:
+                result, reason = RESULTS["Draw"], "repetition"
+            elif quiet >= FIFTY_MOVES:
+                result, reason = RESULTS["Draw"], "fifty moves"
+            elif insufficient_material(state):
+                result, reason = RESULTS["Draw"], "insufficient material"
+            elif state.replaycounter >= settings["plies"]:
+                result, reason = RESULTS["Draw"], "move limit"
+            if result:
+                break
+            color = state.player.color
+            level = white if color == "white" else black
+            state.table = tables[color]
+            moves = state.legal_moves()
+            move = None
+            # the easy and hard levels only move pieces, so they have nothing
+            # to choose from when castling is all that's left
+            if any(len(legal) > 2 for legal in moves):
+                move = book and level in settings["booklevels"] and book.choose(state) or \
+                tablebases and level == "hard" and tablebases.best_move(state) or \
+                LEVELS[level](state, engines.get(color))
+            tables[color] = state.table
+            move = move or moves[0]
+            pieces, pawns = sum(1 for piece in state.all_pieces if piece.square), state.pawn_hash
+            state.record_move(move)
+            state.make_move(move)
+            timer.switch()
+            if (timer.p1_remaining if color == "white" else timer.p2_remaining) < 0:
+                result = RESULTS["Black" if color == "white" else "White"]
+                reason = "time"
+                break
+            if state.pawn_hash != pawns or sum(1 for piece in state.all_pieces if piece.square) != pieces:
+                quiet = 0
+            else:
+                quiet += 1
+            seen[state.hash] = seen.get(state.hash, 0) + 1
+    finally:
+        if book:
+            book.close()
+        if tablebases:
+            tablebases.close()
+    return game, white, black, result, reason, state.movelist
+
+def elo(score):
+    """
+    Returns the Elo difference that a score is expected from.
+    Parameter:
+        score (float): the fraction of the points won, between 0 and 1
+    """
+    if score <= 0:
+        return -math.inf
+    if score >= 1:
+        return math.inf
+    return 400 * math.log10(score / (1 - score))
+
+def score_stats(wins, draws, losses):
+    """
+    Returns the (score, variance) of a match: the fraction of the points won,
+    and the variance of the points from one game.
+    Parameters:
+        wins (int): games won
+        draws (int): games drawn
+        losses (int): games lost
+    """
+    games = wins + draws + losses
+    score = (wins + draws / 2) / games
+    variance = (wins * (1 - score)**2 + draws * (0.5 - score)**2 + losses * score**2) / games
+    return score, variance
+
+def elo_interval(wins, draws, losses):
+    """
+    Returns the (low, estimate, high) Elo difference shown by a match, with
+    a 95% confidence interval.
+    Parameters:
+        wins (int): games won
+        draws (int): games drawn
+        losses (int): games lost
+    """
+    score, variance = score_stats(wins, draws, losses)
+    margin = Z_95 * math.sqrt(variance / (wins + draws + losses))
+    return elo(score - margin), elo(score), elo(score + margin)
+
+def sprt(wins, draws, losses, elo0, elo1):
+    """
+    Returns the log-likelihood ratio of a match for a sequential probability
+    ratio test of elo1 against elo0, by the normal approximation: positive
+    when the results are likelier if the true difference is elo1. Half a win
+    and half a loss are added, so that a match with no losses (or no wins)
+    still has some variance to measure against.
+    Parameters:
+        wins (int): games won
+        draws (int): games drawn
+        losses (int): games lost
+        elo0 (float): the Elo difference of the null hypothesis
+        elo1 (float): the Elo difference of the alternative hypothesis
+    """
+    wins, losses = wins + 0.5, losses + 0.5
+    score, variance = score_stats(wins, draws, losses)
+    score0 = 1 / (1 + 10**(-elo0 / 400))
+    score1 = 1 / (1 + 10**(-elo1 / 400))
+    return (score1 - score0) * (2 * score - score0 - score1) * (wins + draws + losses) / (2 * variance)
+
+def elo_text(low, estimate, high):
+    """
+    Returns an Elo difference as text, like "+35 +/- 42".
+    """
+    if math.isinf(estimate):
+        return "{:+}".format(estimate)
+    return "{:+.0f} +/- {:.0f}".format(estimate, (high - low) / 2)
+
+def main():
+    # look for argv options the same way the game does, but keep the case of
+    # the values, since folder names can be case-sensitive
+    argvs = {pair.partition(' ')[0].lower():pair.partition(' ')[2].strip()
+    for pair in (' '.join(sys.argv)).split(' *')[1:]}
+    # switches:
+    # *players level level
+    # *games int
+    # *processes int
+    # *time seconds
+    # *mode basic hourglass bronstein fischer byoyomi
+    # *delay seconds
+    # *byoyomi seconds seconds ...
+    # *plies int
+    # *depth int
+    # *movetime seconds
+    # *evaluation material full
+    # *book file
+    # *booklevels easy hard expert
+    # *tablebases folder
+    # *sprt elo0 elo1
+    # *alpha float
+    # *beta float
+    # *output folder
+    # *seed int
+    players = argvs.get('players', "hard easy").lower().split()
+    if len(players) != 2 or not all(player in LEVELS for player in players):
+        print("Choose two players from: " + ', '.join(LEVELS))
+        sys.exit(2)
+    games = int(argvs.get('games', 100))
+    processes = int(argvs['processes']) if argvs.get('processes') else None
+    seconds = float(argvs.get('time', 60))
+    clock = {"p1time":seconds, "p2time":seconds}
+    mode = argvs.get('mode', "basic").lower()
+    if mode in ("bronstein", "fischer"):
+        clock[mode] = float(argvs.get('delay', 1))
+    elif mode == "hourglass":
+        clock[mode] = True
+    elif mode == "byoyomi":
+        periods = [float(period) for period in argvs.get('byoyomi', "10 10 10").split()]
+        clock["p1_byo_yomi"], clock["p2_byo_yomi"] = periods, list(periods)
+    settings = {"seed":int(argvs.get('seed', time.time())),
+    "plies":int(argvs.get('plies', MAX_PLIES)),
+    "depth":int(argvs.get('depth', 64)),
+    "movetime":float(argvs['movetime']) if argvs.get('movetime') else None,
+    "evaluation":argvs.get('evaluation', "material").lower(),
+    "book":argvs.get('book'),
+    "booklevels":argvs.get('booklevels', "hard expert").lower().split(),
+    "tablebases":argvs.get('tablebases')}
+    bounds = None
+    if argvs.get('sprt'):
+        elo0, elo1 = map(float, argvs['sprt'].split())
+        alpha, beta = float(argvs.get('alpha', 0.05)), float(argvs.get('beta', 0.05))
+        bounds = math.log(beta / (1 - alpha)), math.log((1 - beta) / alpha)
+    folder = argvs.get('output', "tournament")
+    os.makedirs(folder, exist_ok=True)
+    # the first player takes White in the even games
+    tasks = ((game, players[game % 2], players[1 - game % 2], clock, settings)
+    for game in range(games))
+    wins = draws = losses = 0
+    with open(os.path.join(folder, "results.txt"), 'w', encoding='utf-8-sig') as results, \
+    multiprocessing.Pool(processes) as pool:
+        results.write("Game\tWhite\tBlack\tResult\tReason\tPlies\n")
+        for game, white, black, result, reason, moves in pool.imap_unordered(play_game, tasks):
+            with open(os.path.join(folder, "game_{:04}.txt".format(game + 1)), 'w', encoding='utf-8-sig') as output:
+                for move in (cn.chess11_to_iccf_full(moves) if cn else moves):
+                    output.write(move + "\n")
+            results.write('\t'.join((str(game + 1), white, black, result, reason, str(len(moves)))) + "\n")
+            results.flush()
+            if result == RESULTS["Draw"]:
+                draws += 1
+            elif (result == RESULTS["White"]) == (game % 2 == 0):
+                wins += 1
+            else:
+                losses += 1
+            line = "Games {}: +{} ={} -{}, {:.1%}, Elo {}".format(wins + draws + losses,
+            wins, draws, losses, score_stats(wins, draws, losses)[0],
+            elo_text(*elo_interval(wins, draws, losses)))
+            if bounds:
+                llr = sprt(wins, draws, losses, elo0, elo1)
+                line += ", LLR {:.2f} ({:.2f}, {:.2f})".format(llr, *bounds)
+                if not bounds[0] < llr < bounds[1]:
+                    print(line)
+                    print("SPRT: " + ("H1 accepted, " + players[0] + " is stronger"
+                    if llr >= bounds[1] else "H0 accepted, " + players[0] + " is not stronger"))
+                    break
+            print(line)
+
+if __name__ == '__main__':
+    main()
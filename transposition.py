@@ -0,0 +1,185 @@
+#-------------------------------------------------------------------------------
+# Name:        Transposition
+# Purpose:     Remember search results by position hash in a table of fixed
+#              size, so that the computer opponent doesn't search the same
+#              position twice and never grows past its memory budget.
+#-------------------------------------------------------------------------------
+
+from array import array
+
+# bound types: whether a stored score is exact, or only a lower bound (the
+# search failed high) or an upper bound (it failed low)
+EXACT = 1
+LOWER = 2
+UPPER = 3
+
+ENTRY_BYTES = 16 # an 8-byte key and 8 bytes of packed data
+MAX_SCORE = 32767 # scores are stored in 16 bits
+
+class TranspositionTable(object):
+    """
+    An object of this class is a fixed-size table of search results, indexed
+    by a position's Zobrist hash. Each entry is two unsigned 64-bit ints in
+    flat arrays: the full hash, to tell positions that share a slot apart,
+    and the rest packed into one number:
+        bits 0-15   best move (0 for none), as packed by the search
+        bits 16-31  score, offset so that it's never negative
+        bits 32-39  depth
+        bits 40-41  bound type
+        bits 42-47  age: the search that stored it
+    A new result replaces the one in its slot if the slot is empty or holds
+    the same position, if the stored result is from an older search, or if
+    the new result was searched at least as deeply (depth-preferred, with
+    aging).
+    The hash is stored XORed with the data, so that an entry only matches
+    its position if both halves were written by the same store. That lets
+    several processes share one table without locking: an entry that one
+    process is halfway through writing just looks like a miss to the others.
+    Attributes:
+        megabytes (int): the memory budget the table was sized for
+        size (int): the number of entries, a power of two
+        keys (array): the hash XORed with the data for each entry, 0 for an
+            empty entry
+        data (array): the packed data for each entry
+        age (int): the current search, from 0 to 63
+        probes (int): how many times the table has been probed
+        hits (int): how many of those probes found their position
+    """
+    def __init__(self, megabytes=16):
+        self.resize(megabytes)
+
+    def resize(self, megabytes):
+        """
+        Sets the size of the table, emptying it.
+        Parameter:
+            megabytes (int): the memory budget for the table
+        """
+        self.megabytes = megabytes
+        entries = max(1, megabytes * 2**20 // ENTRY_BYTES)
+        self.size = 1 << (entries.bit_length() - 1) # round down to a power of two
+        self.mask = self.size - 1
+        self.clear()
+
+    def clear(self):
+        """
+        Empties the table.
+        """
+        self.keys = array('Q', [0]) * self.size
+        self.data = array('Q', [0]) * self.size
+        self.age = 0
+        self.probes = 0
+        self.hits = 0
+
+    def new_search(self):
+        """
+        Starts a new search, so that results from earlier searches may be
+        replaced by any new result.
+        """
+        self.age = (self.age + 1) % 64
+
+    def store(self, key, depth, score, bound, move=0):
+        """
+        Stores a search result, if the replacement scheme allows it.
+        Parameters:
+            key (int): the position's 64-bit hash
+            depth (int): how deeply the position was searched, from 0 to 255
+            score (int): the position's score
+            bound (int): EXACT, LOWER, or UPPER
+            move (int): the best move, packed into 16 bits, or 0 for none
+        """
+        index = key & self.mask
+        data = self.data[index]
+        stored = self.keys[index] ^ data
+        if stored and stored != key:
+            # keep a deeper result from this search
+            if (data >> 42) == self.age and (data >> 32) & 0xFF > depth:
+                return
+        elif stored == key and not move: # keep the best move we already had
+            move = data & 0xFFFF
+        score = max(-MAX_SCORE, min(MAX_SCORE, score))
+        data = (move | (score + MAX_SCORE) << 16 | min(depth, 255) << 32 |
+        bound << 40 | self.age << 42)
+        self.keys[index] = key ^ data
+        self.data[index] = data
+
+    def probe(self, key):
+        """
+        Looks up a position. Returns a (depth, score, bound, move) tuple, or
+        None if the position isn't in the table.
+        Parameter:
+            key (int): the position's 64-bit hash
+        """
+        self.probes += 1
+        index = key & self.mask
+        data = self.data[index]
+        if self.keys[index] ^ data != key:
+            return None
+        self.hits += 1
+        return ((data >> 32) & 0xFF, ((data >> 16) & 0xFFFF) - MAX_SCORE,
+        (data >> 40) & 0x3, data & 0xFFFF)
+
+    def usage(self):
+        """
+        Returns how full the table is, in permille, by counting how many of
+        the first thousand entries were filled by the current search.
+        """
+        sample = min(1000, self.size)
+        return sum(1 for index in range(sample)
+        if self.keys[index] and self.data[index] >> 42 == self.age) * 1000 // sample
+
+PAWN_ENTRIES = 2**14 # pawn structures remembered by a pawn table
+
+class PawnTable(object):
+    """
+    An object of this class is a fixed-size table of pawn structure scores,
+    indexed by a hash of the pawns alone. The pawns rarely move, so the same
+    structure comes up over and over in a search, and almost every probe
+    hits. Each entry is the full pawn hash, to tell structures that share a
+    slot apart, and the score; a new score always replaces the old one.
+    Attributes:
+        size (int): the number of entries, a power of two
+        keys (array): the pawn hash for each entry
+        scores (array): the score for each entry
+        hits (int): how many probes found their structure
+        misses (int): how many didn't
+    """
+    def __init__(self, size=PAWN_ENTRIES):
+        self.size = 1 << (max(1, size).bit_length() - 1) # round down to a power of two
+        self.mask = self.size - 1
+        self.clear()
+
+    def clear(self):
+        """
+        Empties the table.
+        """
+        # an empty entry looks like the structure with no pawns, which
+        # really does score 0
+        self.keys = array('Q', [0]) * self.size
+        self.scores = array('i', [0]) * self.size
+        self.hits = 0
+        self.misses = 0
+
+    def probe(self, key):
+        """
+        Returns the score stored for a pawn structure, or None if it isn't in
+        the table.
+        Parameter:
+            key (int): the 64-bit hash of the pawns
+        """
+        index = key & self.mask
+        if self.keys[index] != key:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return self.scores[index]
+
+    def store(self, key, score):
+        """
+        Stores the score of a pawn structure.
+        Parameters:
+            key (int): the 64-bit hash of the pawns
+            score (int): the score
+        """
+        index = key & self.mask
+        self.keys[index] = key
+        self.scores[index] = score